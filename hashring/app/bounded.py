@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+u"""有界负载的一致性哈希（consistent hashing with bounded loads）.
+
+在虚拟分区环上记录每个设备当前承担的负载，分配key时若目标设备的负载
+已达到上限(1 + epsilon) * 平均负载，则沿环顺时针跳到下一个设备，直到找到
+未满的设备。热点key因此会溢出到相邻设备，任何设备的负载都不超过上限。
+设备的平均负载按其虚拟分区数量（即权重）分摊。
+"""
+import math
+import threading
+
+from hashring.app.lookup import find_index
+from hashring.common.utils import get_hash
+
+# 默认的负载上限系数，设备负载不超过平均负载的1 + EPSILON倍
+EPSILON = 0.25
+# 负载计数器的默认锁分段数
+STRIPES = 16
+
+
+class LoadCounter(object):
+    u"""各设备的负载计数器，可由多个线程并发更新.
+
+    设备按id分散到多个分段，每个分段各有一把锁，不同分段上的更新互不阻塞；
+    总负载由各分段的小计相加得到。
+
+    :param stripes: 锁分段数
+    """
+
+    def __init__(self, stripes=STRIPES):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._loads = [{} for _ in range(stripes)]
+        self._totals = [0] * stripes
+
+    def _stripe(self, dev_id):
+        return hash(dev_id) % len(self._locks)
+
+    def try_acquire(self, dev_id, limit=None, amount=1):
+        u"""增加设备的负载，增加后超过上限则不增加.
+
+        :param dev_id: 设备id
+        :param limit: 负载上限，None表示不限
+        :param amount: 增加的负载
+        :return 是否增加了负载
+        """
+        i = self._stripe(dev_id)
+        with self._locks[i]:
+            loads = self._loads[i]
+            load = loads.get(dev_id, 0) + amount
+            if limit is not None and load > limit:
+                return False
+            loads[dev_id] = load
+            self._totals[i] += amount
+            return True
+
+    def release(self, dev_id, amount=1):
+        u"""减少设备的负载.
+
+        :param dev_id: 设备id
+        :param amount: 减少的负载，超过设备当前负载时抛出ValueError
+        """
+        i = self._stripe(dev_id)
+        with self._locks[i]:
+            loads = self._loads[i]
+            load = loads.get(dev_id, 0) - amount
+            if load < 0:
+                raise ValueError('设备%s的负载不足%s' % (dev_id, amount))
+            if load:
+                loads[dev_id] = load
+            else:
+                loads.pop(dev_id, None)
+            self._totals[i] -= amount
+
+    def load(self, dev_id):
+        u"""返回设备当前的负载."""
+        return self._loads[self._stripe(dev_id)].get(dev_id, 0)
+
+    def total(self):
+        u"""返回所有设备的总负载."""
+        return sum(self._totals)
+
+    def loads(self):
+        u"""返回{设备id: 负载}的快照."""
+        result = {}
+        for lock, loads in zip(self._locks, self._loads):
+            with lock:
+                result.update(loads)
+        return result
+
+
+class BoundedLoadRing(object):
+    u"""有界负载的查找，在虚拟分区环上按设备当前负载分配key.
+
+    :param ring: RingView，或带snapshot属性的RingManager，后者每次分配时
+        使用其当前快照
+    :param epsilon: 负载上限系数
+    :param counter: 负载计数器，多个BoundedLoadRing可共享，默认新建
+    """
+
+    def __init__(self, ring, epsilon=EPSILON, counter=None):
+        self._source = ring
+        self.epsilon = epsilon
+        self.counter = counter if counter is not None else LoadCounter()
+        # (快照, 哈希函数, {设备id: 虚拟分区占比})，快照变化时重新计算
+        self._state = (None, None, None)
+
+    def _current(self):
+        snapshot = getattr(self._source, 'snapshot', self._source)
+        state = self._state
+        if state[0] is not snapshot:
+            counts = {}
+            for dev_id in snapshot.dev_ids:
+                counts[dev_id] = counts.get(dev_id, 0) + 1
+            size = float(len(snapshot))
+            state = (snapshot, get_hash(snapshot.hash_name),
+                     dict((dev_id, count / size)
+                          for dev_id, count in counts.items()))
+            self._state = state
+        return state
+
+    def capacity(self, dev_id, total=None):
+        u"""返回新分配一个key时设备的负载上限.
+
+        :param dev_id: 设备id
+        :param total: 当前总负载，默认读取计数器
+        """
+        _, _, shares = self._current()
+        if total is None:
+            total = self.counter.total()
+        return math.ceil((1 + self.epsilon) * (total + 1) *
+                         shares.get(dev_id, 0))
+
+    def assign(self, key):
+        u"""为key分配设备并计入该设备的负载.
+
+        从key落到的虚拟分区开始顺时针查找，跳过负载已满的设备。并发分配时
+        所有设备可能同时显示已满，此时退回到key原本的设备。
+
+        :param key: 指定key
+        :return 设备id，环为空时返回None；用完后应调用release
+        """
+        snapshot, hash_func, shares = self._current()
+        sorted_keys, dev_ids = snapshot.sorted_keys, snapshot.dev_ids
+        idx = find_index(sorted_keys, hash_func(key))
+        if idx < 0:
+            return None
+        bound = (1 + self.epsilon) * (self.counter.total() + 1)
+        size = len(dev_ids)
+        seen = set()
+        for step in range(size):
+            dev_id = dev_ids[(idx + step) % size]
+            if dev_id in seen:
+                continue
+            seen.add(dev_id)
+            if self.counter.try_acquire(
+                    dev_id, math.ceil(bound * shares[dev_id])):
+                return dev_id
+            if len(seen) == len(shares):
+                break
+        dev_id = dev_ids[idx]
+        self.counter.try_acquire(dev_id)
+        return dev_id
+
+    def release(self, dev_id, amount=1):
+        u"""key处理完毕后减少设备的负载.
+
+        :param dev_id: assign返回的设备id
+        :param amount: 减少的负载
+        """
+        self.counter.release(dev_id, amount)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+u"""hash_dev的查找结果缓存.
+
+以原始key为键的有界LRU缓存，每条结果记录计算时ring的版本号（generation）。
+ring每次修改后版本号加1，旧版本的结果在读取时即视为失效，无需清空缓存。
+"""
+import collections
+import threading
+
+# 默认的缓存条目数上限
+CACHE_SIZE = 65536
+
+_MISSING = object()
+
+
+class LookupCache(object):
+    u"""带ring版本号的LRU查找缓存，可由多个线程并发使用.
+
+    :param capacity: 缓存条目数上限
+    """
+
+    def __init__(self, capacity=CACHE_SIZE):
+        self.capacity = capacity
+        # {key: (版本号, 结果)}，按最近使用的顺序排列
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # 监控指标
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, generation, default=None):
+        u"""读取缓存的结果.
+
+        :param key: 原始key
+        :param generation: 当前ring的版本号
+        :param default: 未命中或已失效时的返回值
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, generation, value):
+        u"""写入结果，超过上限时淘汰最久未使用的条目.
+
+        :param key: 原始key
+        :param generation: 计算结果时ring的版本号
+        :param value: 结果
+        """
+        with self._lock:
+            entries = self._entries
+            entries[key] = (generation, value)
+            entries.move_to_end(key)
+            if len(entries) > self.capacity:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def lookup(self, key, generation, func):
+        u"""读取缓存的结果，未命中时调用func(key)计算并写入.
+
+        调用方须先读取版本号再调用，保证结果不会比版本号更旧。
+
+        :param key: 原始key
+        :param generation: 当前ring的版本号
+        :param func: 计算结果的函数
+        """
+        value = self.get(key, generation, _MISSING)
+        if value is _MISSING:
+            value = func(key)
+            self.put(key, generation, value)
+        return value
+
+    def clear(self):
+        u"""清空缓存，不重置监控指标."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        u"""返回监控指标."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'capacity': self.capacity,
+        }
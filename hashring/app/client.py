@@ -0,0 +1,516 @@
+# -*- coding: utf-8 -*-
+u"""查找服务的客户端.
+
+客户端维护到本机查找服务（见daemon模块）的多个持久连接，请求按连接轮流
+发送，同一连接上可以有多个请求同时在途，响应按请求id分发。并发的hash_dev
+调用先进入队列，在window时间内或凑满max_batch个后合并为一个批量请求发送，
+由一次往返应答多个调用。
+
+LookupClient供多线程程序使用，AsyncLookupClient供asyncio程序使用，两者的
+hash_dev与RingBuilder.hash_dev一样返回设备id，ring为空时返回None。
+"""
+import asyncio
+import itertools
+import socket
+import threading
+import time
+from concurrent import futures
+
+from hashring.app.daemon import SOCKET_PATH
+from hashring.common import exceptions as exc
+from hashring.common import protocol
+
+# 默认的连接数
+POOL_SIZE = 4
+# hash_dev合并的默认时间窗口（秒）。为0时不等待，上一批在发送时排队的调用
+# 自然合并为下一批，本机上的延迟和吞吐都优于固定的等待时间
+WINDOW = 0
+# 一个批量请求最多合并的key数量
+MAX_BATCH = 1000
+# 同步调用等待响应的默认超时（秒）
+TIMEOUT = 5.0
+
+_REQ_ID_MASK = 0xffffffff
+
+
+def _split_batch(batch):
+    u"""按protocol.split_keys拆分合并前的调用.
+
+    :param batch: [(key, future)]
+    :return 可以各自作为一个批量请求发送的[(key, future)]列表；有无效的key时
+        这一批调用以异常结束，返回空列表
+    """
+    try:
+        chunks = protocol.split_keys([key for key, _ in batch])
+    except Exception as e:
+        _fail(batch, e)
+        return []
+    parts, start = [], 0
+    for keys in chunks:
+        parts.append(batch[start:start + len(keys)])
+        start += len(keys)
+    return parts
+
+
+def _set_response(future, status, body, decode):
+    u"""按响应状态设置future的结果或异常."""
+    if future.done():
+        return
+    if status == protocol.STATUS_OK:
+        try:
+            future.set_result(decode(body))
+        except Exception as e:
+            # 帧体无法解析时以异常结束，不能让调用方一直等待
+            future.set_exception(e)
+    else:
+        future.set_exception(exc.ErrorProtocol(
+            body.decode('utf-8', 'replace')))
+
+
+def _fail(batch, error):
+    u"""以异常结束一批合并前的调用."""
+    for _, waiter in batch:
+        if not waiter.done():
+            waiter.set_exception(error)
+
+
+def _deliver(batch, future):
+    u"""将批量请求的结果逐个分给合并前的调用.
+
+    :param batch: [(key, future)]
+    :param future: 批量请求的future
+    """
+    error = future.exception()
+    if error is not None:
+        _fail(batch, error)
+        return
+    for (_, waiter), dev_id in zip(batch, future.result()):
+        if not waiter.done():
+            waiter.set_result(dev_id)
+
+
+class _Connection(object):
+    u"""到查找服务的一个连接，后台线程读取响应并按请求id分发."""
+
+    def __init__(self, socket_path, timeout):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(socket_path)
+        self._sock.settimeout(None)
+        self._rfile = self._sock.makefile('rb')
+        self._lock = threading.Lock()
+        self._req_ids = itertools.count(1)
+        # {请求id: (future, 解析函数)}
+        self._pending = {}
+        self.closed = False
+        self._reader = threading.Thread(target=self._read_loop,
+                                        name='lookup-client-reader')
+        self._reader.daemon = True
+        self._reader.start()
+
+    def request(self, encode, decode):
+        u"""发送请求，不等待响应.
+
+        :param encode: encode(req_id)生成请求帧
+        :param decode: decode(body)解析响应的帧体
+        :return concurrent.futures.Future
+        """
+        future = futures.Future()
+        with self._lock:
+            if self.closed:
+                raise ConnectionError('连接已关闭')
+            req_id = next(self._req_ids) & _REQ_ID_MASK
+            # 先编码再登记，编码失败时不留下无人应答的请求
+            frame = encode(req_id)
+            self._pending[req_id] = (future, decode)
+            try:
+                self._sock.sendall(frame)
+            except OSError:
+                del self._pending[req_id]
+                raise
+        return future
+
+    def _read_loop(self):
+        header_size = protocol.HEADER.size
+        error = ConnectionError('连接已关闭')
+        try:
+            while True:
+                header = self._rfile.read(header_size)
+                if len(header) < header_size:
+                    break
+                size, status, req_id = protocol.parse_header(header)
+                body = self._rfile.read(size)
+                if len(body) < size:
+                    break
+                with self._lock:
+                    future, decode = self._pending.pop(req_id, (None, None))
+                if future is not None:
+                    _set_response(future, status, body, decode)
+        except (OSError, ValueError, exc.ErrorProtocol) as e:
+            error = e
+        with self._lock:
+            self.closed = True
+            pending, self._pending = self._pending, {}
+        for future, _ in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def close(self):
+        u"""关闭连接，在途的请求以ConnectionError结束."""
+        with self._lock:
+            self.closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._reader.join()
+        self._rfile.close()
+        self._sock.close()
+
+
+class LookupClient(object):
+    u"""多线程程序使用的查找服务客户端.
+
+    :param socket_path: 查找服务的Unix域套接字路径
+    :param pool_size: 连接数
+    :param window: hash_dev合并的时间窗口（秒），0表示不等待，只合并发送
+        前已排队的调用
+    :param max_batch: 一个批量请求最多合并的key数量
+    :param timeout: 连接和等待响应的超时（秒）
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH, pool_size=POOL_SIZE,
+                 window=WINDOW, max_batch=MAX_BATCH, timeout=TIMEOUT):
+        self.socket_path = socket_path
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        # 连接池，关闭后为None
+        self._pool = [None] * pool_size
+        self._pool_lock = threading.Lock()
+        self._next = itertools.count()
+        # 待合并的[(key, future)]
+        self._queue = []
+        self._cond = threading.Condition()
+        self._closed = False
+        # 在途的批量请求，关闭时等待其完成
+        self._inflight = set()
+        self._flusher = threading.Thread(target=self._flush_loop,
+                                         name='lookup-client-flusher')
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    def _connection(self):
+        u"""按轮流顺序取一个连接，已断开的重新连接."""
+        with self._pool_lock:
+            if self._pool is None:
+                raise ConnectionError('客户端已关闭')
+            i = next(self._next) % len(self._pool)
+            conn = self._pool[i]
+            if conn is None or conn.closed:
+                conn = self._pool[i] = _Connection(self.socket_path,
+                                                   self.timeout)
+            return conn
+
+    def _request(self, encode, decode):
+        return self._connection().request(encode, decode)
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                deadline = time.monotonic() + self.window
+                while len(self._queue) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+            for part in _split_batch(batch):
+                self._send_batch(part)
+
+    def _send_batch(self, batch):
+        keys = [key for key, _ in batch]
+        try:
+            future = self._request(
+                lambda req_id: protocol.encode_hash_many(req_id, keys),
+                protocol.decode_devs)
+        except Exception as e:
+            # 任何异常都只结束这一批调用，发送线程继续运行
+            _fail(batch, e)
+            return
+        with self._cond:
+            self._inflight.add(future)
+
+        def done(f):
+            with self._cond:
+                self._inflight.discard(f)
+            _deliver(batch, f)
+        future.add_done_callback(done)
+
+    def hash_dev_async(self, key):
+        u"""提交一个key的查找，与其他并发调用合并发送.
+
+        :param key: 指定key，无效时立即抛出ErrorInvalidParam
+        :return concurrent.futures.Future，结果为设备id
+        """
+        protocol.encode_key(key)
+        future = futures.Future()
+        with self._cond:
+            if self._closed:
+                raise ConnectionError('客户端已关闭')
+            self._queue.append((key, future))
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch:
+                self._cond.notify()
+        return future
+
+    def hash_dev(self, key):
+        u"""获取指定key hash到的设备.
+
+        :param key: 指定key
+        :return 设备id，ring为空时返回None
+        """
+        return self.hash_dev_async(key).result(self.timeout)
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备，直接作为批量请求发送.
+
+        超过一个请求上限的key按protocol.split_keys拆分为多个请求，同时发出。
+
+        :param keys: key序列
+        :return 按输入顺序排列的设备id列表
+        """
+        futures = [self._request(
+            lambda req_id, chunk=chunk: protocol.encode_hash_many(req_id,
+                                                                  chunk),
+            protocol.decode_devs) for chunk in protocol.split_keys(keys)]
+        result = []
+        for future in futures:
+            result.extend(future.result(self.timeout))
+        return result
+
+    def stats(self):
+        u"""返回查找服务的监控指标."""
+        return self._request(protocol.encode_stats,
+                             protocol.decode_json).result(self.timeout)
+
+    def close(self):
+        u"""发送已排队的调用后关闭所有连接."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        with self._cond:
+            inflight = list(self._inflight)
+        futures.wait(inflight, self.timeout)
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        for conn in pool:
+            if conn is not None:
+                conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _AsyncConnection(object):
+    u"""到查找服务的一个asyncio连接，读取任务按请求id分发响应."""
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._req_ids = itertools.count(1)
+        # {请求id: (future, 解析函数)}
+        self._pending = {}
+        self.closed = False
+        self._task = asyncio.get_running_loop().create_task(
+            self._read_loop())
+
+    @classmethod
+    async def open(cls, socket_path):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        return cls(reader, writer)
+
+    def request(self, encode, decode):
+        u"""发送请求，不等待响应，参数见_Connection.request.
+
+        :return asyncio.Future
+        """
+        if self.closed:
+            raise ConnectionError('连接已关闭')
+        req_id = next(self._req_ids) & _REQ_ID_MASK
+        # 先编码再登记，编码失败时不留下无人应答的请求
+        frame = encode(req_id)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[req_id] = (future, decode)
+        self._writer.write(frame)
+        return future
+
+    async def _read_loop(self):
+        header_size = protocol.HEADER.size
+        error = ConnectionError('连接已关闭')
+        try:
+            while True:
+                size, status, req_id = protocol.parse_header(
+                    await self._reader.readexactly(header_size))
+                body = await self._reader.readexactly(size)
+                future, decode = self._pending.pop(req_id, (None, None))
+                if future is not None:
+                    _set_response(future, status, body, decode)
+        except (asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except (OSError, exc.ErrorProtocol) as e:
+            error = e
+        self.closed = True
+        pending, self._pending = self._pending, {}
+        for future, _ in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def close(self):
+        u"""关闭连接，在途的请求以ConnectionError结束."""
+        self.closed = True
+        self._writer.close()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class AsyncLookupClient(object):
+    u"""asyncio程序使用的查找服务客户端，参数见LookupClient.
+
+    连接在首次请求时建立，须在同一个事件循环中使用。
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH, pool_size=POOL_SIZE,
+                 window=WINDOW, max_batch=MAX_BATCH):
+        self.socket_path = socket_path
+        self.window = window
+        self.max_batch = max_batch
+        self._pool = [None] * pool_size
+        # 每个连接槽位一把锁，并发请求不会为同一槽位重复建立连接
+        self._slot_locks = [asyncio.Lock() for _ in range(pool_size)]
+        self._next = itertools.count()
+        # 待合并的[(key, future)]及定时发送的句柄
+        self._queue = []
+        self._timer = None
+        self._closed = False
+        # 在途的批量请求任务，关闭时等待其完成
+        self._tasks = set()
+
+    async def _connection(self):
+        u"""按轮流顺序取一个连接，已断开的重新连接."""
+        if self._closed:
+            raise ConnectionError('客户端已关闭')
+        i = next(self._next) % len(self._pool)
+        conn = self._pool[i]
+        if conn is not None and not conn.closed:
+            return conn
+        async with self._slot_locks[i]:
+            conn = self._pool[i]
+            if conn is None or conn.closed:
+                conn = await _AsyncConnection.open(self.socket_path)
+                if self._closed:
+                    await conn.close()
+                    raise ConnectionError('客户端已关闭')
+                self._pool[i] = conn
+            return conn
+
+    async def _request(self, encode, decode):
+        conn = await self._connection()
+        return await conn.request(encode, decode)
+
+    def _flush(self):
+        u"""将队列中的调用合并为批量请求发送."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+            for part in _split_batch(batch):
+                task = asyncio.get_running_loop().create_task(
+                    self._send_batch(part))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _send_batch(self, batch):
+        keys = [key for key, _ in batch]
+        try:
+            dev_ids = await self._request(
+                lambda req_id: protocol.encode_hash_many(req_id, keys),
+                protocol.decode_devs)
+        except Exception as e:
+            # 任何异常都只结束这一批调用
+            _fail(batch, e)
+            return
+        for (_, waiter), dev_id in zip(batch, dev_ids):
+            if not waiter.done():
+                waiter.set_result(dev_id)
+
+    async def hash_dev(self, key):
+        u"""获取指定key hash到的设备，与其他并发调用合并发送.
+
+        :param key: 指定key，无效时立即抛出ErrorInvalidParam
+        :return 设备id，ring为空时返回None
+        """
+        if self._closed:
+            raise ConnectionError('客户端已关闭')
+        protocol.encode_key(key)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((key, future))
+        if len(self._queue) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    async def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备，直接作为批量请求发送.
+
+        超过一个请求上限的key按protocol.split_keys拆分为多个请求，同时发出。
+
+        :param keys: key序列
+        :return 按输入顺序排列的设备id列表
+        """
+        parts = await asyncio.gather(*[self._request(
+            lambda req_id, chunk=chunk: protocol.encode_hash_many(req_id,
+                                                                  chunk),
+            protocol.decode_devs) for chunk in protocol.split_keys(keys)])
+        return [dev_id for part in parts for dev_id in part]
+
+    async def stats(self):
+        u"""返回查找服务的监控指标."""
+        return await self._request(protocol.encode_stats,
+                                   protocol.decode_json)
+
+    async def close(self):
+        u"""发送已排队的调用后关闭所有连接."""
+        if self._closed:
+            return
+        self._flush()
+        if self._tasks:
+            await asyncio.wait(list(self._tasks))
+        self._closed = True
+        pool, self._pool = self._pool, [None] * len(self._pool)
+        for conn in pool:
+            if conn is not None:
+                await conn.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
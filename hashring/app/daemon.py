@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+u"""常驻的ring查找服务.
+
+启动时加载一次RingFile，在Unix域套接字上以protocol模块的帧协议应答单个和
+批量查找；RingFile由ReloadingRing监视，变化后自动重新加载，查找不受影响。
+服务只读取RingFile，不加载BuilderFile，ring为空时返回没有设备。
+
+用法：ring-builder daemon <套接字路径> [RingFile]
+"""
+import asyncio
+import logging
+import os
+import signal
+import stat
+
+from hashring.app.reloader import ReloadingRing
+from hashring.common import exceptions as exc
+from hashring.common import protocol
+
+LOG = logging.getLogger(__name__)
+
+# 默认的套接字路径
+SOCKET_PATH = '/tmp/hashring.sock'
+
+
+class LookupDaemon(object):
+    u"""基于asyncio的查找服务.
+
+    :param ring_file: RingFile文件名，JSON或二进制格式
+    :param socket_path: Unix域套接字路径，已存在的套接字文件会被替换
+    :param interval: RingFile的检查间隔（秒），见ReloadingRing
+    :param use_inotify: 是否使用inotify，见ReloadingRing
+    """
+
+    def __init__(self, ring_file, socket_path=SOCKET_PATH, interval=1.0,
+                 use_inotify=None):
+        self.socket_path = socket_path
+        self.ring = ReloadingRing(ring_file, interval, use_inotify)
+        self._server = None
+        # 监控指标
+        self.connections = 0
+        self.requests = 0
+        self.keys = 0
+        self.errors = 0
+
+    def stats(self):
+        u"""返回监控指标，包括RingFile的重新加载情况."""
+        result = self.ring.stats()
+        result.update({
+            'connections': self.connections,
+            'requests': self.requests,
+            'keys': self.keys,
+            'errors': self.errors,
+        })
+        return result
+
+    def _remove_socket(self):
+        u"""删除遗留的套接字文件，不删除其他类型的文件."""
+        try:
+            if stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+    async def start(self):
+        u"""开始监听并启动RingFile的监视线程."""
+        self._remove_socket()
+        self._server = await asyncio.start_unix_server(
+            self._handle, path=self.socket_path)
+        self.ring.start()
+        LOG.info('查找服务已在%s上启动', self.socket_path)
+
+    async def stop(self):
+        u"""停止监听，关闭套接字并停止监视线程."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            self._remove_socket()
+        self.ring.stop()
+
+    async def serve_forever(self):
+        u"""启动服务并一直运行，收到SIGINT/SIGTERM或被取消时停止."""
+        await self.start()
+        loop = asyncio.get_running_loop()
+        stopped = loop.create_future()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stopped.cancel)
+            except (NotImplementedError, RuntimeError):
+                # 不在主线程中运行时无法设置信号处理
+                pass
+        try:
+            await stopped
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.remove_signal_handler(signum)
+                except (NotImplementedError, RuntimeError):
+                    pass
+            await self.stop()
+
+    def dispatch(self, code, req_id, body):
+        u"""处理一个请求.
+
+        :param code: 操作码
+        :param req_id: 请求id
+        :param body: 请求的帧体
+        :return 响应帧
+        """
+        self.requests += 1
+        try:
+            if code == protocol.OP_HASH:
+                self.keys += 1
+                return protocol.encode_dev(
+                    req_id, self.ring.hash_dev(body.decode('utf-8')))
+            if code == protocol.OP_HASH_MANY:
+                keys = protocol.decode_keys(body)
+                self.keys += len(keys)
+                return protocol.encode_devs(req_id,
+                                            self.ring.hash_dev_many(keys))
+            if code == protocol.OP_STATS:
+                return protocol.encode_json(req_id, self.stats())
+            raise exc.ErrorProtocol('不支持的操作码%s' % code)
+        except (exc.ErrorProtocol, UnicodeDecodeError) as e:
+            self.errors += 1
+            return protocol.encode_error(req_id, str(e))
+
+    async def _handle(self, reader, writer):
+        u"""处理一个连接上的请求，直到对方关闭连接或帧头无效."""
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(protocol.HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                size, code, req_id = protocol.parse_header(header)
+                body = await reader.readexactly(size)
+                writer.write(self.dispatch(code, req_id, body))
+                await writer.drain()
+        except exc.ErrorProtocol as e:
+            # 帧头无效时无法继续解析后续的帧，只能断开连接
+            self.errors += 1
+            LOG.warning('断开协议错误的连接：%s', e)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def run(ring_file, socket_path=SOCKET_PATH, interval=1.0):
+    u"""在当前线程运行查找服务，直到收到SIGINT/SIGTERM.
+
+    :param ring_file: RingFile文件名
+    :param socket_path: Unix域套接字路径
+    :param interval: RingFile的检查间隔（秒）
+    """
+    asyncio.run(LookupDaemon(ring_file, socket_path,
+                             interval).serve_forever())
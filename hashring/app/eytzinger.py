@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+u"""Eytzinger布局的有序虚拟分区数组.
+
+将有序的整数点按完全二叉树的层序（BFS）排列在连续数组中，下标k的左右子节点
+为2k和2k + 1，下标0不用。查找时从根节点向下走，每步只需一次比较和一次下标
+计算，前几层集中在数组开头，访问局部性好于在有序数组上二分。rank记录每个位置
+在有序数组中的下标，查找结果与在有序数组上二分完全一致。
+
+纯Python逐层比较慢于C实现的bisect，因此只用于安装了NumPy时的向量化批量
+查找（search_array）；find_index是同一算法的逐个版本，便于对照。
+"""
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _inorder(n):
+    u"""按中序生成n个节点的完全二叉树的层序下标.
+
+    高度为h的满二叉树中，中序第i个节点（从1开始）的层序下标为
+    (i >> (t + 1)) + 2 ** (h - 1 - t)，t为i末尾0的个数；n个节点的完全
+    二叉树是满二叉树的层序前缀，去掉超过n的下标即可。
+    """
+    height = n.bit_length()
+    for i in range(1, 1 << height):
+        tz = (i & -i).bit_length() - 1
+        k = (i >> (tz + 1)) + (1 << (height - 1 - tz))
+        if k <= n:
+            yield k
+
+
+def build_layout(sorted_keys):
+    u"""构建Eytzinger布局，安装了NumPy时向量化构建.
+
+    :param sorted_keys: 有序的虚拟分区数组
+    :return (layout, rank)：layout为array('Q')，rank为array('q')，长度均为
+        n + 1；layout[k]为层序第k个节点的整数点，rank[k]为它在sorted_keys
+        中的下标，rank[0]为0，即回绕到第一个虚拟分区
+    """
+    n = len(sorted_keys)
+    if np is None:
+        layout = array('Q', [0]) * (n + 1)
+        rank = array('q', [0]) * (n + 1)
+        for i, k in enumerate(_inorder(n)):
+            layout[k] = sorted_keys[i]
+            rank[k] = i
+        return layout, rank
+    height = n.bit_length()
+    i = np.arange(1, 1 << height, dtype=np.int64)
+    tz = np.log2(i & -i).astype(np.int64)
+    order = (i >> (tz + 1)) + np.left_shift(1, height - 1 - tz)
+    order = order[order <= n]
+    layout = np.zeros(n + 1, dtype=np.uint64)
+    layout[order] = np.asarray(sorted_keys, dtype=np.uint64)
+    rank = np.zeros(n + 1, dtype=np.int64)
+    rank[order] = np.arange(n, dtype=np.int64)
+    return array('Q', layout.tobytes()), array('q', rank.tobytes())
+
+
+def find_index(layout, rank, key):
+    u"""在Eytzinger布局中查找第一个不小于key的虚拟分区.
+
+    从根节点向下走到叶子之外，再去掉下标末尾连续的1及其前一位，得到最后一次
+    向左走的节点，即第一个不小于key的节点；一直向右走时为0。
+
+    :param layout: build_layout返回的layout
+    :param rank: build_layout返回的rank
+    :param key: 已哈希的key
+    :return 虚拟分区在有序数组中的下标，超过最后一个时回绕为0，环为空时返回-1
+    """
+    n = len(layout) - 1
+    if n <= 0:
+        return -1
+    k = 1
+    while k <= n:
+        k = 2 * k + (layout[k] < key)
+    k >>= ((~k) & (k + 1)).bit_length()
+    return rank[k]
+
+
+def search_array(layout, rank, points):
+    u"""向量化地在Eytzinger布局中查找一批整数点，需要NumPy.
+
+    所有点同步向下走，每层一次gather，层数为树高。
+
+    :param layout: build_layout返回的layout，或对应的uint64 ndarray
+    :param rank: build_layout返回的rank，或对应的int64 ndarray
+    :param points: 已哈希的整数点数组
+    :return 虚拟分区在有序数组中的下标，int64的ndarray
+    """
+    layout = np.asarray(layout, dtype=np.uint64)
+    rank = np.asarray(rank, dtype=np.int64)
+    points = np.asarray(points, dtype=np.uint64)
+    n = len(layout) - 1
+    k = np.ones(len(points), dtype=np.int64)
+    for _ in range(n.bit_length()):
+        inside = k <= n
+        node = layout[np.where(inside, k, 0)]
+        k = np.where(inside, 2 * k + (node < points), k)
+    k >>= np.log2((~k) & (k + 1)).astype(np.int64) + 1
+    return rank[k]
+
+
+def lookup_array(layout, rank, dev_ids, points):
+    u"""向量化地查找一批整数点落到的设备，需要NumPy.
+
+    :param layout: build_layout返回的layout，环不为空
+    :param rank: build_layout返回的rank
+    :param dev_ids: 与有序虚拟分区一一对应的设备id数组
+    :param points: 已哈希的整数点数组
+    :return 设备id，int64的ndarray
+    """
+    devs = np.asarray(dev_ids, dtype=np.int64)
+    return devs[search_array(layout, rank, points)]
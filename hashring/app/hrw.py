@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+u"""加权最高随机权重（rendezvous/HRW）哈希的ring.
+
+对每个key，每个设备由key和设备的哈希值得到一个(0, 1)内的随机数u，
+得分为weight / -ln(u)，得分最高的设备即为key所在的设备，依次取得分最高的
+前N个设备作为副本。设备增删或权重变化时只有得分排名受影响的key移动，
+不需要虚拟分区，适用于设备较少、权重经常变化的场景。
+
+安装了NumPy时对所有设备的打分向量化计算，否则逐个计算，两者结果一致。
+"""
+import math
+
+from hashring.common.utils import DEFAULT_HASH, get_hash
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_MASK = (1 << 64) - 1
+# 设备数量不少于该值时单个key的打分也使用NumPy
+VECTOR_MIN_DEVICES = 16
+# 批量查找时每次向量化计算的(key, 设备)得分数量上限
+_CHUNK_SCORES = 1 << 20
+
+
+def mix64(x):
+    u"""splitmix64的终结函数，将64位整数打散."""
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & _MASK
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & _MASK
+    return x ^ (x >> 31)
+
+
+def score(point, seed, weight):
+    u"""计算设备对key的得分.
+
+    :param point: key的整数点
+    :param seed: 设备的哈希种子
+    :param weight: 设备权重
+    """
+    u = ((mix64(point ^ seed) >> 11) + 0.5) * 2.0 ** -53
+    return weight / -math.log(u)
+
+
+def _mix64_array(x):
+    u"""mix64的NumPy版本，uint64乘法自然回绕."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def score_array(points, seeds, weights):
+    u"""向量化计算得分，points与seeds按NumPy规则广播."""
+    u = ((_mix64_array(points ^ seeds) >> np.uint64(11)).astype(np.float64) +
+         0.5) * 2.0 ** -53
+    return weights / -np.log(u)
+
+
+class HRWRing(object):
+    u"""加权最高随机权重哈希的ring，构建后不再修改.
+
+    :param weights: {设备id: 权重}，直接使用设备的dev_weight
+    :param hash_name: 哈希函数名，见utils.HASH_FUNCS
+    """
+
+    MODE = 'hrw'
+    # 构建时使用的设备权重字段
+    WEIGHT = 'dev_weight'
+
+    def __init__(self, weights, hash_name=DEFAULT_HASH):
+        self.hash_name = hash_name
+        self._hash = get_hash(hash_name)
+        self._dev_ids = sorted(dev_id for dev_id, weight in weights.items()
+                               if weight > 0)
+        self._weights = [float(weights[dev_id]) for dev_id in self._dev_ids]
+        # 设备的哈希种子，由设备id哈希得到，与设备在表中的位置无关
+        self._seeds = [self._hash('device_%s' % dev_id)
+                       for dev_id in self._dev_ids]
+        if np is not None:
+            self._dev_array = np.array(self._dev_ids, dtype=np.int64)
+            self._weight_array = np.array(self._weights, dtype=np.float64)
+            self._seed_array = np.array(self._seeds, dtype=np.uint64)
+
+    @property
+    def dev_ids(self):
+        u"""权重大于0的设备id，有序."""
+        return tuple(self._dev_ids)
+
+    def __len__(self):
+        return len(self._dev_ids)
+
+    @classmethod
+    def build(cls, weights, old=None, hash_name=None):
+        u"""按设备权重构建ring，与旧的ring无关.
+
+        :param weights: {设备id: 权重}
+        :param old: 旧的HRWRing，只沿用其哈希函数
+        :param hash_name: 哈希函数名，默认沿用old的，没有old时为DEFAULT_HASH
+        """
+        if hash_name is None:
+            hash_name = old.hash_name if old is not None else DEFAULT_HASH
+        return cls(weights, hash_name)
+
+    @classmethod
+    def from_dict(cls, data):
+        u"""从RingFile数据中加载，设备权重即RingFile中的weights."""
+        return cls(dict((int(dev_id), weight)
+                        for dev_id, weight in data['weights'].items()),
+                   data.get('hash', DEFAULT_HASH))
+
+    def to_dict(self):
+        u"""生成RingFile数据，设备权重由dump_table保存."""
+        return {
+            'hash': self.hash_name,
+        }
+
+    def _vectorized(self):
+        return np is not None and len(self._dev_ids) >= VECTOR_MIN_DEVICES
+
+    def _rank(self, point):
+        u"""返回各设备按得分从高到低排列的下标."""
+        if self._vectorized():
+            scores = score_array(np.uint64(point), self._seed_array,
+                                 self._weight_array)
+            return np.argsort(-scores, kind='stable').tolist()
+        scores = [score(point, seed, weight)
+                  for seed, weight in zip(self._seeds, self._weights)]
+        return sorted(range(len(scores)), key=lambda i: -scores[i])
+
+    def hash_dev(self, key):
+        u"""获取指定key hash到的设备.
+
+        :param key: 指定key
+        :return 设备id，没有设备时返回None
+        """
+        if not self._dev_ids:
+            return None
+        point = self._hash(key)
+        if self._vectorized():
+            scores = score_array(np.uint64(point), self._seed_array,
+                                 self._weight_array)
+            return self._dev_ids[int(np.argmax(scores))]
+        best, best_score = None, -1.0
+        for dev_id, seed, weight in zip(self._dev_ids, self._seeds,
+                                        self._weights):
+            value = score(point, seed, weight)
+            if value > best_score:
+                best, best_score = dev_id, value
+        return best
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序生成设备id
+        """
+        for key in keys:
+            yield self.hash_dev(key)
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备，安装了NumPy时分块向量化计算.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序排列的设备id列表
+        """
+        if np is None or not self._dev_ids:
+            return list(self.iter_hash_dev(keys))
+        points = np.array([self._hash(key) for key in keys], dtype=np.uint64)
+        chunk = max(1, _CHUNK_SCORES // len(self._dev_ids))
+        result = []
+        for start in range(0, len(points), chunk):
+            scores = score_array(points[start:start + chunk, None],
+                                 self._seed_array, self._weight_array)
+            result.extend(self._dev_array[np.argmax(scores, axis=1)].tolist())
+        return result
+
+    def get_nodes(self, key, replicas):
+        u"""获取指定key的多个副本所在的设备，即得分最高的前replicas个设备.
+
+        :param key: 指定key
+        :param replicas: 副本数
+        :return 设备id列表，第一个与hash_dev一致
+        """
+        if not self._dev_ids:
+            return []
+        order = self._rank(self._hash(key))
+        return [self._dev_ids[i] for i in order[:replicas]]
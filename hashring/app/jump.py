@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+u"""跳跃一致性哈希（jump consistent hash）的ring.
+
+设备按顺序编号为桶，key的整数点经跳跃算法得到桶号，再查桶表得到设备id。
+不需要虚拟分区，各桶负载完全均衡；在末尾增删设备时只移动必要的key。
+不支持权重，各设备的负载相同。
+"""
+from hashring.common.utils import DEFAULT_HASH, get_hash
+
+_MASK = (1 << 64) - 1
+# 跳跃算法中的线性同余生成器乘数
+_JUMP_MULTIPLIER = 2862933555777941757
+# 生成副本时扰动整数点的步长（2^64 / 黄金分割比）
+_REPLICA_STEP = 0x9e3779b97f4a7c15
+
+
+def jump_hash(point, buckets):
+    u"""跳跃一致性哈希.
+
+    :param point: 64位整数点
+    :param buckets: 桶的数量
+    :return 桶号，范围为[0, buckets)，buckets为0时返回-1
+    """
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        point = (point * _JUMP_MULTIPLIER + 1) & _MASK
+        j = int((b + 1) * (float(1 << 31) / float((point >> 33) + 1)))
+    return b
+
+
+def assign_buckets(dev_ids, old=None):
+    u"""构建桶表，尽量保持已有设备的桶号不变.
+
+    删除设备空出的桶优先由新设备补上，没有新设备时由末尾的设备补上，
+    只有被删除设备和补位设备上的key需要移动；其余新设备追加到末尾。
+
+    :param dev_ids: 设备id的可迭代对象
+    :param old: 旧的桶表，可选
+    :return 桶表，即按桶号排列的设备id列表
+    """
+    dev_ids = set(dev_ids)
+    table = list(old or ())
+    added = sorted(dev_ids - set(table))
+    i = 0
+    while i < len(table):
+        if table[-1] not in dev_ids:
+            # 末尾被删除的桶直接去掉
+            table.pop()
+        elif table[i] not in dev_ids:
+            table[i] = added.pop(0) if added else table.pop()
+            i += 1
+        else:
+            i += 1
+    return table + added
+
+
+class JumpRing(object):
+    u"""跳跃一致性哈希的ring，构建后不再修改.
+
+    :param buckets: 桶表，按桶号排列的设备id列表
+    :param hash_name: 哈希函数名，见utils.HASH_FUNCS
+    """
+
+    MODE = 'jump'
+    # 构建时使用的设备权重字段
+    WEIGHT = 'part_num'
+
+    def __init__(self, buckets, hash_name=DEFAULT_HASH):
+        self._buckets = tuple(buckets)
+        self.hash_name = hash_name
+        self._hash = get_hash(hash_name)
+
+    @property
+    def buckets(self):
+        u"""桶表，只读."""
+        return self._buckets
+
+    def __len__(self):
+        return len(self._buckets)
+
+    @classmethod
+    def build(cls, weights, old=None, hash_name=None):
+        u"""按设备构建ring，不使用权重.
+
+        :param weights: {设备id: 权重}
+        :param old: 旧的JumpRing，尽量保持其桶号
+        :param hash_name: 哈希函数名，默认沿用old的，没有old时为DEFAULT_HASH
+        """
+        if hash_name is None:
+            hash_name = old.hash_name if old is not None else DEFAULT_HASH
+        return cls(assign_buckets(weights, old.buckets if old else None),
+                   hash_name)
+
+    @classmethod
+    def from_dict(cls, data):
+        u"""从RingFile数据中加载."""
+        return cls(data['buckets'], data.get('hash', DEFAULT_HASH))
+
+    def to_dict(self):
+        u"""生成RingFile数据."""
+        return {
+            'buckets': list(self._buckets),
+            'hash': self.hash_name,
+        }
+
+    def hash_dev(self, key):
+        u"""获取指定key hash到的设备.
+
+        :param key: 指定key
+        :return 设备id，没有设备时返回None
+        """
+        if not self._buckets:
+            return None
+        return self._buckets[jump_hash(self._hash(key), len(self._buckets))]
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序生成设备id
+        """
+        buckets = self._buckets
+        size = len(buckets)
+        for point in map(self._hash, keys):
+            yield buckets[jump_hash(point, size)] if size else None
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序排列的设备id列表
+        """
+        return list(self.iter_hash_dev(keys))
+
+    def get_nodes(self, key, replicas):
+        u"""获取指定key的多个副本所在的设备.
+
+        第i个副本以扰动后的整数点再做一次跳跃哈希，与已选设备重复时继续
+        扰动，多次仍不足时按桶号顺序补齐。
+
+        :param key: 指定key
+        :param replicas: 副本数
+        :return 设备id列表，第一个与hash_dev一致
+        """
+        buckets = self._buckets
+        size = len(buckets)
+        replicas = min(replicas, size)
+        point = self._hash(key)
+        chosen = []
+        for step in range(replicas * 4):
+            bucket = jump_hash((point + step * _REPLICA_STEP) & _MASK, size)
+            if bucket not in chosen:
+                chosen.append(bucket)
+                if len(chosen) == replicas:
+                    break
+        bucket = chosen[-1] if chosen else 0
+        while len(chosen) < replicas:
+            bucket = (bucket + 1) % size
+            if bucket not in chosen:
+                chosen.append(bucket)
+        return [buckets[bucket] for bucket in chosen]
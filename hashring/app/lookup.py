@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+import bisect
+import itertools
+from array import array
+
+from hashring.app import eytzinger
+from hashring.common import exceptions as exc
+from hashring.common.utils import DEFAULT_HASH, POINT_BITS, get_hash
+
+
+# 后继设备表的默认宽度，即预计算的副本数
+REPLICAS = 3
+# 前缀索引的位数上限，索引有2 ** MAX_PREFIX_BITS + 1项
+MAX_PREFIX_BITS = 24
+# 查找结构的布局：在有序数组上二分，或在Eytzinger布局上查找
+SORTED_LAYOUT = 'sorted'
+EYTZINGER_LAYOUT = 'eytzinger'
+
+
+def find_index(sorted_keys, key):
+    u"""在有序虚拟分区列表中查找key落到的位置.
+
+    二分查找第一个不小于key的虚拟分区，key大于最后一个分区时回绕到第一个。
+
+    :param sorted_keys: 有序的虚拟分区列表
+    :param key: 已哈希的key
+    :return 虚拟分区下标，列表为空时返回-1
+    """
+    if not sorted_keys:
+        return -1
+    idx = bisect.bisect_left(sorted_keys, key)
+    if idx == len(sorted_keys):
+        # 回绕到环上的第一个虚拟分区
+        idx = 0
+    return idx
+
+
+def build_prefix_index(sorted_keys, bits):
+    u"""构建整数点高bits位的前缀索引.
+
+    index[p]为第一个高bits位不小于p的虚拟分区下标，高bits位为p的点落到的
+    分区必在index[p]到index[p + 1]之间（含两端），查找时只需在这一小段内
+    二分。按前缀计数后求前缀和，耗时O(n + 2 ** bits)。
+
+    :param sorted_keys: 有序的虚拟分区数组
+    :param bits: 前缀位数
+    :return array('q')，长度为2 ** bits + 1
+    """
+    shift = POINT_BITS - bits
+    counts = [0] * ((1 << bits) + 1)
+    for point in sorted_keys:
+        counts[(point >> shift) + 1] += 1
+    return array('q', itertools.accumulate(counts))
+
+
+def find_index_prefix(sorted_keys, index, shift, key):
+    u"""借助前缀索引查找key落到的位置，结果与find_index一致.
+
+    :param sorted_keys: 有序的虚拟分区列表，不为空
+    :param index: build_prefix_index的结果
+    :param shift: 整数点右移shift位得到前缀
+    :param key: 已哈希的key
+    :return 虚拟分区下标
+    """
+    prefix = key >> shift
+    idx = bisect.bisect_left(sorted_keys, key, index[prefix],
+                             index[prefix + 1])
+    return idx if idx < len(sorted_keys) else 0
+
+
+def iter_lookup(sorted_keys, dev_ids, points):
+    u"""批量查找整数点落到的设备.
+
+    :param sorted_keys: 有序的虚拟分区列表
+    :param dev_ids: 与sorted_keys一一对应的设备id列表
+    :param points: 已哈希的整数点，可为任意可迭代对象
+    :return 按输入顺序逐个生成设备id，环为空时生成None
+    """
+    size = len(sorted_keys)
+    if not size:
+        for _ in points:
+            yield None
+        return
+    bisect_left = bisect.bisect_left
+    for point in points:
+        idx = bisect_left(sorted_keys, point)
+        yield dev_ids[idx if idx < size else 0]
+
+
+def iter_lookup_prefix(sorted_keys, dev_ids, index, shift, points):
+    u"""借助前缀索引批量查找整数点落到的设备，参数见iter_lookup和
+    find_index_prefix.
+    """
+    size = len(sorted_keys)
+    if not size:
+        for _ in points:
+            yield None
+        return
+    bisect_left = bisect.bisect_left
+    for point in points:
+        prefix = point >> shift
+        idx = bisect_left(sorted_keys, point, index[prefix],
+                          index[prefix + 1])
+        yield dev_ids[idx if idx < size else 0]
+
+
+def merge_points(sorted_keys, dev_ids, pairs):
+    u"""将一批虚拟分区有序地并入环中.
+
+    先对新增的一批分区排序，再逐个二分定位插入位置，未变动的区间整段拷贝，
+    耗时与新增数量及一次数组拷贝成正比，无需对整个环重新排序。
+
+    :param sorted_keys: 有序的虚拟分区数组
+    :param dev_ids: 与sorted_keys一一对应的设备id数组
+    :param pairs: 新增的(整数点, 设备id)序列
+    :return 合并后新的(sorted_keys, dev_ids)
+    """
+    new_keys = array(sorted_keys.typecode)
+    new_devs = array(dev_ids.typecode)
+    lo = 0
+    for point, dev_id in sorted(pairs):
+        idx = bisect.bisect_left(sorted_keys, point, lo)
+        new_keys += sorted_keys[lo:idx]
+        new_devs += dev_ids[lo:idx]
+        new_keys.append(point)
+        new_devs.append(dev_id)
+        lo = idx
+    new_keys += sorted_keys[lo:]
+    new_devs += dev_ids[lo:]
+    return new_keys, new_devs
+
+
+def remove_points(sorted_keys, dev_ids, points):
+    u"""从环中删除一批虚拟分区.
+
+    二分定位每个待删除分区后一次遍历拼接保留的区间。
+
+    :param sorted_keys: 有序的虚拟分区数组
+    :param dev_ids: 与sorted_keys一一对应的设备id数组
+    :param points: 待删除的整数点序列
+    :return 删除后新的(sorted_keys, dev_ids)，有分区不存在时抛出KeyError
+    """
+    size = len(sorted_keys)
+    removed = []
+    for point in points:
+        idx = bisect.bisect_left(sorted_keys, point)
+        if idx == size or sorted_keys[idx] != point:
+            raise KeyError(point)
+        removed.append(idx)
+    new_keys = array(sorted_keys.typecode)
+    new_devs = array(dev_ids.typecode)
+    lo = 0
+    for idx in sorted(set(removed)):
+        new_keys += sorted_keys[lo:idx]
+        new_devs += dev_ids[lo:idx]
+        lo = idx + 1
+    new_keys += sorted_keys[lo:]
+    new_devs += dev_ids[lo:]
+    return new_keys, new_devs
+
+
+def build_successors(dev_ids, width):
+    u"""预计算每个虚拟分区顺时针方向的前width个不同设备.
+
+    从环尾向前递推：第i行为dev_ids[i]加上第i+1行中除它以外的设备，
+    扫描两圈以处理回绕，耗时O(n * width)。
+
+    :param dev_ids: 与有序虚拟分区一一对应的设备id数组
+    :param width: 每行的设备数量
+    :return 扁平的array('q')，第i行为table[i * width:(i + 1) * width]，
+        环上不同设备不足width个时以-1补齐
+    """
+    size = len(dev_ids)
+    table = array('q', [-1]) * (size * width)
+    row = ()
+    for i in range(2 * size - 1, -1, -1):
+        row = _next_row(row, dev_ids[i % size], width)
+        if i < size:
+            table[i * width:i * width + len(row)] = array('q', row)
+    return table
+
+
+def walk_successors(dev_ids, idx, count):
+    u"""从第idx个虚拟分区开始顺时针查找前count个不同设备.
+
+    :param dev_ids: 与有序虚拟分区一一对应的设备id数组
+    :param idx: 起始虚拟分区下标
+    :param count: 设备数量
+    :return 设备id列表，环上不同设备不足count个时返回全部设备
+    """
+    size = len(dev_ids)
+    nodes = []
+    for step in range(size):
+        dev_id = dev_ids[(idx + step) % size]
+        if dev_id not in nodes:
+            nodes.append(dev_id)
+            if len(nodes) == count:
+                break
+    return nodes
+
+
+def _tier_prefixes(tiers, dev_ids):
+    u"""返回{设备id: [(region,), (region, zone), ..., (region, ..., 设备id)]}."""
+    prefixes = {}
+    for dev_id in dev_ids:
+        location = tuple(tiers.get(dev_id, ())) + (dev_id,)
+        prefixes[dev_id] = [location[:i] for i in range(1, len(location) + 1)]
+    return prefixes
+
+
+def pick_diverse(candidates, count, tiers, prefixes=None):
+    u"""按故障域从候选设备中挑选副本.
+
+    依次挑选与已选设备共有故障域层级最少的设备，层级相同时取顺时针方向
+    最近的，第一个总是候选中的第一个。
+
+    :param candidates: 顺时针方向的不同设备id序列
+    :param count: 副本数
+    :param tiers: {设备id: (region, zone, host)}
+    :param prefixes: 预先算好的_tier_prefixes结果，可选
+    :return 设备id列表
+    """
+    if prefixes is None:
+        prefixes = _tier_prefixes(tiers, candidates)
+    remaining = list(candidates)
+    nodes = []
+    # 已选设备所在的各级故障域
+    used = set()
+    while remaining and len(nodes) < count:
+        best, best_level = 0, None
+        for i, dev_id in enumerate(remaining):
+            level = 0
+            for prefix in prefixes[dev_id]:
+                if prefix not in used:
+                    break
+                level += 1
+            if best_level is None or level < best_level:
+                best, best_level = i, level
+                if level == 0:
+                    break
+        dev_id = remaining.pop(best)
+        nodes.append(dev_id)
+        used.update(prefixes[dev_id])
+    return nodes
+
+
+def _next_row(row, dev_id, width):
+    u"""由后一个位置的不同设备序列递推当前位置的序列."""
+    if dev_id in row:
+        idx = row.index(dev_id)
+        return (dev_id,) + row[:idx] + row[idx + 1:]
+    return ((dev_id,) + row)[:width]
+
+
+def build_diverse_successors(dev_ids, width, tiers, candidates=None):
+    u"""预计算每个虚拟分区按故障域挑选的width个副本设备.
+
+    与build_successors同样递推出每个位置顺时针方向的前candidates个不同设备，
+    再用pick_diverse挑选。挑选在构建时完成，查找耗时不随故障域层级数增长。
+
+    :param dev_ids: 与有序虚拟分区一一对应的设备id数组
+    :param width: 每行的设备数量
+    :param tiers: {设备id: (region, zone, host)}
+    :param candidates: 每个位置参与挑选的候选设备数量，默认为width的4倍
+    :return 扁平的array('q')，格式同build_successors
+    """
+    candidates = candidates or width * 4
+    size = len(dev_ids)
+    prefixes = _tier_prefixes(tiers, set(dev_ids))
+    table = array('q', [-1]) * (size * width)
+    row = ()
+    for i in range(2 * size - 1, -1, -1):
+        row = _next_row(row, dev_ids[i % size], candidates)
+        if i < size:
+            nodes = pick_diverse(row, width, tiers, prefixes)
+            table[i * width:i * width + len(nodes)] = array('q', nodes)
+    return table
+
+
+class RingView(object):
+    u"""只读的环，在有序虚拟分区数组上查找.
+
+    作为环的不可变快照使用：构建后不再修改传入的数组，修改环时构建新的
+    RingView替换旧的，多个线程可以不加锁地并发查找。
+
+    :param sorted_keys: 有序的虚拟分区数组
+    :param dev_ids: 与sorted_keys一一对应的设备id数组
+    :param replicas: 后继设备表的宽度，get_nodes不超过该副本数时查表
+    :param tiers: {设备id: (region, zone, host)}，提供时get_nodes按故障域
+        挑选副本
+    :param hash_name: 哈希函数名，见utils.HASH_FUNCS
+    :param prefix_bits: 前缀索引的位数，0表示不使用前缀索引
+    :param layout: 批量查找结构的布局，SORTED_LAYOUT或EYTZINGER_LAYOUT。
+        后者只在安装了NumPy时构建，供hash_dev_many和place_points向量化查找；
+        逐个查找总是在有序数组上二分，C实现的二分快于Python的逐层比较。
+        不能与前缀索引同时使用
+    """
+
+    def __init__(self, sorted_keys, dev_ids, replicas=REPLICAS, tiers=None,
+                 hash_name=DEFAULT_HASH, prefix_bits=0,
+                 layout=SORTED_LAYOUT):
+        if not 0 <= prefix_bits <= MAX_PREFIX_BITS:
+            raise exc.ErrorInvalidParam('prefix_bits，须在0到%s之间'
+                                        % MAX_PREFIX_BITS)
+        if layout not in (SORTED_LAYOUT, EYTZINGER_LAYOUT):
+            raise exc.ErrorInvalidParam('layout，不支持此布局')
+        if layout == EYTZINGER_LAYOUT and prefix_bits:
+            raise exc.ErrorInvalidParam('layout，Eytzinger布局不能与前缀索引'
+                                        '同时使用')
+        self._sorted_keys = sorted_keys
+        self._dev_ids = dev_ids
+        self.replicas = replicas
+        self.tiers = tiers or {}
+        self.hash_name = hash_name
+        self._hash = get_hash(hash_name)
+        self.prefix_bits = prefix_bits
+        # 前缀索引，构建快照时一并构建，查找时先查索引再在小段内二分
+        self._shift = POINT_BITS - prefix_bits
+        self._prefix_index = (build_prefix_index(sorted_keys, prefix_bits)
+                              if prefix_bits and sorted_keys else None)
+        # Eytzinger布局的(layout, rank)，构建快照时一并构建
+        self.layout = layout
+        self._eytzinger = None
+        if (layout == EYTZINGER_LAYOUT and eytzinger.np is not None and
+                sorted_keys):
+            self._eytzinger = eytzinger.build_layout(sorted_keys)
+        # 后继设备表，由successors构建，RingManager在发布快照前构建
+        self._successors = None
+
+    @property
+    def sorted_keys(self):
+        u"""有序的虚拟分区数组，只读."""
+        return self._sorted_keys
+
+    @property
+    def dev_ids(self):
+        u"""与sorted_keys一一对应的设备id数组，只读."""
+        return self._dev_ids
+
+    @property
+    def eytzinger(self):
+        u"""Eytzinger布局的(layout, rank)，没有构建时为None."""
+        return self._eytzinger
+
+    def __len__(self):
+        return len(self._sorted_keys)
+
+    def _find(self, point):
+        u"""返回整数点落到的虚拟分区下标，环为空时返回-1."""
+        if self._prefix_index is None:
+            return find_index(self._sorted_keys, point)
+        return find_index_prefix(self._sorted_keys, self._prefix_index,
+                                 self._shift, point)
+
+    def hash_dev(self, key):
+        u"""获取指定key hash到的设备.
+
+        :param key: 指定key
+        :return 设备id，环为空时返回None
+        """
+        idx = self._find(self._hash(key))
+        if idx < 0:
+            return None
+        return self._dev_ids[idx]
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序生成设备id
+        """
+        if self._prefix_index is None:
+            return iter_lookup(self._sorted_keys, self._dev_ids,
+                               map(self._hash, keys))
+        return iter_lookup_prefix(self._sorted_keys, self._dev_ids,
+                                  self._prefix_index, self._shift,
+                                  map(self._hash, keys))
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备.
+
+        构建了Eytzinger布局时哈希后一次向量化查找。
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序排列的设备id列表
+        """
+        if self._eytzinger is None:
+            return list(self.iter_hash_dev(keys))
+        np = eytzinger.np
+        points = np.fromiter(map(self._hash, keys), dtype=np.uint64)
+        return eytzinger.lookup_array(self._eytzinger[0], self._eytzinger[1],
+                                      self._dev_ids, points).tolist()
+
+    def successors(self):
+        u"""返回后继设备表，见build_successors.
+
+        没有构建时构建。RingManager在发布快照前调用，查找时直接使用；
+        其他来源的快照首次调用时构建，并发构建的结果相同，无需加锁。
+        """
+        if self._successors is None:
+            if self.tiers:
+                self._successors = build_diverse_successors(
+                    self._dev_ids, self.replicas, self.tiers)
+            else:
+                self._successors = build_successors(self._dev_ids,
+                                                    self.replicas)
+        return self._successors
+
+    def get_nodes(self, key, replicas=REPLICAS):
+        u"""获取指定key的多个副本所在的设备.
+
+        从key落到的虚拟分区开始顺时针取前replicas个不同的设备，设置了故障域
+        时优先挑选处于不同region/zone/host的设备。副本数不超过后继设备表的
+        宽度时只需一次二分查找加一次查表。
+
+        :param key: 指定key
+        :param replicas: 副本数
+        :return 设备id列表，第一个与hash_dev一致；环上不同设备不足时
+            返回全部设备
+        """
+        idx = self._find(self._hash(key))
+        if idx < 0:
+            return []
+        if replicas > self.replicas:
+            if self.tiers:
+                candidates = walk_successors(self._dev_ids, idx,
+                                             len(self._dev_ids))
+                return pick_diverse(candidates, replicas, self.tiers)
+            return walk_successors(self._dev_ids, idx, replicas)
+        start = idx * self.replicas
+        return [dev_id for dev_id in self.successors()[start:start + replicas]
+                if dev_id >= 0]
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+u"""Maglev查找表的ring.
+
+查找表的长度为素数M，每个设备由其id的哈希值得到起点offset和步长skip，
+按offset + j * skip (mod M)的顺序排列出对所有槽位的偏好。构建时各设备按
+权重轮流占用偏好中第一个空闲的槽位，直到表被填满。查找只需一次哈希加一次
+数组下标访问；设备变化时大部分槽位保持不变。
+"""
+from array import array
+
+from hashring.common import exceptions as exc
+from hashring.common.utils import DEFAULT_HASH, get_hash
+
+# 默认的查找表长度，须为素数，通常取设备数量的100倍以上
+TABLE_SIZE = 65537
+
+
+def is_prime(n):
+    u"""判断n是否为素数."""
+    if n < 2:
+        return False
+    i = 2
+    while i * i <= n:
+        if n % i == 0:
+            return False
+        i += 1
+    return True
+
+
+def populate(weights, table_size, hash_func):
+    u"""构建Maglev查找表.
+
+    每一轮中权重最大的设备占用一个槽位，其余设备按权重比例累积份额，
+    份额满1时占用一个槽位，因此各设备的槽位数与权重成比例。
+
+    :param weights: {设备id: 权重}
+    :param table_size: 查找表长度，素数
+    :param hash_func: 生成设备偏好的哈希函数
+    :return array('q')，没有设备时全部为-1
+    """
+    table = array('q', [-1]) * table_size
+    dev_ids = sorted(dev_id for dev_id, weight in weights.items()
+                     if weight > 0)
+    if not dev_ids:
+        return table
+    max_weight = float(max(weights[dev_id] for dev_id in dev_ids))
+    shares = [weights[dev_id] / max_weight for dev_id in dev_ids]
+    skips, positions = [], []
+    for dev_id in dev_ids:
+        name = 'device_%s' % dev_id
+        positions.append(hash_func(name + '#offset') % table_size)
+        skips.append(hash_func(name + '#skip') % (table_size - 1) + 1)
+    credits = [0.0] * len(dev_ids)
+    filled = 0
+    while True:
+        for i, dev_id in enumerate(dev_ids):
+            credits[i] += shares[i]
+            if credits[i] < 1.0:
+                continue
+            credits[i] -= 1.0
+            pos, skip = positions[i], skips[i]
+            while table[pos] >= 0:
+                pos += skip
+                if pos >= table_size:
+                    pos -= table_size
+            table[pos] = dev_id
+            positions[i] = pos
+            filled += 1
+            if filled == table_size:
+                return table
+
+
+class MaglevRing(object):
+    u"""Maglev查找表的ring，构建后不再修改.
+
+    :param table: 槽位到设备的查找表，长度为素数
+    :param hash_name: 哈希函数名，见utils.HASH_FUNCS
+    """
+
+    MODE = 'maglev'
+    # 构建时使用的设备权重字段
+    WEIGHT = 'dev_weight'
+
+    def __init__(self, table, hash_name=DEFAULT_HASH):
+        self._table = table
+        self.hash_name = hash_name
+        self._hash = get_hash(hash_name)
+
+    @property
+    def table(self):
+        u"""槽位到设备的查找表，只读."""
+        return self._table
+
+    def __len__(self):
+        return len(self._table)
+
+    @classmethod
+    def build(cls, weights, old=None, table_size=None, hash_name=None):
+        u"""按设备权重构建ring.
+
+        设备的槽位偏好只由设备id决定，与旧的ring无关，变化的槽位天然较少。
+
+        :param weights: {设备id: 权重}
+        :param old: 旧的MaglevRing，沿用其查找表长度和哈希函数
+        :param table_size: 查找表长度，须为素数，默认沿用old的，没有old
+            时为TABLE_SIZE
+        :param hash_name: 哈希函数名，默认沿用old的，没有old时为DEFAULT_HASH
+        """
+        if table_size is None:
+            table_size = len(old) if old is not None else TABLE_SIZE
+        if hash_name is None:
+            hash_name = old.hash_name if old is not None else DEFAULT_HASH
+        if not is_prime(table_size):
+            raise exc.ErrorInvalidParam('table_size，须为素数')
+        return cls(populate(weights, table_size, get_hash(hash_name)),
+                   hash_name)
+
+    @classmethod
+    def from_dict(cls, data):
+        u"""从RingFile数据中加载."""
+        return cls(array('q', data['table']), data.get('hash', DEFAULT_HASH))
+
+    def to_dict(self):
+        u"""生成RingFile数据."""
+        return {
+            'table': self._table.tolist(),
+            'hash': self.hash_name,
+        }
+
+    def hash_dev(self, key):
+        u"""获取指定key hash到的设备.
+
+        :param key: 指定key
+        :return 设备id，没有设备时返回None
+        """
+        dev_id = self._table[self._hash(key) % len(self._table)]
+        return None if dev_id < 0 else dev_id
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序生成设备id
+        """
+        table = self._table
+        size = len(table)
+        for point in map(self._hash, keys):
+            dev_id = table[point % size]
+            yield None if dev_id < 0 else dev_id
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序排列的设备id列表
+        """
+        return list(self.iter_hash_dev(keys))
+
+    def get_nodes(self, key, replicas):
+        u"""获取指定key的多个副本所在的设备.
+
+        从key所在的槽位开始依次向后取不同的设备。
+
+        :param key: 指定key
+        :param replicas: 副本数
+        :return 设备id列表，第一个与hash_dev一致
+        """
+        table = self._table
+        size = len(table)
+        start = self._hash(key) % size
+        nodes = []
+        for step in range(size):
+            dev_id = table[(start + step) % size]
+            if dev_id >= 0 and dev_id not in nodes:
+                nodes.append(dev_id)
+                if len(nodes) == replicas:
+                    break
+        return nodes
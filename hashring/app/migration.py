@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+u"""数据迁移计划.
+
+比较修改前后的两个ring，精确计算换了设备的哈希区间，数据迁移时只需搬迁
+这些区间内的数据，而不用扫描整个设备。
+
+迁移计划是(源设备id, 目标设备id, 起点, 终点)的列表，区间为整数点上的左闭
+右开区间[起点, 终点)，按起点排序，相邻且源和目标都相同的区间已合并；环为空
+或分区未分配时设备id为None。
+"""
+from hashring.common import exceptions as exc
+from hashring.common.utils import POINT_BITS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 整数点的取值范围为[0, RING_SIZE)
+RING_SIZE = 1 << POINT_BITS
+
+
+def point_owners(sorted_keys, dev_ids):
+    u"""依次生成虚拟分区环上覆盖整个键空间的(区间终点, 设备id).
+
+    点p落到第一个不小于p的虚拟分区，因此(k[i-1], k[i]]属于第i个虚拟分区，
+    最后一个虚拟分区之后回绕到第一个。
+
+    :param sorted_keys: 有序的虚拟分区数组
+    :param dev_ids: 与sorted_keys一一对应的设备id数组
+    """
+    if not len(sorted_keys):
+        yield RING_SIZE, None
+        return
+    for point, dev_id in zip(sorted_keys, dev_ids):
+        yield point + 1, dev_id
+    yield RING_SIZE, dev_ids[0]
+
+
+def partition_owners(part2dev):
+    u"""依次生成分区环上覆盖整个键空间的(区间终点, 设备id).
+
+    :param part2dev: 分区到设备的映射表，长度为2的幂
+    """
+    shift = POINT_BITS - (len(part2dev).bit_length() - 1)
+    for part, dev_id in enumerate(part2dev):
+        yield (part + 1) << shift, None if dev_id < 0 else dev_id
+
+
+def diff_owners(old, new):
+    u"""一次线性归并两个ring的区间，找出换了设备的区间.
+
+    :param old: 修改前ring的(区间终点, 设备id)迭代器
+    :param new: 修改后ring的(区间终点, 设备id)迭代器
+    :return 迁移计划
+    """
+    plan = []
+    start = 0
+    old_end, old_dev = next(old)
+    new_end, new_dev = next(new)
+    while start < RING_SIZE:
+        end = min(old_end, new_end)
+        if end > start and old_dev != new_dev:
+            last = plan[-1] if plan else None
+            if last is not None and last[3] == start and \
+                    last[0] == old_dev and last[1] == new_dev:
+                plan[-1] = (old_dev, new_dev, last[2], end)
+            else:
+                plan.append((old_dev, new_dev, start, end))
+        start = max(start, end)
+        if old_end == end and end < RING_SIZE:
+            old_end, old_dev = next(old)
+        if new_end == end and end < RING_SIZE:
+            new_end, new_dev = next(new)
+    return plan
+
+
+def diff_points(old_keys, old_devs, new_keys, new_devs):
+    u"""计算两个虚拟分区环之间的迁移计划.
+
+    安装了NumPy时向量化处理：两个环的分区点合并后，每个区间的设备由区间
+    终点查找得到，只在换了设备的区间上逐个生成结果；否则退回到diff_owners
+    的逐个归并，两者结果一致。
+
+    :param old_keys: 修改前的有序虚拟分区数组
+    :param old_devs: 与old_keys一一对应的设备id数组
+    :param new_keys: 修改后的有序虚拟分区数组
+    :param new_devs: 与new_keys一一对应的设备id数组
+    :return 迁移计划
+    """
+    if np is None or not len(old_keys) or not len(new_keys):
+        return diff_owners(point_owners(old_keys, old_devs),
+                           point_owners(new_keys, new_devs))
+    old_keys = np.asarray(old_keys, dtype=np.uint64)
+    new_keys = np.asarray(new_keys, dtype=np.uint64)
+    # 各区间的终点（含），最后一个区间到键空间末尾；两个数组都已有序，
+    # 稳定排序（归并）接近线性
+    ends = np.sort(np.concatenate((old_keys, new_keys)), kind='stable')
+    ends = ends[np.concatenate(([True], ends[1:] != ends[:-1]))]
+    if ends[-1] != RING_SIZE - 1:
+        ends = np.append(ends, np.uint64(RING_SIZE - 1))
+    owners = []
+    for keys, devs in ((old_keys, old_devs), (new_keys, new_devs)):
+        idx = np.searchsorted(keys, ends, side='left')
+        idx[idx == len(keys)] = 0
+        owners.append(np.asarray(devs, dtype=np.int64)[idx])
+    old_owner, new_owner = owners
+    moved = np.flatnonzero(old_owner != new_owner)
+    if not len(moved):
+        return []
+    # 相邻且源和目标都相同的区间合并为一段
+    src, dst = old_owner[moved], new_owner[moved]
+    breaks = np.flatnonzero((np.diff(moved) != 1) | (np.diff(src) != 0) |
+                            (np.diff(dst) != 0)) + 1
+    firsts = np.concatenate(([0], breaks))
+    lasts = np.concatenate((breaks - 1, [len(moved) - 1]))
+    ends = ends.tolist()
+    plan = []
+    for first, last, src_dev, dst_dev in zip(
+            moved[firsts].tolist(), moved[lasts].tolist(),
+            src[firsts].tolist(), dst[firsts].tolist()):
+        start = ends[first - 1] + 1 if first else 0
+        plan.append((src_dev, dst_dev, start, ends[last] + 1))
+    return plan
+
+
+def ring_owners(ring):
+    u"""返回ring的(区间终点, 设备id)迭代器，支持RingView和PartitionRing.
+
+    其他模式的key不按区间划分到设备，抛出ErrorInvalidParam。
+    """
+    if hasattr(ring, 'part2dev'):
+        return partition_owners(ring.part2dev)
+    if not hasattr(ring, 'sorted_keys'):
+        raise exc.ErrorInvalidParam('ring，%s模式没有按区间的迁移计划'
+                                    % ring.MODE)
+    return point_owners(ring.sorted_keys, ring.dev_ids)
+
+
+def diff_rings(old, new):
+    u"""计算从old到new的迁移计划，两个ring可以是不同的模式.
+
+    :param old: 修改前的ring
+    :param new: 修改后的ring
+    :return 迁移计划，两个ring的哈希函数不同时抛出ErrorInvalidParam
+    """
+    if old.hash_name != new.hash_name:
+        raise exc.ErrorInvalidParam('ring，两个ring的哈希函数不同')
+    if hasattr(old, 'sorted_keys') and hasattr(new, 'sorted_keys'):
+        return diff_points(old.sorted_keys, old.dev_ids,
+                           new.sorted_keys, new.dev_ids)
+    return diff_owners(ring_owners(old), ring_owners(new))
+
+
+def summarize(plan):
+    u"""按源和目标设备汇总迁移计划.
+
+    :param plan: 迁移计划
+    :return {(源设备id, 目标设备id): 迁移的键空间比例}
+    """
+    summary = {}
+    for src, dst, start, end in plan:
+        summary[src, dst] = summary.get((src, dst), 0) + end - start
+    return dict((pair, float(size) / RING_SIZE)
+                for pair, size in summary.items())
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+u"""固定分区数的ring.
+
+键空间固定划分为2^part_power个分区，key的分区号取其哈希值的高part_power位，
+查找只需一次数组下标访问；RingBuilder按设备权重构建分区到设备的映射表。
+"""
+import random
+from array import array
+
+from hashring.common.utils import DEFAULT_HASH, POINT_BITS, get_hash
+
+# 默认分区幂，即2^16个分区
+PART_POWER = 16
+
+
+def part_targets(weights, parts):
+    u"""按权重计算每个设备应分到的分区数量.
+
+    先按比例向下取整，剩余的分区按小数部分从大到小补齐。
+
+    :param weights: {设备id: 权重}
+    :param parts: 分区总数
+    :return {设备id: 分区数量}
+    """
+    total = float(sum(weights.values()))
+    if total <= 0:
+        return {}
+    targets, remainders = {}, []
+    for dev_id in sorted(weights):
+        share = parts * weights[dev_id] / total
+        targets[dev_id] = int(share)
+        remainders.append((int(share) - share, dev_id))
+    for _, dev_id in sorted(remainders)[:parts - sum(targets.values())]:
+        targets[dev_id] += 1
+    return targets
+
+
+def assign_parts(weights, parts, old=None, seed=0):
+    u"""构建分区到设备的映射表，尽量少地移动分区.
+
+    保留旧表中仍然有效的分配，只回收已删除设备和超出目标数量的设备上的
+    分区，再随机地分给低于目标数量的设备。
+
+    :param weights: {设备id: 权重}
+    :param parts: 分区总数
+    :param old: 旧的分区到设备映射表，可选
+    :param seed: 随机种子，保证相同输入得到相同的映射表
+    :return array('q')，未分配的分区为-1
+    """
+    targets = part_targets(weights, parts)
+    table = array('q', old) if old is not None and len(old) == parts \
+        else array('q', [-1]) * parts
+    counts = dict((dev_id, 0) for dev_id in targets)
+    free = []
+    for part, dev_id in enumerate(table):
+        if dev_id in counts and counts[dev_id] < targets[dev_id]:
+            counts[dev_id] += 1
+        else:
+            free.append(part)
+    slots = []
+    for dev_id in sorted(targets):
+        slots.extend([dev_id] * (targets[dev_id] - counts[dev_id]))
+    rnd = random.Random(seed)
+    rnd.shuffle(slots)
+    for part in free:
+        table[part] = slots.pop() if slots else -1
+    return table
+
+
+class PartitionRing(object):
+    u"""固定分区数的ring，构建后不再修改.
+
+    :param part2dev: 分区到设备的映射表，长度为2^part_power
+    :param part_power: 分区幂
+    :param hash_name: 哈希函数名，见utils.HASH_FUNCS
+    """
+
+    MODE = 'partition'
+    # 构建时使用的设备权重字段
+    WEIGHT = 'part_num'
+
+    def __init__(self, part2dev, part_power=PART_POWER,
+                 hash_name=DEFAULT_HASH):
+        self.part_power = part_power
+        self._shift = POINT_BITS - part_power
+        self._part2dev = part2dev
+        self.hash_name = hash_name
+        self._hash = get_hash(hash_name)
+
+    @property
+    def part2dev(self):
+        u"""分区到设备的映射表，只读."""
+        return self._part2dev
+
+    def __len__(self):
+        return len(self._part2dev)
+
+    @classmethod
+    def build(cls, weights, old=None, part_power=None, hash_name=None):
+        u"""按设备权重构建ring.
+
+        :param weights: {设备id: 权重}
+        :param old: 旧的PartitionRing，分区幂和哈希函数相同时尽量保留其分配
+        :param part_power: 分区幂，默认沿用old的分区幂，没有old时为PART_POWER
+        :param hash_name: 哈希函数名，默认沿用old的，没有old时为DEFAULT_HASH
+        """
+        if part_power is None:
+            part_power = old.part_power if old is not None else PART_POWER
+        if hash_name is None:
+            hash_name = old.hash_name if old is not None else DEFAULT_HASH
+        old_table = old.part2dev if old is not None and \
+            old.part_power == part_power and \
+            old.hash_name == hash_name else None
+        return cls(assign_parts(weights, 1 << part_power, old_table),
+                   part_power, hash_name)
+
+    @classmethod
+    def from_dict(cls, data):
+        u"""从RingFile数据中加载."""
+        return cls(array('q', data['part2dev']), data['part_power'],
+                   data.get('hash', DEFAULT_HASH))
+
+    def to_dict(self):
+        u"""生成RingFile数据."""
+        return {
+            'part_power': self.part_power,
+            'part2dev': self._part2dev.tolist(),
+            'hash': self.hash_name,
+        }
+
+    def get_part(self, key):
+        u"""返回指定key所在的分区."""
+        return self._hash(key) >> self._shift
+
+    def hash_dev(self, key):
+        u"""获取指定key hash到的设备.
+
+        :param key: 指定key
+        :return 设备id，没有设备时返回None
+        """
+        dev_id = self._part2dev[self._hash(key) >> self._shift]
+        return None if dev_id < 0 else dev_id
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序生成设备id
+        """
+        part2dev, shift = self._part2dev, self._shift
+        for point in map(self._hash, keys):
+            dev_id = part2dev[point >> shift]
+            yield None if dev_id < 0 else dev_id
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序排列的设备id列表
+        """
+        return list(self.iter_hash_dev(keys))
+
+    def get_nodes(self, key, replicas):
+        u"""获取指定key的多个副本所在的设备.
+
+        从key所在的分区开始依次向后取不同的设备，分区是随机分配的，
+        通常只需看几个分区。
+
+        :param key: 指定key
+        :param replicas: 副本数
+        :return 设备id列表
+        """
+        part2dev = self._part2dev
+        parts = len(part2dev)
+        start = self._hash(key) >> self._shift
+        nodes = []
+        for step in range(parts):
+            dev_id = part2dev[(start + step) % parts]
+            if dev_id >= 0 and dev_id not in nodes:
+                nodes.append(dev_id)
+                if len(nodes) == replicas:
+                    break
+        return nodes
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+u"""批量key放置.
+
+安装了NumPy时使用向量化的有序查找一次性完成放置，否则退回到逐个二分查找，
+两者结果与RingManager.hash_dev一致。
+"""
+import hashlib
+from array import array
+
+from hashring.app import eytzinger
+from hashring.app.lookup import iter_lookup
+from hashring.common.utils import DEFAULT_HASH, gen_points
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def hash_points(keys, hash_name=DEFAULT_HASH):
+    u"""批量哈希字符串为环上的整数点.
+
+    :param keys: key的可迭代对象
+    :param hash_name: 哈希函数名
+    :return 整数点数组，有NumPy时为uint64的ndarray，否则为array('Q')
+    """
+    if np is None:
+        return array('Q', gen_points(keys, hash_name))
+    if hash_name != 'md5':
+        return np.fromiter(gen_points(keys, hash_name), dtype=np.uint64)
+    md5 = hashlib.md5
+    digests = b''.join(md5(key.encode('utf-8')).digest() for key in keys)
+    # 每个摘要16字节，取其高64位（大端）作为整数点
+    return np.frombuffer(digests, dtype='>u8')[::2].astype(np.uint64)
+
+
+def place_points(sorted_keys, dev_ids, points, layout=None):
+    u"""批量查找已哈希的整数点落到的设备.
+
+    :param sorted_keys: 有序的虚拟分区数组
+    :param dev_ids: 与sorted_keys一一对应的设备id数组
+    :param points: 已哈希的整数点数组
+    :param layout: sorted_keys的Eytzinger布局(layout, rank)，可选，有NumPy
+        时在其上查找，大环上快于np.searchsorted
+    :return 设备id数组，有NumPy时为int64的ndarray，否则为array('q')；
+        环为空时返回None
+    """
+    if not len(sorted_keys):
+        return None
+    if np is None:
+        return array('q', iter_lookup(sorted_keys, dev_ids, points))
+    if layout is not None:
+        return eytzinger.lookup_array(layout[0], layout[1], dev_ids, points)
+    ring = np.asarray(sorted_keys, dtype=np.uint64)
+    devs = np.asarray(dev_ids, dtype=np.int64)
+    idx = np.searchsorted(ring, np.asarray(points, dtype=np.uint64),
+                          side='left')
+    # 超出最后一个节点时回绕到第一个
+    idx[idx == len(ring)] = 0
+    return devs[idx]
+
+
+def place_keys(sorted_keys, dev_ids, keys, hash_name=DEFAULT_HASH,
+               layout=None):
+    u"""批量哈希并查找key落到的设备.
+
+    :param sorted_keys: 有序的虚拟分区数组
+    :param dev_ids: 与sorted_keys一一对应的设备id数组
+    :param keys: key的可迭代对象
+    :param hash_name: 哈希函数名
+    :param layout: 见place_points
+    :return 同place_points
+    """
+    return place_points(sorted_keys, dev_ids, hash_points(keys, hash_name),
+                        layout)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+u"""RingFile热加载.
+
+长期运行的进程通过ReloadingRing查找，后台线程监视RingFile的变化，加载并校验
+新文件后以一次引用替换切换过去，查找不会因重新加载而阻塞。
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sys
+import threading
+import time
+
+from hashring.app import ringfile
+
+LOG = logging.getLogger(__name__)
+
+# inotify事件：写完关闭、移入（原子重命名）、新建
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class _Inotify(object):
+    u"""基于ctypes的inotify封装，监视RingFile所在目录."""
+
+    def __init__(self, dirname):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        # 原子重命名会替换inode，因此监视目录而不是文件本身
+        wd = libc.inotify_add_watch(self.fd, dirname.encode('utf-8'),
+                                    IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch')
+
+    def wait(self, timeout):
+        u"""等待目录变化，返回是否有事件."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ReloadingRing(object):
+    u"""自动重新加载的只读ring.
+
+    :param filename: RingFile文件名，JSON或二进制格式
+    :param interval: 轮询间隔（秒）
+    :param use_inotify: 是否使用inotify，None表示在Linux上自动启用，
+        不可用时退回到轮询
+    """
+
+    def __init__(self, filename, interval=1.0, use_inotify=None):
+        self.filename = filename
+        self.interval = interval
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith('linux')
+        self.use_inotify = use_inotify
+        # 监控指标
+        self.reload_count = 0
+        self.failed_count = 0
+        self.last_reload_latency = None
+        self.last_reload_time = None
+        self.last_error = None
+
+        self._signature = self._stat()
+        self._ring = ringfile.open_ring(filename)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        u"""返回文件的(inode, 大小, 修改时间)，文件不存在时返回None."""
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    @property
+    def ring(self):
+        u"""当前使用的ring."""
+        return self._ring
+
+    def hash_dev(self, key):
+        u"""获取指定key hash到的设备."""
+        return self._ring.hash_dev(key)
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备，整批使用同一个ring."""
+        return self._ring.iter_hash_dev(keys)
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备，整批使用同一个ring."""
+        return self._ring.hash_dev_many(keys)
+
+    def stats(self):
+        u"""返回监控指标."""
+        return {
+            'reload_count': self.reload_count,
+            'failed_count': self.failed_count,
+            'last_reload_latency': self.last_reload_latency,
+            'last_reload_time': self.last_reload_time,
+            'last_error': self.last_error,
+        }
+
+    def check(self):
+        u"""检查RingFile是否变化，变化则重新加载.
+
+        :return 是否重新加载了ring
+        """
+        with self._lock:
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                return False
+            start = time.perf_counter()
+            try:
+                ring = ringfile.open_ring(self.filename)
+            except Exception as e:
+                # 文件不完整或校验失败时保留旧ring，下次检查时重试
+                self.failed_count += 1
+                self.last_error = str(e) or e.__class__.__name__
+                LOG.warning('重新加载%s失败：%s', self.filename, self.last_error)
+                return False
+            # 一次引用替换完成切换，旧ring在不再被引用后释放
+            self._ring = ring
+            self._signature = signature
+            self.reload_count += 1
+            self.last_reload_latency = time.perf_counter() - start
+            self.last_reload_time = time.time()
+            self.last_error = None
+            return True
+
+    def _run(self):
+        watcher = None
+        if self.use_inotify:
+            try:
+                watcher = _Inotify(os.path.dirname(
+                    os.path.abspath(self.filename)))
+            except (OSError, AttributeError, TypeError) as e:
+                LOG.warning('inotify不可用，改用轮询：%s', e)
+        try:
+            while not self._stop_event.is_set():
+                if watcher is not None:
+                    watcher.wait(self.interval)
+                else:
+                    self._stop_event.wait(self.interval)
+                if not self._stop_event.is_set():
+                    self.check()
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+    def start(self):
+        u"""启动后台监视线程."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='ring-reloader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        u"""停止后台监视线程."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
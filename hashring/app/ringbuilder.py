@@ -1,23 +1,39 @@
 # -*- coding: utf-8 -*-
+import contextlib
+import copy
 import json
 import logging
-
+import threading
+
+from hashring.app import bounded
+from hashring.app import cache
+from hashring.app import migration
+from hashring.app import placement
+from hashring.app import ringfile
+from hashring.app.lookup import (REPLICAS, SORTED_LAYOUT, RingView,
+                                 find_index, merge_points, remove_points)
 from hashring.common import log
-from hashring.common.utils import gen_key
+from hashring.common.utils import atomic_write, get_hash
 from hashring.common import exceptions as exc
 
 BUILDER_FILE_PATH = '../Builder.json'
 RING_FILE_PATH = '../Ring.json'
+# 设备信息中故障域的各层级，由大到小
+TIER_KEYS = ('dev_region', 'dev_zone', 'dev_host')
 LOG = log.mylog()
 
 
 class Device(object):
     """Device"""
 
-    def __init__(self, id, name, weight):
+    def __init__(self, id, name, weight, region=None, zone=None, host=None):
         self.id = id
         self.name = name
         self.weight = weight
+        # 故障域：区域、可用区、主机
+        self.region = region
+        self.zone = zone
+        self.host = host
 
 
 class DataManager(object):
@@ -51,8 +67,9 @@ class DataManager(object):
         :param filename: 文件名
         """
         try:
-            with open(filename, 'w', encoding='utf-8') as fp:
-                json.dump(self.data, fp, ensure_ascii=False)
+            # 先写临时文件再原子重命名，避免读者看到写了一半的文件
+            atomic_write(filename, json.dumps(
+                self.data, ensure_ascii=False).encode('utf-8'))
         except exc.ErrorFileSaveFailed:
             raise exc.ErrorFileSaveFailed
             LOG.error('保存文件%s出错。'.format(filename))
@@ -61,9 +78,45 @@ class DataManager(object):
 class BuilderManager(object):
     """BuilderManager，用于维护BuilderFile"""
 
-    def __init__(self):
+    def __init__(self, filename=BUILDER_FILE_PATH):
+        self.filename = filename
         # BuilderFile的文件管理器
-        self.data_manager = DataManager.load(BUILDER_FILE_PATH)
+        self.data_manager = DataManager.load(filename)
+        # 批量修改开始前的设备信息快照，不在批量修改中时为None
+        self._snapshot = None
+        # 批量修改的结果是否已经保存
+        self._saved = False
+
+    def begin(self):
+        u"""开始批量修改，修改只在内存中进行，直到commit时才保存."""
+        self._snapshot = copy.deepcopy(self.data_manager.data)
+        self._saved = False
+
+    def commit(self):
+        u"""保存批量修改的结果.
+
+        保存后直到end之前仍可rollback，以便RingFile保存失败时一并撤销。
+        """
+        self.data_manager.save(self.filename)
+        self._saved = True
+
+    def end(self):
+        u"""结束已保存的批量修改."""
+        self._snapshot = None
+        self._saved = False
+
+    def rollback(self):
+        u"""撤销批量修改，恢复到begin时的设备信息，已保存的重新保存."""
+        self.data_manager.set_data(self._snapshot)
+        self._snapshot = None
+        if self._saved:
+            self._saved = False
+            self.data_manager.save(self.filename)
+
+    def _save(self):
+        u"""保存BuilderFile，批量修改中则推迟到commit."""
+        if self._snapshot is None:
+            self.data_manager.save(self.filename)
 
     def add(self, dev_info):
         u"""新添加设备信息
@@ -71,7 +124,7 @@ class BuilderManager(object):
         :param dev: 待添加的设备信息
         """
         self.data_manager.data[dev_info['dev_id']] = dev_info
-        self.data_manager.save(BUILDER_FILE_PATH)
+        self._save()
 
     def remove(self, dev_id):
         u"""移除设备信息
@@ -82,7 +135,7 @@ class BuilderManager(object):
             raise exc.ErrorInvalidParam('id，不存在此id')
         # 移除设备id到设备信息的映射
         del self.data_manager.data[dev_id]
-        self.data_manager.save(BUILDER_FILE_PATH)
+        self._save()
 
     def update(self, dev_id, weight, part_num):
         u"""更新设备信息
@@ -113,6 +166,23 @@ class BuilderManager(object):
             return None
         return self.data_manager.data[dev_id]
 
+    def devices(self):
+        u"""返回所有设备信息的列表."""
+        data = self.data_manager.data
+        return list(data.values()) if isinstance(data, dict) else list(data)
+
+    def tiers(self):
+        u"""返回设置了故障域的设备的故障域.
+
+        :return {设备id: (region, zone, host)}
+        """
+        tiers = {}
+        for dev in self.devices():
+            location = tuple(dev.get(key) for key in TIER_KEYS)
+            if any(item is not None for item in location):
+                tiers[dev['dev_id']] = location
+        return tiers
+
     def get_first(self):
         u"""返回第一个设备。
 
@@ -125,26 +195,192 @@ class BuilderManager(object):
 
 
 class RingManager(object):
-    """RingManager，用于维护RingFile"""
-    def __init__(self):
+    u"""RingManager，用于维护RingFile.
+
+    :param filename: RingFile文件名
+    :param hash_name: 哈希函数名，默认沿用RingFile中记录的
+    :param prefix_bits: 前缀索引的位数，0表示不使用，默认沿用RingFile中
+        记录的；每次修改构建新快照时一并构建索引，随下一次修改保存
+    :param layout: 批量查找结构的布局，见lookup.RingView，不保存到RingFile
+    :param data_manager: 已加载filename的DataManager，可选，避免重复解析
+    """
+    def __init__(self, filename=RING_FILE_PATH, hash_name=None,
+                 prefix_bits=None, layout=SORTED_LAYOUT, data_manager=None):
         # 分区比例，乘以weight后得到分区数量
         self.p = 0.02
+        self.filename = filename
         # RingFile的文件管理器
-        self.data_manager = DataManager.load(RING_FILE_PATH)
-        # 虚拟分区列表
-        self._sorted_keys = [key for key in self.data_manager.data]
+        self.data_manager = data_manager or DataManager.load(filename)
+        # 哈希函数，沿用RingFile中记录的，空文件时使用指定的
+        self.hash_name = ringfile.select_hash(self.data_manager.data,
+                                              hash_name)
+        self._hash = get_hash(self.hash_name)
+        if prefix_bits is None:
+            prefix_bits = ringfile.parse_prefix_bits(self.data_manager.data)
+        self.prefix_bits = prefix_bits
+        self.layout = layout
+        # 当前环的不可变快照：虚拟分区列表（有序的64位整数点）及对应的
+        # 设备id列表。修改时构建新快照后一次引用替换发布，查找无需加锁
+        self._tiers = ringfile.parse_tiers(self.data_manager.data)
+        self._snapshot = self._build_view(
+            *ringfile.parse_json(self.data_manager.data))
+        # 最近一次修改前的快照，用于生成迁移计划
+        self._previous = self._snapshot
+        # ring的版本号，每次rebanlance加1，查找结果缓存据此判断是否失效
+        self.generation = 0
+        # 串行化修改
+        self._lock = threading.RLock()
+        # 批量修改中待新增的{整数点: 设备id}及待删除的整数点，
+        # 不在批量修改中时为None
+        self._pending_add = None
+        self._pending_remove = None
+
+    @property
+    def snapshot(self):
+        u"""当前环的不可变快照."""
+        return self._snapshot
+
+    @property
+    def _sorted_keys(self):
+        return self._snapshot.sorted_keys
+
+    @property
+    def _dev_ids(self):
+        return self._snapshot.dev_ids
+
+    def _build_view(self, sorted_keys, dev_ids):
+        u"""构建新快照，连同get_nodes所用的后继设备表.
+
+        后继设备表在发布前构建好，查找时不再构建。
+        """
+        view = RingView(sorted_keys, dev_ids, tiers=self._tiers,
+                        hash_name=self.hash_name, prefix_bits=self.prefix_bits,
+                        layout=self.layout)
+        view.successors()
+        return view
+
+    def _publish(self, sorted_keys, dev_ids):
+        u"""发布新快照并保存."""
+        self._previous = self._snapshot
+        self._snapshot = self._build_view(sorted_keys, dev_ids)
+        self.rebanlance()
+
+    def migration_plan(self):
+        u"""返回最近一次修改（批量修改算一次）的数据迁移计划.
+
+        :return 见migration模块，没有修改过时为空列表
+        """
+        with self._lock:
+            previous, snapshot = self._previous, self._snapshot
+        return migration.diff_rings(previous, snapshot)
+
+    def set_tiers(self, tiers, publish=True):
+        u"""设置设备的故障域，get_nodes据此挑选处于不同故障域的副本.
+
+        故障域随下一次修改保存到RingFile。发布新快照需要重建前缀索引等查找
+        结构，随后马上有修改或处于批量修改中时只记下故障域，由下一次发布
+        一并生效。
+
+        :param tiers: {设备id: (region, zone, host)}
+        :param publish: 是否立即发布带新故障域的快照，批量修改中总是推迟
+        """
+        with self._lock:
+            self._tiers = dict(tiers)
+            snapshot = self._snapshot
+            if (not publish or self._pending_add is not None or
+                    self._tiers == snapshot.tiers):
+                return
+            self._snapshot = self._build_view(snapshot.sorted_keys,
+                                              snapshot.dev_ids)
+
+    def _gen_point(self, dev_id, part):
+        u"""生成设备第part个虚拟分区在环上的点."""
+        return self._hash('device_%s_p%s' % (dev_id, part))
+
+    def _part_points(self, dev_id, start, stop):
+        u"""生成设备第start到stop-1个虚拟分区在环上的点."""
+        return [self._gen_point(dev_id, i) for i in range(start, stop)]
+
+    def begin(self):
+        u"""开始批量修改，增删的虚拟分区暂存起来，直到commit时一次性并入环中.
+
+        批量修改期间查找仍使用修改前的环。
+        """
+        with self._lock:
+            self._pending_add = {}
+            self._pending_remove = set()
+
+    def commit(self):
+        u"""提交批量修改，一次性增删虚拟分区并保存.
+
+        保存失败时恢复到批量修改前的环，RingFile不变。
+        """
+        with self._lock:
+            pending_add = self._pending_add
+            pending_remove = self._pending_remove
+            self._pending_add = self._pending_remove = None
+            sorted_keys, dev_ids = self._sorted_keys, self._dev_ids
+            if pending_remove:
+                sorted_keys, dev_ids = remove_points(
+                    sorted_keys, dev_ids, pending_remove)
+            if pending_add:
+                sorted_keys, dev_ids = merge_points(
+                    sorted_keys, dev_ids, pending_add.items())
+            previous, snapshot = self._previous, self._snapshot
+            data = self.data_manager.data
+            try:
+                self._publish(sorted_keys, dev_ids)
+            except BaseException:
+                self._previous, self._snapshot = previous, snapshot
+                self.data_manager.set_data(data)
+                raise
+
+    def rollback(self):
+        u"""撤销批量修改，包括尚未发布的故障域."""
+        with self._lock:
+            self._pending_add = self._pending_remove = None
+            self._tiers = self._snapshot.tiers
+
+    def _insert(self, dev_id, points):
+        u"""将设备的一批虚拟分区有序并入环中，批量修改中则暂存."""
+        with self._lock:
+            if self._pending_add is None:
+                self._publish(*merge_points(
+                    self._sorted_keys, self._dev_ids,
+                    [(point, dev_id) for point in points]))
+                return
+            for point in points:
+                if point in self._pending_remove:
+                    self._pending_remove.discard(point)
+                else:
+                    self._pending_add[point] = dev_id
+
+    def _delete(self, points):
+        u"""从环中删除一批虚拟分区，批量修改中则暂存."""
+        with self._lock:
+            if self._pending_remove is None:
+                self._publish(*remove_points(
+                    self._sorted_keys, self._dev_ids, points))
+                return
+            sorted_keys = self._sorted_keys
+            for point in points:
+                if point in self._pending_add:
+                    del self._pending_add[point]
+                    continue
+                idx = find_index(sorted_keys, point)
+                if (idx < 0 or sorted_keys[idx] != point or
+                        point in self._pending_remove):
+                    raise KeyError(point)
+                self._pending_remove.add(point)
 
     def add(self, dev_info):
         u"""新增虚拟分区的映射
 
         :param dev_info: 设备信息
         """
-        # 保存虚拟设备到设备id的映射
-        for i in range(dev_info['part_num']):
-            key = gen_key('device_%s_p%s' % (dev_info['dev_id'], i))
-            self.data_manager.data[key] = dev_info['dev_id']
-            self._sorted_keys.append(key)
-        self.rebanlance()
+        # 保存虚拟设备到设备id的映射，有序并入环中
+        self._insert(dev_info['dev_id'], self._part_points(
+            dev_info['dev_id'], 0, dev_info['part_num']))
 
     def remove(self, dev_id, part_num):
         u"""新增虚拟分区的映射
@@ -153,35 +389,24 @@ class RingManager(object):
         :param part_num: 设备分区数量
         """
         # 删除虚拟分区到磁盘的映射
-        for i in range(0, part_num):
-            key = gen_key('device_%s_p%s' % (dev_id, i))
-            if self.data_manager.data[key]:
-                del self.data_manager.data[key]
-            else:
-                raise KeyError
-            self._sorted_keys.remove(key)
-        self.rebanlance()
+        self._delete(self._part_points(dev_id, 0, part_num))
 
-    def update(self, dev_id, old_part_num, new_part_num):
+    def update(self, dev_id, old_part_num, new_part_num, weight=None):
         u"""更新设备和对应的虚拟分区
 
         :param dev_id: 设备id
         :param old_part_num: 设备的原分区数量
         :param new_part_num: 沈北的新分区数量
+        :param weight: 设备的新权重，虚拟分区模式不使用
         """
         if new_part_num > old_part_num:
             # 增加设备的分区数量
-            for i in range(old_part_num, new_part_num):
-                key = gen_key('device_%s_p%s' % (dev_id, i))
-                self.data_manager.data[key] = dev_id
-                self._sorted_keys.append(key)
+            self._insert(dev_id, self._part_points(
+                dev_id, old_part_num, new_part_num))
         else:
             # 减少设备的分区数量
-            for i in range(new_part_num, old_part_num):
-                key = gen_key('device_%s_p%s' % (dev_id, i))
-                del self.data_manager.data[key]
-                self._sorted_keys.remove(key)
-        self.rebanlance()
+            self._delete(self._part_points(
+                dev_id, new_part_num, old_part_num))
 
     def hash_dev(self, key):
         u"""获取指定key hash到的设备.
@@ -189,36 +414,331 @@ class RingManager(object):
         :param key: 指定key
         :return 设备id
         """
-        if not self.data_manager.data:
-            return None
+        # 二分查找就近节点，超出最后一个节点时回绕到第一个
+        return self._snapshot.hash_dev(key)
 
-        key = gen_key(key)
-        for node in self._sorted_keys:
-            # 返回就近节点
-            if key <= node:
-                return self.data_manager.data[node]
+    def get_nodes(self, key, replicas=REPLICAS):
+        u"""获取指定key的多个副本所在的设备.
+
+        :param key: 指定key
+        :param replicas: 副本数
+        :return 顺时针方向前replicas个不同设备的id列表
+        """
+        return self._snapshot.get_nodes(key, replicas)
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备，适用于不宜全部载入内存的大批量key.
+
+        整批key使用调用时的同一个快照。
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序生成设备id
+        """
+        return self._snapshot.iter_hash_dev(keys)
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序排列的设备id列表
+        """
+        return list(self.iter_hash_dev(keys))
+
+    def place_points(self, points):
+        u"""批量放置已哈希的整数点，安装了NumPy时使用向量化查找.
+
+        :param points: 已哈希的整数点数组
+        :return 设备id数组，环为空时返回None
+        """
+        snapshot = self._snapshot
+        return placement.place_points(snapshot.sorted_keys, snapshot.dev_ids,
+                                      points, snapshot.eytzinger)
+
+    def place_keys(self, keys):
+        u"""批量哈希并放置key，安装了NumPy时使用向量化查找.
+
+        :param keys: key的可迭代对象
+        :return 设备id数组，环为空时返回None
+        """
+        snapshot = self._snapshot
+        return placement.place_keys(snapshot.sorted_keys, snapshot.dev_ids,
+                                    keys, snapshot.hash_name,
+                                    snapshot.eytzinger)
 
     def rebanlance(self):
-        u"""重新平衡ring."""
-        self._sorted_keys.sort()
-        # 保存到本地JSON文件
-        self.data_manager.save(RING_FILE_PATH)
+        u"""重新平衡ring.
 
+        增删虚拟分区时已保持有序，这里只需保存；修改前后换了设备的区间见
+        migration_plan。新快照已在调用前发布，版本号随后加1。
+        """
+        with self._lock:
+            self.generation += 1
+            snapshot = self._snapshot
+            # 保存到本地JSON文件
+            self.data_manager.set_data(ringfile.dump_json(
+                snapshot.sorted_keys, snapshot.dev_ids, snapshot.tiers,
+                snapshot.hash_name, snapshot.prefix_bits))
+            self.data_manager.save(self.filename)
+
+
+class TableRingManager(object):
+    u"""TableRingManager，用于维护分区等查表模式的RingFile.
+
+    按ring_type.WEIGHT记录每个设备的分区数量或dev_weight作为权重，每次修改
+    后由ring_type.build重新构建整个ring，尽量保留原有分配，构建后一次引用
+    替换发布，查找无需加锁。
+
+    :param ring_type: ringfile.RING_TYPES中的ring类型
+    :param filename: RingFile文件名
+    :param hash_name: 哈希函数名，默认沿用RingFile中记录的
+    :param data_manager: 已加载filename的DataManager，可选，避免重复解析
+    :param options: 传给ring_type.build的构建参数，如part_power
+    """
+    def __init__(self, ring_type, filename=RING_FILE_PATH, hash_name=None,
+                 data_manager=None, **options):
+        self.ring_type = ring_type
+        self.filename = filename
+        self.options = options
+        # RingFile的文件管理器
+        self.data_manager = data_manager or DataManager.load(filename)
+        data = self.data_manager.data
+        self.hash_name = ringfile.select_hash(data, hash_name)
+        if data:
+            self._snapshot, self._weights = ringfile.parse_table(data)
+        else:
+            self._weights = {}
+            self._snapshot = ring_type.build({}, hash_name=self.hash_name,
+                                             **options)
+        # 最近一次修改前的ring，用于生成迁移计划
+        self._previous = self._snapshot
+        # ring的版本号，每次rebanlance加1，查找结果缓存据此判断是否失效
+        self.generation = 0
+        # 串行化修改
+        self._lock = threading.RLock()
+        # 批量修改中的{设备id: 权重}，不在批量修改中时为None
+        self._pending = None
+
+    @property
+    def snapshot(self):
+        u"""当前的ring，构建后不再修改."""
+        return self._snapshot
+
+    def _publish(self, weights):
+        u"""按新的权重构建并发布ring，然后保存."""
+        self._previous = self._snapshot
+        self._snapshot = self.ring_type.build(weights, old=self._snapshot,
+                                              **self.options)
+        self._weights = weights
+        self.rebanlance()
 
-class RingBuilder(object):
-    """ring builder."""
+    def _change(self, dev_id, weight):
+        u"""修改设备的权重，weight为None时删除设备，批量修改中则暂存."""
+        with self._lock:
+            weights = self._pending
+            if weights is None:
+                weights = dict(self._weights)
+            if weight is None:
+                if dev_id not in weights:
+                    raise KeyError(dev_id)
+                del weights[dev_id]
+            else:
+                weights[dev_id] = weight
+            if self._pending is None:
+                self._publish(weights)
 
-    def __init__(self):
+    def migration_plan(self):
+        u"""返回最近一次修改（批量修改算一次）的数据迁移计划."""
+        with self._lock:
+            previous, snapshot = self._previous, self._snapshot
+        return migration.diff_rings(previous, snapshot)
+
+    def set_tiers(self, tiers, publish=True):
+        u"""查表模式不按故障域挑选副本，忽略."""
+
+    def begin(self):
+        u"""开始批量修改，直到commit时才重新构建ring."""
+        with self._lock:
+            self._pending = dict(self._weights)
+
+    def commit(self):
+        u"""提交批量修改，重新构建一次ring并保存.
+
+        保存失败时恢复到批量修改前的ring，RingFile不变。
+        """
+        with self._lock:
+            weights, self._pending = self._pending, None
+            previous, snapshot = self._previous, self._snapshot
+            old_weights, data = self._weights, self.data_manager.data
+            try:
+                self._publish(weights)
+            except BaseException:
+                self._previous, self._snapshot = previous, snapshot
+                self._weights = old_weights
+                self.data_manager.set_data(data)
+                raise
+
+    def rollback(self):
+        u"""撤销批量修改."""
+        with self._lock:
+            self._pending = None
+
+    def add(self, dev_info):
+        u"""新增设备
+
+        :param dev_info: 设备信息
+        """
+        self._change(dev_info['dev_id'], dev_info[self.ring_type.WEIGHT])
+
+    def remove(self, dev_id, part_num):
+        u"""删除设备
+
+        :param dev_id: 设备id
+        :param part_num: 设备分区数量
+        """
+        self._change(dev_id, None)
+
+    def update(self, dev_id, old_part_num, new_part_num, weight=None):
+        u"""更新设备的权重
+
+        :param dev_id: 设备id
+        :param old_part_num: 设备的原分区数量
+        :param new_part_num: 设备的新分区数量
+        :param weight: 设备的新权重
+        """
+        if self.ring_type.WEIGHT == 'part_num':
+            self._change(dev_id, new_part_num)
+        elif weight is None:
+            raise exc.ErrorInvalidParam('weight')
+        else:
+            self._change(dev_id, weight)
+
+    def hash_dev(self, key):
+        u"""获取指定key hash到的设备."""
+        return self._snapshot.hash_dev(key)
+
+    def get_nodes(self, key, replicas=REPLICAS):
+        u"""获取指定key的多个副本所在的设备."""
+        return self._snapshot.get_nodes(key, replicas)
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备，整批key使用同一个ring."""
+        return self._snapshot.iter_hash_dev(keys)
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备."""
+        return self._snapshot.hash_dev_many(keys)
+
+    def rebanlance(self):
+        u"""保存ring，版本号加1."""
+        with self._lock:
+            self.generation += 1
+            self.data_manager.set_data(ringfile.dump_table(
+                self._snapshot, self._weights))
+            self.data_manager.save(self.filename)
+
+
+class RingBuilder(object):
+    u"""ring builder.
+
+    :param builder_file: BuilderFile文件名
+    :param ring_file: RingFile文件名
+    :param mode: ring模式，'point'或ringfile.RING_TYPES中的模式，默认沿用
+        RingFile中的模式，RingFile为空时为'point'（虚拟分区模式）
+    :param hash_name: 哈希函数名，见utils.HASH_FUNCS，默认沿用RingFile中
+        记录的，RingFile为空时为MD5
+    :param cache_size: hash_dev结果缓存的条目数上限，0表示不缓存
+    :param options: 虚拟分区模式的前缀索引位数prefix_bits、查找结构布局
+        layout，或查表模式的构建参数，如分区模式的part_power
+    """
+
+    def __init__(self, builder_file=BUILDER_FILE_PATH,
+                 ring_file=RING_FILE_PATH, mode=None, hash_name=None,
+                 cache_size=0, **options):
         # 分区比例，乘以weight后得到分区数量
         self.p = 0.02
-        # RingFile的管理器
-        self.ring_manager = RingManager()
+        # RingFile的管理器，RingFile只解析一次，确定模式后交给管理器
+        data_manager = DataManager.load(ring_file)
+        self.mode = self._ring_mode(data_manager.data, mode)
+        if self.mode == ringfile.POINT_MODE:
+            self.ring_manager = RingManager(ring_file, hash_name,
+                                            data_manager=data_manager,
+                                            **options)
+        else:
+            self.ring_manager = TableRingManager(
+                ringfile.RING_TYPES[self.mode], ring_file, hash_name,
+                data_manager=data_manager, **options)
         # BuilderFile的管理器
-        self.builder_manager = BuilderManager()
+        self.builder_manager = BuilderManager(builder_file)
+        self._in_batch = False
+        self._sync_tiers()
+        # hash_dev的结果缓存，ring修改后旧结果随版本号失效
+        self._cache = cache.LookupCache(cache_size) if cache_size else None
+
+    @staticmethod
+    def _ring_mode(data, mode):
+        u"""确定ring模式，指定的模式与非空RingFile中的模式不一致时报错.
+
+        :param data: RingFile数据
+        :param mode: 指定的模式，None表示沿用RingFile中的
+        """
+        file_mode = ringfile.get_mode(data) if data else None
+        if mode is None:
+            return file_mode or ringfile.POINT_MODE
+        if mode != ringfile.POINT_MODE and mode not in ringfile.RING_TYPES:
+            raise exc.ErrorInvalidParam('mode，不支持此模式')
+        if file_mode is not None and mode != file_mode:
+            raise exc.ErrorInvalidParam('mode，与RingFile中的模式不一致')
+        return mode
+
+    def _sync_tiers(self, publish=True):
+        u"""将BuilderFile中设备的故障域同步给ring.
+
+        :param publish: 为False时随后的ring修改会发布快照，故障域届时一并生效
+        """
+        self.ring_manager.set_tiers(self.builder_manager.tiers(), publish)
 
     def __enter__(self):
         return self
 
+    @contextlib.contextmanager
+    def batch(self):
+        u"""批量修改设备.
+
+        期间的add_dev/update_dev/remove_dev只在内存中进行，退出时一次性
+        更新ring并各保存一次BuilderFile和RingFile；发生异常（包括保存失败）则
+        全部撤销。
+        嵌套调用时并入外层的批量修改。
+
+        用法::
+
+            with rb.batch():
+                rb.add_dev(dev_1)
+                rb.remove_dev(2)
+        """
+        if self._in_batch:
+            yield self
+            return
+        self._in_batch = True
+        self.builder_manager.begin()
+        self.ring_manager.begin()
+        try:
+            yield self
+            # 先保存BuilderFile，RingFile保存失败时再恢复BuilderFile，
+            # 两个文件要么都更新，要么都不变
+            self.builder_manager.commit()
+            self.ring_manager.commit()
+        except BaseException:
+            self.ring_manager.rollback()
+            try:
+                self.builder_manager.rollback()
+            finally:
+                self._sync_tiers()
+            raise
+        else:
+            self.builder_manager.end()
+        finally:
+            self._in_batch = False
+
     def add_dev(self, dev):
         u"""添加设备.
 
@@ -231,6 +751,7 @@ class RingBuilder(object):
         dev['part_num'] = int(dev['dev_weight'] * self.p)
 
         self.builder_manager.add(dev)
+        self._sync_tiers(publish=False)
         self.ring_manager.add(dev)
 
     def update_dev(self, dev_id, weight=None):
@@ -242,7 +763,7 @@ class RingBuilder(object):
         old_part_num = self.builder_manager.get_by_id(dev_id)['part_num']
         new_part_num = int(weight * self.p)
         self.builder_manager.update(dev_id, weight, new_part_num)
-        self.ring_manager.update(dev_id, old_part_num, new_part_num)
+        self.ring_manager.update(dev_id, old_part_num, new_part_num, weight)
 
     def remove_dev(self, dev_id):
         u"""删除设备.
@@ -251,12 +772,75 @@ class RingBuilder(object):
         """
         temp_dev = self.builder_manager.get_by_id(dev_id)
         self.builder_manager.remove(dev_id)
+        self._sync_tiers(publish=False)
         self.ring_manager.remove(dev_id, temp_dev['part_num'])
 
+    def bounded_loads(self, epsilon=bounded.EPSILON, counter=None):
+        u"""返回有界负载的查找对象，随ring的修改使用最新的快照.
+
+        :param epsilon: 负载上限系数，设备负载不超过平均负载的1 + epsilon倍
+        :param counter: 共享的负载计数器，可选
+        :return BoundedLoadRing，只支持虚拟分区模式
+        """
+        if self.mode != ringfile.POINT_MODE:
+            raise exc.ErrorInvalidParam('mode，有界负载只支持虚拟分区模式')
+        return bounded.BoundedLoadRing(self.ring_manager, epsilon, counter)
+
+    def migration_plan(self):
+        u"""返回最近一次add_dev/update_dev/remove_dev或批量修改的数据迁移计划.
+
+        :return [(源设备id, 目标设备id, 起点, 终点)]，见migration模块
+        """
+        return self.ring_manager.migration_plan()
+
+    def cache_stats(self):
+        u"""返回hash_dev结果缓存的监控指标，未启用缓存时返回None."""
+        if self._cache is None:
+            return None
+        return self._cache.stats()
+
     def hash_dev(self, key):
         u"""获取指定key hash到的设备."""
-        dev = self.ring_manager.hash_dev(key)
+        if self._cache is not None:
+            # 先读版本号再查找，缓存的结果不会比版本号更旧
+            generation = self.ring_manager.generation
+            dev = self._cache.lookup(key, generation,
+                                     self.ring_manager.hash_dev)
+        else:
+            dev = self.ring_manager.hash_dev(key)
         if dev is not None:
             return dev
         # 如果没有对应的匹配，返回第一个设备的id
         return self.builder_manager.get_first()
+
+    def get_nodes(self, key, replicas=REPLICAS):
+        u"""获取指定key的多个副本所在的设备.
+
+        :param key: 指定key
+        :param replicas: 副本数
+        :return 设备id列表
+        """
+        return self.ring_manager.get_nodes(key, replicas)
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序生成设备id
+        """
+        first = None
+        for dev in self.ring_manager.iter_hash_dev(keys):
+            if dev is None:
+                # 如果没有对应的匹配，返回第一个设备的id
+                if first is None:
+                    first = self.builder_manager.get_first()
+                dev = first
+            yield dev
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序排列的设备id列表
+        """
+        return list(self.iter_hash_dev(keys))
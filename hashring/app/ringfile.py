@@ -0,0 +1,537 @@
+# -*- coding: utf-8 -*-
+u"""RingFile的读写.
+
+支持两种格式：
+
+- JSON格式：版本2为{"version": 2, "points": [...], "dev_ids": [...]}，
+  兼容旧版的{十六进制key: 设备id}格式；
+- 二进制格式：文件头、有序整数点数组、设备下标数组、设备表，小端存储，
+  可以用mmap打开后直接在文件上查找，无需解析。
+
+分区等查表模式的ring在JSON格式中记录"mode"字段；分区模式的二进制格式
+没有整数点数组，设备下标数组即为固定长度的分区到设备映射表。
+
+ring使用的哈希函数在JSON格式中记录在"hash"字段，在二进制格式中记录在标志位
+的高8位，缺省为MD5，与旧版文件兼容。虚拟分区模式的前缀索引位数记录在JSON
+格式的"prefix_bits"字段，索引本身在加载时重新构建。
+
+两种格式都带有内容的CRC32校验和，读者可以在切换到新文件前校验其完整性；
+文件通过临时文件加原子重命名写入。
+"""
+import json
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+
+from hashring.app.hrw import HRWRing
+from hashring.app.jump import JumpRing
+from hashring.app.lookup import RingView, find_index, iter_lookup
+from hashring.app.maglev import MaglevRing
+from hashring.app.partition import PartitionRing
+from hashring.common import exceptions as exc
+from hashring.common.utils import (DEFAULT_HASH, POINT_BITS, atomic_write,
+                                   get_hash, key_to_point)
+
+# JSON格式版本，版本2以整数点存储虚拟分区
+JSON_VERSION = 2
+
+# ring模式：默认的虚拟分区模式，以及以查表方式查找的其他模式
+POINT_MODE = 'point'
+RING_TYPES = {
+    PartitionRing.MODE: PartitionRing,
+    JumpRing.MODE: JumpRing,
+    HRWRing.MODE: HRWRing,
+    MaglevRing.MODE: MaglevRing,
+}
+
+# 二进制格式：魔数、版本、标志位、分区数量、设备数量、校验和
+MAGIC = b'HRNG'
+BINARY_VERSION = 2
+HEADER = struct.Struct('<4sHHQII')
+# 标志位：分区模式，没有整数点数组，设备下标数组即分区到设备的映射表
+FLAG_PARTITION = 0x1
+# 标志位的低8位为模式，高8位为哈希函数在HASH_IDS中的下标
+FLAG_MODE_MASK = 0xff
+HASH_SHIFT = 8
+HASH_IDS = ('md5', 'blake2b', 'crc32')
+# 设备下标数组中表示未分配设备的值
+NO_DEV = 0xffffffff
+
+
+def _to_bytes(arr):
+    u"""返回数组小端存储的内容."""
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def parse_json(data):
+    u"""解析JSON格式的RingFile数据.
+
+    :param data: RingFile数据
+    :return 有序的(sorted_keys, dev_ids)数组，校验和不符时抛出ErrorFileChecksum
+
+    校验和覆盖除校验和以外的全部内容，与查表模式一致。
+    """
+    if data.get('version') == JSON_VERSION:
+        pairs = zip(data['points'], data['dev_ids'])
+    else:
+        pairs = ((key_to_point(key), dev_id) for key, dev_id in data.items())
+    sorted_keys, dev_ids = array('Q'), array('q')
+    for point, dev_id in sorted(pairs):
+        sorted_keys.append(point)
+        dev_ids.append(dev_id)
+    if 'checksum' in data and data['checksum'] != _dict_checksum(data):
+        raise exc.ErrorFileChecksum
+    return sorted_keys, dev_ids
+
+
+def parse_hash(data):
+    u"""返回JSON格式RingFile数据中ring使用的哈希函数名."""
+    return data.get('hash', DEFAULT_HASH)
+
+
+def select_hash(data, hash_name=None):
+    u"""确定ring使用的哈希函数.
+
+    已有的ring沿用文件中的哈希函数，不能更换；空文件使用指定的哈希函数。
+
+    :param data: JSON格式的RingFile数据
+    :param hash_name: 指定的哈希函数名，None表示不指定
+    :return 哈希函数名，与非空文件中的不一致时抛出ErrorInvalidParam
+    """
+    if not data:
+        hash_name = hash_name or DEFAULT_HASH
+        get_hash(hash_name)
+        return hash_name
+    if hash_name is not None and hash_name != parse_hash(data):
+        raise exc.ErrorInvalidParam('hash，与RingFile中的哈希函数不一致')
+    return parse_hash(data)
+
+
+def parse_prefix_bits(data):
+    u"""返回JSON格式RingFile数据中前缀索引的位数，没有时为0."""
+    return data.get('prefix_bits', 0)
+
+
+def parse_tiers(data):
+    u"""解析JSON格式RingFile数据中设备的故障域.
+
+    :param data: RingFile数据
+    :return {设备id: (region, zone, host)}
+    """
+    return dict((int(dev_id), tuple(location))
+                for dev_id, location in data.get('tiers', {}).items())
+
+
+def dump_json(sorted_keys, dev_ids, tiers=None, hash_name=DEFAULT_HASH,
+              prefix_bits=0):
+    u"""生成JSON格式的RingFile数据.
+
+    :param sorted_keys: 有序的虚拟分区数组
+    :param dev_ids: 与sorted_keys一一对应的设备id数组
+    :param tiers: {设备id: (region, zone, host)}，可选
+    :param hash_name: 哈希函数名
+    :param prefix_bits: 前缀索引的位数，0表示不使用
+    :return RingFile数据
+    """
+    data = {
+        'version': JSON_VERSION,
+        'points': sorted_keys.tolist(),
+        'dev_ids': dev_ids.tolist(),
+    }
+    if hash_name != DEFAULT_HASH:
+        data['hash'] = hash_name
+    if prefix_bits:
+        data['prefix_bits'] = prefix_bits
+    if tiers:
+        data['tiers'] = dict((str(dev_id), list(location))
+                             for dev_id, location in tiers.items())
+    data['checksum'] = _dict_checksum(data)
+    return data
+
+
+def _align(offset):
+    u"""按8字节对齐."""
+    return (offset + 7) & ~7
+
+
+def _layout(count, dev_count, points=True):
+    u"""返回二进制格式中各数组的偏移及文件总长度.
+
+    :param count: 设备下标数组的长度
+    :param dev_count: 设备表的长度
+    :param points: 是否有整数点数组，分区模式没有
+    """
+    points_offset = HEADER.size
+    index_offset = points_offset + (8 * count if points else 0)
+    devs_offset = _align(index_offset + 4 * count)
+    size = devs_offset + 8 * dev_count
+    return points_offset, index_offset, devs_offset, size
+
+
+def _dump_binary(flags, points, dev_ids, hash_name):
+    u"""生成二进制格式的RingFile内容，设备id为-1的位置以NO_DEV标记."""
+    flags |= HASH_IDS.index(hash_name) << HASH_SHIFT
+    devs = sorted(set(dev_id for dev_id in dev_ids if dev_id >= 0))
+    dev_index = dict((dev_id, i) for i, dev_id in enumerate(devs))
+    dev_index[-1] = NO_DEV
+    index = array('I', [dev_index[dev_id] for dev_id in dev_ids])
+    _, index_offset, devs_offset, size = _layout(len(index), len(devs),
+                                                 points is not None)
+    buf = bytearray(size)
+    if points is not None:
+        buf[HEADER.size:index_offset] = _to_bytes(points)
+    buf[index_offset:index_offset + 4 * len(index)] = _to_bytes(index)
+    buf[devs_offset:size] = _to_bytes(array('q', devs))
+    HEADER.pack_into(buf, 0, MAGIC, BINARY_VERSION, flags, len(index),
+                     len(devs), zlib.crc32(memoryview(buf)[HEADER.size:]))
+    return bytes(buf)
+
+
+def dump_binary(sorted_keys, dev_ids, hash_name=DEFAULT_HASH):
+    u"""生成二进制格式的RingFile内容.
+
+    :param sorted_keys: 有序的虚拟分区数组
+    :param dev_ids: 与sorted_keys一一对应的设备id数组
+    :param hash_name: 哈希函数名
+    :return 文件内容
+    """
+    return _dump_binary(0, sorted_keys, dev_ids, hash_name)
+
+
+def dump_partition_binary(ring):
+    u"""生成分区模式的二进制RingFile内容.
+
+    :param ring: PartitionRing
+    :return 文件内容
+    """
+    return _dump_binary(FLAG_PARTITION, None, ring.part2dev, ring.hash_name)
+
+
+def _binary_flags(filename):
+    u"""返回二进制RingFile的标志位，不是二进制格式时返回None."""
+    with open(filename, 'rb') as fp:
+        header = fp.read(HEADER.size)
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        return None
+    return HEADER.unpack(header)[2]
+
+
+def is_binary(filename):
+    u"""判断文件是否为二进制格式的RingFile."""
+    with open(filename, 'rb') as fp:
+        return fp.read(len(MAGIC)) == MAGIC
+
+
+def save_binary(filename, sorted_keys, dev_ids, hash_name=DEFAULT_HASH):
+    u"""保存为二进制格式的RingFile.
+
+    :param filename: 文件名
+    :param sorted_keys: 有序的虚拟分区数组
+    :param dev_ids: 与sorted_keys一一对应的设备id数组
+    :param hash_name: 哈希函数名
+    """
+    atomic_write(filename, dump_binary(sorted_keys, dev_ids, hash_name))
+
+
+class _MappedFile(object):
+    u"""以mmap打开的只读二进制RingFile.
+
+    :param filename: 文件名
+    :param verify: 是否在打开时校验文件内容，校验和不符时抛出ErrorFileChecksum
+    """
+
+    # 要求的模式标志位
+    FLAGS = 0
+
+    def __init__(self, filename, verify=True):
+        self.filename = filename
+        with open(filename, 'rb') as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, count, dev_count, crc = HEADER.unpack_from(
+            self._mmap, 0)
+        if magic != MAGIC or version != BINARY_VERSION or \
+                flags & FLAG_MODE_MASK != self.FLAGS or \
+                flags >> HASH_SHIFT >= len(HASH_IDS):
+            self._mmap.close()
+            raise ValueError('不支持的RingFile格式：%s' % filename)
+        self.hash_name = HASH_IDS[flags >> HASH_SHIFT]
+        self._hash = get_hash(self.hash_name)
+        points_offset, index_offset, devs_offset, size = _layout(
+            count, dev_count, not flags & FLAG_PARTITION)
+        if verify:
+            with memoryview(self._mmap) as view:
+                valid = zlib.crc32(view[HEADER.size:size]) == crc
+            if not valid:
+                self._mmap.close()
+                raise exc.ErrorFileChecksum
+        view = self._view = memoryview(self._mmap)
+        if sys.byteorder == 'little':
+            self._sorted_keys = view[points_offset:index_offset].cast('Q')
+            self._dev_index = view[index_offset:index_offset + 4 * count] \
+                .cast('I')
+            self._devs = view[devs_offset:size].cast('q')
+        else:
+            # 大端机器上无法直接使用映射，退回到拷贝后转换字节序
+            self._sorted_keys = array(
+                'Q', view[points_offset:index_offset].tobytes())
+            self._dev_index = array(
+                'I', view[index_offset:index_offset + 4 * count].tobytes())
+            self._devs = array('q', view[devs_offset:size].tobytes())
+            for arr in (self._sorted_keys, self._dev_index, self._devs):
+                arr.byteswap()
+
+    def __len__(self):
+        return len(self._dev_index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        u"""关闭文件映射."""
+        for view in (self._sorted_keys, self._dev_index, self._devs,
+                     self._view):
+            if isinstance(view, memoryview):
+                view.release()
+        self._mmap.close()
+
+    def dev_ids(self):
+        u"""返回设备下标数组对应的设备id数组，未分配的位置为-1."""
+        devs = self._devs
+        return array('q', [-1 if i == NO_DEV else devs[i]
+                           for i in self._dev_index])
+
+    def hash_dev_many(self, keys):
+        u"""批量获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序排列的设备id列表
+        """
+        return list(self.iter_hash_dev(keys))
+
+
+class MappedRing(_MappedFile):
+    u"""以mmap打开的只读二进制RingFile，直接在文件映射上查找.
+
+    :param filename: 文件名
+    :param verify: 是否在打开时校验文件内容，校验和不符时抛出ErrorFileChecksum
+    """
+
+    def hash_dev(self, key):
+        u"""获取指定key hash到的设备.
+
+        :param key: 指定key
+        :return 设备id，环为空时返回None
+        """
+        idx = find_index(self._sorted_keys, self._hash(key))
+        if idx < 0:
+            return None
+        return self._devs[self._dev_index[idx]]
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序生成设备id
+        """
+        devs = self._devs
+        for idx in iter_lookup(self._sorted_keys, self._dev_index,
+                               map(self._hash, keys)):
+            yield None if idx is None else devs[idx]
+
+
+class MappedPartitionRing(_MappedFile):
+    u"""以mmap打开的只读分区模式二进制RingFile，查找只需一次数组下标访问.
+
+    :param filename: 文件名
+    :param verify: 是否在打开时校验文件内容，校验和不符时抛出ErrorFileChecksum
+    """
+
+    FLAGS = FLAG_PARTITION
+
+    def __init__(self, filename, verify=True):
+        super(MappedPartitionRing, self).__init__(filename, verify)
+        self.part_power = len(self._dev_index).bit_length() - 1
+        self._shift = POINT_BITS - self.part_power
+
+    def hash_dev(self, key):
+        u"""获取指定key hash到的设备.
+
+        :param key: 指定key
+        :return 设备id，没有设备时返回None
+        """
+        idx = self._dev_index[self._hash(key) >> self._shift]
+        return None if idx == NO_DEV else self._devs[idx]
+
+    def iter_hash_dev(self, keys):
+        u"""逐个获取一批key hash到的设备.
+
+        :param keys: key的可迭代对象
+        :return 按输入顺序生成设备id
+        """
+        dev_index, devs, shift = self._dev_index, self._devs, self._shift
+        for point in map(self._hash, keys):
+            idx = dev_index[point >> shift]
+            yield None if idx == NO_DEV else devs[idx]
+
+
+def _load_points(filename):
+    u"""将虚拟分区模式的RingFile加载为RingView，自动识别格式."""
+    if is_binary(filename):
+        with MappedRing(filename) as ring:
+            return RingView(array('Q', ring._sorted_keys.tobytes()),
+                            ring.dev_ids(), hash_name=ring.hash_name)
+    with open(filename, 'r', encoding='utf-8') as fp:
+        data = json.load(fp)
+    return RingView(*parse_json(data), tiers=parse_tiers(data),
+                    hash_name=parse_hash(data),
+                    prefix_bits=parse_prefix_bits(data))
+
+
+def load(filename):
+    u"""加载RingFile，返回(sorted_keys, dev_ids)数组，自动识别格式.
+
+    :param filename: 文件名
+    """
+    ring = _load_points(filename)
+    return ring.sorted_keys, ring.dev_ids
+
+
+def get_mode(data):
+    u"""返回JSON格式RingFile数据的ring模式."""
+    return data.get('mode', POINT_MODE)
+
+
+def _dict_checksum(data):
+    u"""计算RingFile数据除校验和以外内容的CRC32校验和."""
+    content = dict((key, value) for key, value in data.items()
+                   if key != 'checksum')
+    return zlib.crc32(json.dumps(content, sort_keys=True).encode('utf-8'))
+
+
+def dump_table(ring, weights):
+    u"""生成查表模式（分区等）ring的JSON格式RingFile数据.
+
+    :param ring: RING_TYPES中某一模式的ring
+    :param weights: 构建ring所用的{设备id: 权重}
+    :return RingFile数据
+    """
+    data = ring.to_dict()
+    data.update({
+        'version': JSON_VERSION,
+        'mode': ring.MODE,
+        'weights': dict((str(dev_id), weight)
+                        for dev_id, weight in weights.items()),
+    })
+    data['checksum'] = _dict_checksum(data)
+    return data
+
+
+def parse_table(data):
+    u"""解析查表模式ring的JSON格式RingFile数据.
+
+    :param data: RingFile数据
+    :return (ring, {设备id: 权重})，校验和不符时抛出ErrorFileChecksum
+    """
+    if 'checksum' in data and data['checksum'] != _dict_checksum(data):
+        raise exc.ErrorFileChecksum
+    ring = RING_TYPES[get_mode(data)].from_dict(data)
+    weights = dict((int(dev_id), weight)
+                   for dev_id, weight in data.get('weights', {}).items())
+    return ring, weights
+
+
+def open_ring(filename, verify=True):
+    u"""以只读方式打开RingFile用于查找，自动识别格式和模式.
+
+    :param filename: 文件名
+    :param verify: 是否校验文件内容，校验和不符时抛出ErrorFileChecksum
+    :return 二进制格式返回MappedRing或MappedPartitionRing，JSON格式返回
+        RingView或对应模式的ring
+    """
+    flags = _binary_flags(filename)
+    if flags is not None:
+        if flags & FLAG_PARTITION:
+            return MappedPartitionRing(filename, verify=verify)
+        return MappedRing(filename, verify=verify)
+    with open(filename, 'r', encoding='utf-8') as fp:
+        data = json.load(fp)
+    if not verify:
+        data.pop('checksum', None)
+    if get_mode(data) != POINT_MODE:
+        return parse_table(data)[0]
+    return RingView(*parse_json(data), tiers=parse_tiers(data),
+                    hash_name=parse_hash(data),
+                    prefix_bits=parse_prefix_bits(data))
+
+
+def _load_table(filename):
+    u"""加载查表模式的RingFile，返回(ring, {设备id: 权重})，不是查表模式时
+    返回None.
+
+    分区模式的二进制格式不保存权重，以各设备的分区数量代替。
+    """
+    flags = _binary_flags(filename)
+    if flags is not None and flags & FLAG_PARTITION:
+        with MappedPartitionRing(filename) as mapped:
+            ring = PartitionRing(mapped.dev_ids(), mapped.part_power,
+                                 mapped.hash_name)
+        weights = {}
+        for dev_id in ring.part2dev:
+            if dev_id >= 0:
+                weights[dev_id] = weights.get(dev_id, 0) + 1
+        return ring, weights
+    if flags is not None:
+        return None
+    with open(filename, 'r', encoding='utf-8') as fp:
+        data = json.load(fp)
+    if get_mode(data) != POINT_MODE:
+        return parse_table(data)
+    return None
+
+
+def load_ring(filename):
+    u"""将RingFile整个加载到内存，用于比较等离线处理.
+
+    :param filename: 文件名，JSON或二进制格式
+    :return 虚拟分区模式返回RingView，其他模式返回对应模式的ring
+    """
+    table = _load_table(filename)
+    if table is not None:
+        return table[0]
+    return _load_points(filename)
+
+
+def convert(src, dst, binary=True):
+    u"""转换RingFile格式，二进制格式只支持虚拟分区模式和分区模式.
+
+    :param src: 源文件名，JSON或二进制格式
+    :param dst: 目标文件名
+    :param binary: 为True时转换为二进制格式，否则转换为JSON格式
+    """
+    table = _load_table(src)
+    if table is not None:
+        ring, weights = table
+        if binary and ring.MODE != PartitionRing.MODE:
+            raise exc.ErrorInvalidParam('mode，%s模式没有二进制格式'
+                                        % ring.MODE)
+        if binary:
+            content = dump_partition_binary(ring)
+        else:
+            content = json.dumps(dump_table(ring, weights)).encode('utf-8')
+        atomic_write(dst, content)
+        return
+    ring = _load_points(src)
+    if binary:
+        save_binary(dst, ring.sorted_keys, ring.dev_ids, ring.hash_name)
+    else:
+        atomic_write(dst, json.dumps(dump_json(
+            ring.sorted_keys, ring.dev_ids, ring.tiers, ring.hash_name,
+            ring.prefix_bits)).encode('utf-8'))
@@ -5,7 +5,10 @@ from __future__ import print_function
 import json
 from sys import argv as sys_argv, exit
 
-from hashring.app.ringbuilder import RingBuilder
+from hashring.app import daemon as lookup_daemon
+from hashring.app import migration
+from hashring.app import ringfile
+from hashring.app.ringbuilder import RING_FILE_PATH, RingBuilder, TIER_KEYS
 from hashring.common.log import mylog
 from hashring.common import exceptions as exc
 
@@ -46,6 +49,10 @@ class Commands(object):
             LOG.error('RingBuilder.add_dev: 无效的参数weight')
             raise exc.ErrorInvalidParam('weight')
 
+        # 可选的故障域：region、zone、host
+        for key, value in zip(TIER_KEYS, args[5:]):
+            dev_info[key] = value
+
         # 执行
         with RingBuilder as rb:
             rb.add_dev(dev_info)
@@ -97,6 +104,61 @@ class Commands(object):
         with RingBuilder as rb:
             rb.hash(key)
 
+    @staticmethod
+    def convert():
+        u"""转换RingFile格式.
+
+        用法：convert <源文件> <目标文件> [binary|json]，默认转换为二进制格式。
+        """
+        args = sys_argv[2:]
+        if len(args) < 2:
+            LOG.error('缺少源文件或目标文件。')
+            raise exc.ErrorInvalidParam('filename')
+        fmt = args[2] if len(args) > 2 else 'binary'
+        if fmt not in ('binary', 'json'):
+            LOG.error('不支持的格式：%s。' % fmt)
+            raise exc.ErrorInvalidParam('format')
+        ringfile.convert(args[0], args[1], binary=(fmt == 'binary'))
+
+    @staticmethod
+    def diff():
+        u"""比较两个RingFile，输出换了设备的键空间比例.
+
+        用法：diff <旧文件> <新文件> [ranges]，以JSON格式输出总的迁移比例及
+        各(源设备, 目标设备)的迁移比例，指定ranges时同时输出所有迁移区间。
+        """
+        args = sys_argv[2:]
+        if len(args) < 2:
+            LOG.error('缺少要比较的RingFile。')
+            raise exc.ErrorInvalidParam('filename')
+        plan = migration.diff_rings(ringfile.load_ring(args[0]),
+                                    ringfile.load_ring(args[1]))
+        summary = migration.summarize(plan)
+        result = {
+            'moved': sum(summary.values()),
+            'ranges': len(plan),
+            'pairs': [{'src': src, 'dst': dst, 'fraction': fraction}
+                      for (src, dst), fraction in sorted(
+                          summary.items(), key=lambda item: -item[1])],
+        }
+        if len(args) > 2 and args[2] == 'ranges':
+            result['plan'] = [list(move) for move in plan]
+        print(json.dumps(result, sort_keys=True))
+
+    @staticmethod
+    def daemon():
+        u"""启动常驻的查找服务.
+
+        用法：daemon <套接字路径> [RingFile]，RingFile默认为RING_FILE_PATH，
+        变化后自动重新加载。
+        """
+        args = sys_argv[2:]
+        if not args:
+            LOG.error('缺少套接字路径。')
+            raise exc.ErrorInvalidParam('socket')
+        lookup_daemon.run(args[1] if len(args) > 1 else RING_FILE_PATH,
+                          args[0])
+
     # TODO: 查看builder file、ring file等
 
 
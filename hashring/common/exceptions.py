@@ -32,3 +32,20 @@ class ErrorInvalidParam(Exception):
 
     def __str__(self):
         return "无效的参数：%s，请检查后重试！".format(self.msg)
+
+
+class ErrorFileChecksum(Exception):
+    u"""文件校验和错误.
+    """
+    def __str__(self):
+        return "文件校验和错误！"
+
+
+class ErrorProtocol(Exception):
+    u"""查找服务的协议错误.
+    """
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return "协议错误：%s" % self.msg
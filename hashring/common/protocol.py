@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+u"""查找服务的帧协议.
+
+每帧由帧头和帧体组成，帧头为小端的(帧体长度uint32, 操作码/状态uint8,
+请求id uint32)。请求id由客户端分配，响应原样带回，同一连接上可以连续发送
+多个请求而不必等待响应。
+
+请求：
+
+- OP_HASH：帧体为一个UTF-8编码的key；
+- OP_HASH_MANY：帧体为key数量uint32，随后每个key为长度uint16加UTF-8内容，
+  数量不超过MAX_KEYS，帧体不超过MAX_FRAME，更多的key用split_keys拆分；
+- OP_STATS：帧体为空。
+
+响应的状态为STATUS_OK时，OP_HASH的帧体为一个int64设备id，OP_HASH_MANY的
+帧体为数量uint32加int64设备id数组，没有设备时为-1；OP_STATS的帧体为JSON
+格式的监控指标。状态为STATUS_ERROR时帧体为UTF-8的错误信息。
+"""
+import json
+import struct
+import sys
+from array import array
+
+from hashring.common import exceptions as exc
+
+HEADER = struct.Struct('<IBI')
+# 帧体长度上限
+MAX_FRAME = 1 << 24
+
+# 操作码
+OP_HASH = 1
+OP_HASH_MANY = 2
+OP_STATS = 3
+# 响应状态
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# 设备id数组中表示没有设备的值
+NO_DEV = -1
+# 单个key编码后的长度上限
+MAX_KEY_SIZE = 0xffff
+# 一个OP_HASH_MANY请求的key数量上限。服务在事件循环中同步查找，限制单个
+# 请求占用事件循环的时间，更多的key由客户端拆分为多个请求
+MAX_KEYS = 1 << 14
+
+_COUNT = struct.Struct('<I')
+_KEY_LEN = struct.Struct('<H')
+_DEV = struct.Struct('<q')
+
+
+def _frame(code, req_id, body):
+    return HEADER.pack(len(body), code, req_id) + body
+
+
+def parse_header(data):
+    u"""解析帧头.
+
+    :param data: HEADER.size字节的帧头
+    :return (帧体长度, 操作码或状态, 请求id)，帧体过长时抛出ErrorProtocol
+    """
+    size, code, req_id = HEADER.unpack(data)
+    if size > MAX_FRAME:
+        raise exc.ErrorProtocol('帧体长度%s超过上限' % size)
+    return size, code, req_id
+
+
+def _dev_array(dev_ids):
+    devs = array('q', [NO_DEV if dev_id is None else dev_id
+                       for dev_id in dev_ids])
+    if sys.byteorder == 'big':
+        devs.byteswap()
+    return devs.tobytes()
+
+
+def encode_key(key):
+    u"""将key编码为UTF-8.
+
+    :return 编码后的bytes，key不是字符串、无法编码或超过MAX_KEY_SIZE字节时
+        抛出ErrorInvalidParam
+    """
+    try:
+        data = key.encode('utf-8')
+    except (AttributeError, UnicodeEncodeError):
+        raise exc.ErrorInvalidParam('key，须为可以UTF-8编码的字符串')
+    if len(data) > MAX_KEY_SIZE:
+        raise exc.ErrorInvalidParam('key，编码后超过%s字节' % MAX_KEY_SIZE)
+    return data
+
+
+def encode_hash(req_id, key):
+    u"""编码OP_HASH请求."""
+    return _frame(OP_HASH, req_id, encode_key(key))
+
+
+def encode_hash_many(req_id, keys):
+    u"""编码OP_HASH_MANY请求.
+
+    :param req_id: 请求id
+    :param keys: key序列，数量超过MAX_KEYS或帧体将超过MAX_FRAME时抛出
+        ErrorInvalidParam
+    """
+    if len(keys) > MAX_KEYS:
+        raise exc.ErrorInvalidParam('keys，数量超过%s' % MAX_KEYS)
+    parts = [_COUNT.pack(len(keys))]
+    size = _COUNT.size
+    for key in keys:
+        data = encode_key(key)
+        size += _KEY_LEN.size + len(data)
+        if size > MAX_FRAME:
+            raise exc.ErrorInvalidParam('keys，编码后超过%s字节' % MAX_FRAME)
+        parts.append(_KEY_LEN.pack(len(data)))
+        parts.append(data)
+    return _frame(OP_HASH_MANY, req_id, b''.join(parts))
+
+
+def split_keys(keys):
+    u"""将key序列拆分为可以各自作为一个OP_HASH_MANY请求发送的批次.
+
+    每批不超过MAX_KEYS个key，编码后的帧体不超过MAX_FRAME。
+
+    :param keys: key序列
+    :return 按输入顺序的key列表的列表，空序列返回一个空的批次；key无效时
+        抛出ErrorInvalidParam
+    """
+    chunks, chunk, size = [], [], _COUNT.size
+    for key in keys:
+        key_size = _KEY_LEN.size + len(encode_key(key))
+        if chunk and (len(chunk) >= MAX_KEYS or size + key_size > MAX_FRAME):
+            chunks.append(chunk)
+            chunk, size = [], _COUNT.size
+        chunk.append(key)
+        size += key_size
+    chunks.append(chunk)
+    return chunks
+
+
+def encode_stats(req_id):
+    u"""编码OP_STATS请求."""
+    return _frame(OP_STATS, req_id, b'')
+
+
+def decode_keys(body):
+    u"""解析OP_HASH_MANY请求的帧体.
+
+    :return key列表，帧体不完整或key数量超过MAX_KEYS时抛出ErrorProtocol
+    """
+    try:
+        count, = _COUNT.unpack_from(body, 0)
+        if count > MAX_KEYS:
+            raise exc.ErrorProtocol('key数量%s超过上限' % count)
+        offset = _COUNT.size
+        keys = []
+        for _ in range(count):
+            size, = _KEY_LEN.unpack_from(body, offset)
+            offset += _KEY_LEN.size
+            if offset + size > len(body):
+                raise exc.ErrorProtocol('key不完整')
+            keys.append(body[offset:offset + size].decode('utf-8'))
+            offset += size
+    except (struct.error, UnicodeDecodeError) as e:
+        raise exc.ErrorProtocol(str(e))
+    if offset != len(body):
+        raise exc.ErrorProtocol('帧体有多余的数据')
+    return keys
+
+
+def encode_dev(req_id, dev_id):
+    u"""编码OP_HASH的响应，dev_id为None表示没有设备."""
+    return _frame(STATUS_OK, req_id,
+                  _DEV.pack(NO_DEV if dev_id is None else dev_id))
+
+
+def encode_devs(req_id, dev_ids):
+    u"""编码OP_HASH_MANY的响应."""
+    return _frame(STATUS_OK, req_id,
+                  _COUNT.pack(len(dev_ids)) + _dev_array(dev_ids))
+
+
+def encode_json(req_id, data):
+    u"""编码OP_STATS的响应."""
+    return _frame(STATUS_OK, req_id,
+                  json.dumps(data, sort_keys=True).encode('utf-8'))
+
+
+def encode_error(req_id, message):
+    u"""编码错误响应."""
+    return _frame(STATUS_ERROR, req_id, message.encode('utf-8'))
+
+
+def decode_dev(body):
+    u"""解析OP_HASH响应的帧体，返回设备id，没有设备时为None."""
+    dev_id, = _DEV.unpack(body)
+    return None if dev_id == NO_DEV else dev_id
+
+
+def decode_devs(body):
+    u"""解析OP_HASH_MANY响应的帧体，返回设备id列表，没有设备时为None."""
+    try:
+        count, = _COUNT.unpack_from(body, 0)
+        devs = array('q', body[_COUNT.size:])
+    except (struct.error, ValueError) as e:
+        raise exc.ErrorProtocol(str(e))
+    if len(devs) != count:
+        raise exc.ErrorProtocol('设备id数量不符')
+    if sys.byteorder == 'big':
+        devs.byteswap()
+    return [None if dev_id == NO_DEV else dev_id for dev_id in devs]
+
+
+def decode_json(body):
+    u"""解析OP_STATS响应的帧体."""
+    return json.loads(body.decode('utf-8'))
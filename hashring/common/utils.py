@@ -1,7 +1,107 @@
 import hashlib
+import os
+import struct
+import tempfile
+import zlib
+
+from hashring.common import exceptions as exc
+
+# 环上整数点的位宽，取哈希值的高64位
+POINT_BITS = 64
+
+_md5 = hashlib.md5
+_blake2b = hashlib.blake2b
+_unpack = struct.Struct('>Q').unpack_from
+
 
 def gen_key(key):
     u"""根据字符串哈希出key值"""
     m = hashlib.md5()
     m.update(key.encode('utf-8'))
-    return m.hexdigest()
\ No newline at end of file
+    return m.hexdigest()
+
+
+def _md5_point(key):
+    u"""MD5摘要的高64位，与旧版RingFile兼容"""
+    return _unpack(_md5(key.encode('utf-8')).digest())[0]
+
+
+def _blake2b_point(key):
+    u"""8字节摘要的BLAKE2b"""
+    return _unpack(_blake2b(key.encode('utf-8'), digest_size=8).digest())[0]
+
+
+def _crc32_point(key):
+    u"""非加密的快速哈希：高32位为CRC32，低32位为Adler-32"""
+    data = key.encode('utf-8')
+    return (zlib.crc32(data) << 32) | zlib.adler32(data)
+
+
+# 可选的哈希函数，将字符串哈希为环上的整数点；名称记录在RingFile中，
+# 新增哈希函数只能追加，不能修改已有的实现
+HASH_FUNCS = {
+    'md5': _md5_point,
+    'blake2b': _blake2b_point,
+    'crc32': _crc32_point,
+}
+DEFAULT_HASH = 'md5'
+
+
+def get_hash(name=DEFAULT_HASH):
+    u"""返回名为name的哈希函数，不支持时抛出ErrorInvalidParam"""
+    try:
+        return HASH_FUNCS[name]
+    except KeyError:
+        raise exc.ErrorInvalidParam('hash，不支持的哈希函数%s' % name)
+
+
+def gen_point(key):
+    u"""根据字符串哈希出环上的整数点，与gen_key的前16位十六进制等值"""
+    return _md5_point(key)
+
+
+def key_to_point(key):
+    u"""将gen_key生成的十六进制key转换为环上的整数点"""
+    return int(key[:16], 16)
+
+
+def gen_points(keys, hash_name=DEFAULT_HASH):
+    u"""批量哈希字符串，按输入顺序逐个生成环上的整数点"""
+    return map(get_hash(hash_name), keys)
+
+
+def atomic_write(filename, content):
+    u"""原子地写文件.
+
+    先写入同目录下的临时文件并fsync，再重命名覆盖目标文件，读者要么看到旧文件，
+    要么看到完整的新文件；写入中途崩溃也不会破坏原文件。
+
+    :param filename: 文件名
+    :param content: 文件内容（bytes）
+    """
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_name = tempfile.mkstemp(
+        dir=dirname, prefix='.%s.' % os.path.basename(filename))
+    try:
+        # 沿用原文件的权限，mkstemp默认只有属主可读写
+        try:
+            mode = os.stat(filename).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        os.chmod(tmp_name, mode)
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(content)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_name, filename)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+    # 同步目录项，保证重命名落盘
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(dirname, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+u"""批量查找性能测试：逐个hash_dev vs hash_dev_many.
+
+用法：python -m test.bench.bench_batch
+"""
+from __future__ import print_function
+
+import time
+
+from hashring.app.lookup import find_index, iter_lookup
+from hashring.common.utils import gen_point, gen_points
+
+from test.helpers import make_points
+
+RING_SIZE = 100000
+BATCH_SIZES = [1, 100, 10000, 1000000]
+
+
+def single(sorted_keys, dev_ids, keys):
+    u"""逐个查找，等价于循环调用RingManager.hash_dev."""
+    return [dev_ids[find_index(sorted_keys, gen_point(key))] for key in keys]
+
+
+def many(sorted_keys, dev_ids, keys):
+    u"""批量查找，等价于RingManager.hash_dev_many."""
+    return list(iter_lookup(sorted_keys, dev_ids, gen_points(keys)))
+
+
+def per_key(func, sorted_keys, dev_ids, keys):
+    # 小批量重复多次以获得稳定的计时
+    repeat = max(1, 100000 // len(keys))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(sorted_keys, dev_ids, keys)
+    return (time.perf_counter() - start) / repeat / len(keys)
+
+
+def main():
+    sorted_keys, dev_ids = make_points(RING_SIZE, 100)
+    print('%10s %14s %14s' % ('batch', 'single(us/key)', 'many(us/key)'))
+    for batch in BATCH_SIZES:
+        keys = ['key_%s' % i for i in range(batch)]
+        print('%10d %14.2f %14.2f' % (
+            batch, per_key(single, sorted_keys, dev_ids, keys) * 1e6,
+            per_key(many, sorted_keys, dev_ids, keys) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+u"""有界负载性能测试：Zipf分布的key流下各设备的最大负载/平均负载.
+
+模拟同时处理WINDOW个请求的服务：每个请求按Zipf分布选取key并分配设备，
+超过窗口时释放最早的请求，统计过程中出现的最大负载与平均负载之比。
+
+用法：python -m test.bench.bench_bounded
+"""
+from __future__ import print_function
+
+import collections
+import itertools
+import random
+import time
+
+from hashring.app.bounded import BoundedLoadRing
+from hashring.app.lookup import RingView
+
+from test.helpers import make_ring
+
+DEVICES = 50
+PART_NUM = 100
+N_KEYS = 100000
+N_REQUESTS = 200000
+WINDOW = 5000
+ZIPF_S = [0.8, 1.0, 1.2]
+EPSILONS = [0.1, 0.25, 0.5]
+
+
+def build_ring():
+    return RingView(*make_ring(range(DEVICES), PART_NUM))
+
+
+def zipf_stream(s, rnd):
+    keys = ['key_%s' % i for i in range(N_KEYS)]
+    cum_weights = list(itertools.accumulate(
+        1.0 / (rank ** s) for rank in range(1, N_KEYS + 1)))
+    return rnd.choices(keys, cum_weights=cum_weights, k=N_REQUESTS)
+
+
+def simulate(stream, assign, release):
+    window = collections.deque()
+    loads = [0] * DEVICES
+    peak = 0
+    start = time.perf_counter()
+    for key in stream:
+        dev_id = assign(key)
+        loads[dev_id] += 1
+        window.append(dev_id)
+        if len(window) > WINDOW:
+            old = window.popleft()
+            loads[old] -= 1
+            release(old)
+            peak = max(peak, max(loads))
+    cost = (time.perf_counter() - start) / len(stream)
+    return peak * DEVICES / float(WINDOW), cost
+
+
+def main():
+    ring = build_ring()
+    rnd = random.Random(0)
+    print('%6s %10s' % ('zipf', 'plain') +
+          ''.join('%12s' % ('eps=%s' % eps) for eps in EPSILONS) +
+          '%14s' % 'assign(us)')
+    for s in ZIPF_S:
+        stream = zipf_stream(s, rnd)
+        plain, _ = simulate(stream, ring.hash_dev, lambda dev_id: None)
+        ratios = []
+        for eps in EPSILONS:
+            bounded = BoundedLoadRing(ring, epsilon=eps)
+            ratio, cost = simulate(stream, bounded.assign, bounded.release)
+            ratios.append(ratio)
+        print('%6.1f %10.2f' % (s, plain) +
+              ''.join('%12.2f' % ratio for ratio in ratios) +
+              '%14.2f' % (cost * 1e6))
+
+
+if __name__ == '__main__':
+    main()
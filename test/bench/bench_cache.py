@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+u"""查找结果缓存性能测试：Zipf分布的key流下不同缓存大小的命中率与耗时.
+
+用法：python -m test.bench.bench_cache
+"""
+from __future__ import print_function
+
+import itertools
+import random
+import time
+
+from hashring.app.cache import LookupCache
+from hashring.app.lookup import RingView
+
+from test.helpers import make_ring
+
+DEVICES = 50
+PART_NUM = 100
+N_KEYS = 1000000
+N_REQUESTS = 500000
+ZIPF_S = [0.8, 1.0, 1.2]
+CACHE_SIZES = [1024, 16384, 65536]
+
+
+def build_ring():
+    return RingView(*make_ring(range(DEVICES), PART_NUM))
+
+
+def zipf_stream(s, rnd):
+    keys = ['key_%s' % i for i in range(N_KEYS)]
+    cum_weights = list(itertools.accumulate(
+        1.0 / (rank ** s) for rank in range(1, N_KEYS + 1)))
+    return rnd.choices(keys, cum_weights=cum_weights, k=N_REQUESTS)
+
+
+def timed(stream, lookup):
+    start = time.perf_counter()
+    for key in stream:
+        lookup(key)
+    return (time.perf_counter() - start) / len(stream) * 1e6
+
+
+def main():
+    ring = build_ring()
+    rnd = random.Random(0)
+    print('%6s %10s' % ('zipf', 'plain(us)') +
+          ''.join('%18s' % ('cache=%s' % size) for size in CACHE_SIZES))
+    for s in ZIPF_S:
+        stream = zipf_stream(s, rnd)
+        plain = timed(stream, ring.hash_dev)
+        cols = []
+        for size in CACHE_SIZES:
+            cache = LookupCache(size)
+            cost = timed(stream,
+                         lambda key: cache.lookup(key, 0, ring.hash_dev))
+            stats = cache.stats()
+            hit_rate = stats['hits'] / float(stats['hits'] + stats['misses'])
+            cols.append('%8.2fus %5.1f%%' % (cost, hit_rate * 100))
+        print('%6.1f %10.2f' % (s, plain) +
+              ''.join('%18s' % col for col in cols))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+u"""查找服务客户端性能测试：进程内查找 vs 每次调用新建连接 vs 连接池加
+自动合并（多线程与asyncio）.
+
+查找服务在子进程中运行；各方式均为并发调用方逐个查找key，统计每次调用的
+p50/p99延迟和总吞吐。
+
+用法：python -m test.bench.bench_client
+"""
+from __future__ import print_function
+
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from hashring.app import ringfile
+from hashring.app.client import AsyncLookupClient, LookupClient
+from hashring.common import protocol
+
+from test.helpers import make_ring
+
+DEVICES = 100
+PART_NUM = 100
+N_CALLS = 20000
+THREADS = [1, 16]
+TASKS = [1, 64, 512]
+WINDOWS = [0, 0.0002]
+
+
+def build_ring_file(filename):
+    ringfile.save_binary(filename, *make_ring(range(DEVICES), PART_NUM))
+
+
+def connect_per_call(socket_path):
+    u"""每次调用新建连接的朴素客户端."""
+    def hash_dev(key):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+            sock.sendall(protocol.encode_hash(1, key))
+            rfile = sock.makefile('rb')
+            size, _, _ = protocol.parse_header(
+                rfile.read(protocol.HEADER.size))
+            return protocol.decode_dev(rfile.read(size))
+        finally:
+            sock.close()
+    return hash_dev
+
+
+def report(name, latencies, cost):
+    latencies.sort()
+    count = len(latencies)
+    print('%-28s %10.1f %10.1f %12.0f' % (
+        name, latencies[count // 2] * 1e6, latencies[count * 99 // 100] * 1e6,
+        count / cost))
+
+
+def run_threads(name, hash_dev, threads):
+    latencies = []
+    per_thread = N_CALLS // threads
+
+    def worker(offset):
+        result = []
+        for i in range(per_thread):
+            start = time.perf_counter()
+            hash_dev('key_%s_%s' % (offset, i))
+            result.append(time.perf_counter() - start)
+        latencies.extend(result)
+
+    workers = [threading.Thread(target=worker, args=(i,))
+               for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    report('%s x%d' % (name, threads), latencies,
+           time.perf_counter() - start)
+
+
+async def run_tasks(socket_path, tasks, window):
+    latencies = []
+    per_task = N_CALLS // tasks
+    async with AsyncLookupClient(socket_path, window=window) as client:
+        async def worker(offset):
+            for i in range(per_task):
+                start = time.perf_counter()
+                await client.hash_dev('key_%s_%s' % (offset, i))
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(i) for i in range(tasks)])
+        cost = time.perf_counter() - start
+    report('asyncio window=%s x%d' % (window, tasks), latencies, cost)
+
+
+def wait_socket(socket_path, timeout=10.0):
+    deadline = time.time() + timeout
+    while not os.path.exists(socket_path):
+        if time.time() > deadline:
+            raise RuntimeError('查找服务未启动')
+        time.sleep(0.05)
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    ring_file = os.path.join(tmp_dir, 'Ring.bin')
+    socket_path = os.path.join(tmp_dir, 'ring.sock')
+    build_ring_file(ring_file)
+    proc = subprocess.Popen([
+        sys.executable, '-c',
+        'from hashring.app.daemon import run; run(%r, %r)'
+        % (ring_file, socket_path)])
+    try:
+        wait_socket(socket_path)
+        print('%-28s %10s %10s %12s' % ('client', 'p50(us)', 'p99(us)',
+                                        'calls/s'))
+        ring = ringfile.open_ring(ring_file)
+        for threads in THREADS:
+            run_threads('in-process', ring.hash_dev, threads)
+        for threads in THREADS:
+            run_threads('connect-per-call', connect_per_call(socket_path),
+                        threads)
+        for window in WINDOWS:
+            for threads in THREADS:
+                with LookupClient(socket_path, window=window) as client:
+                    run_threads('pooled window=%s' % window,
+                                client.hash_dev, threads)
+        for window in WINDOWS:
+            for tasks in TASKS:
+                asyncio.run(run_tasks(socket_path, tasks, window))
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
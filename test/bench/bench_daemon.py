@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+u"""查找服务性能测试：并发连接下单个/批量查找的p50/p99延迟及吞吐.
+
+查找服务在子进程中运行，负载生成器用asyncio建立CONCURRENCY个连接，每个
+连接依次发送请求并等待响应。
+
+用法：python -m test.bench.bench_daemon
+"""
+from __future__ import print_function
+
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from hashring.app import ringfile
+from hashring.common import protocol
+
+from test.helpers import make_ring
+
+DEVICES = 100
+PART_NUM = 100
+N_REQUESTS = 20000
+CONCURRENCY = [1, 8, 32]
+BATCH_SIZES = [1, 100]
+
+
+def build_ring_file(filename):
+    ringfile.save_binary(filename, *make_ring(range(DEVICES), PART_NUM))
+
+
+async def worker(socket_path, count, batch, latencies):
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    header_size = protocol.HEADER.size
+    try:
+        for i in range(count):
+            if batch == 1:
+                frame = protocol.encode_hash(i, 'key_%s' % i)
+            else:
+                frame = protocol.encode_hash_many(
+                    i, ['key_%s_%s' % (i, j) for j in range(batch)])
+            start = time.perf_counter()
+            writer.write(frame)
+            size, _, _ = protocol.parse_header(
+                await reader.readexactly(header_size))
+            await reader.readexactly(size)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load(socket_path, concurrency, batch):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        worker(socket_path, N_REQUESTS // concurrency, batch, latencies)
+        for _ in range(concurrency)])
+    cost = time.perf_counter() - start
+    latencies.sort()
+    count = len(latencies)
+    return latencies[count // 2], latencies[count * 99 // 100], count / cost
+
+
+def wait_socket(socket_path, timeout=10.0):
+    deadline = time.time() + timeout
+    while not os.path.exists(socket_path):
+        if time.time() > deadline:
+            raise RuntimeError('查找服务未启动')
+        time.sleep(0.05)
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    ring_file = os.path.join(tmp_dir, 'Ring.bin')
+    socket_path = os.path.join(tmp_dir, 'ring.sock')
+    build_ring_file(ring_file)
+    proc = subprocess.Popen([
+        sys.executable, '-c',
+        'from hashring.app.daemon import run; run(%r, %r)'
+        % (ring_file, socket_path)])
+    try:
+        wait_socket(socket_path)
+        print('%6s %12s %10s %10s %12s %12s' % (
+            'batch', 'connections', 'p50(us)', 'p99(us)', 'req/s',
+            'keys/s'))
+        for batch in BATCH_SIZES:
+            for concurrency in CONCURRENCY:
+                p50, p99, rate = asyncio.run(
+                    load(socket_path, concurrency, batch))
+                print('%6d %12d %10.0f %10.0f %12.0f %12.0f' % (
+                    batch, concurrency, p50 * 1e6, p99 * 1e6, rate,
+                    rate * batch))
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
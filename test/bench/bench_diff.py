@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+u"""RingFile比较性能测试：线性归并 vs 向量化 vs 采样key逐个查找.
+
+模拟在100台设备的环上新增一台设备。
+
+用法：python -m test.bench.bench_diff
+"""
+from __future__ import print_function
+
+import time
+
+from hashring.app import migration
+from hashring.app.lookup import RingView, merge_points
+from hashring.common.utils import gen_point
+
+from test.helpers import make_points
+
+RING_SIZES = [10000, 100000, 1000000]
+DEVICES = 100
+N_SAMPLES = 100000
+
+
+def build_ring(size):
+    return make_points(size, DEVICES)
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    keys = ['key_%s' % i for i in range(N_SAMPLES)]
+    print('%10s %10s %12s %12s %12s' % (
+        'points', 'moved', 'merge(s)', 'numpy(s)', 'sample(s)'))
+    for size in RING_SIZES:
+        old_keys, old_devs = build_ring(size)
+        new_keys, new_devs = merge_points(old_keys, old_devs, [
+            (gen_point('device_%s_p%s' % (DEVICES, i)), DEVICES)
+            for i in range(size // DEVICES)])
+        plan, merge = timeit(lambda: migration.diff_owners(
+            migration.point_owners(old_keys, old_devs),
+            migration.point_owners(new_keys, new_devs)))
+        _, vector = timeit(migration.diff_points, old_keys, old_devs,
+                           new_keys, new_devs)
+        old = RingView(old_keys, old_devs)
+        new = RingView(new_keys, new_devs)
+        _, sample = timeit(lambda: sum(
+            1 for a, b in zip(old.hash_dev_many(keys),
+                              new.hash_dev_many(keys)) if a != b))
+        print('%10d %10.4f %12.2f %12.2f %12.2f' % (
+            size, sum(migration.summarize(plan).values()), merge, vector,
+            sample))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+u"""Eytzinger布局性能测试：有序数组 vs Eytzinger布局的批量查找，1k到10M个点.
+
+hash_dev_many比较RingView两种布局的批量查找（含哈希）；place_points比较
+已哈希整数点的放置，有序数组用np.searchsorted，Eytzinger布局用
+eytzinger.search_array。需要NumPy。
+
+用法：python -m test.bench.bench_eytzinger
+"""
+from __future__ import print_function
+
+import random
+import time
+from array import array
+
+from hashring.app import placement
+from hashring.app.lookup import EYTZINGER_LAYOUT, RingView
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RING_SIZES = [1000, 10000, 100000, 1000000, 10000000]
+N_KEYS = 200000
+N_POINTS = 1000000
+
+
+def build_ring(size, rnd):
+    sorted_keys = array('Q', sorted(rnd.getrandbits(64) for _ in range(size)))
+    return sorted_keys, array('q', (i % 100 for i in range(size)))
+
+
+def timed(func, arg, count):
+    start = time.perf_counter()
+    func(arg)
+    return (time.perf_counter() - start) / count * 1e9
+
+
+def main():
+    if np is None:
+        print('需要NumPy')
+        return
+    rnd = random.Random(0)
+    keys = ['key_%s' % i for i in range(N_KEYS)]
+    points = np.array([rnd.getrandbits(64) for _ in range(N_POINTS)],
+                      dtype=np.uint64)
+    print('%10s %10s %14s %14s %14s %14s' % (
+        'points', 'build(ms)', 'many sorted', 'many eytz', 'place sorted',
+        'place eytz'))
+    for size in RING_SIZES:
+        sorted_keys, dev_ids = build_ring(size, rnd)
+        plain = RingView(sorted_keys, dev_ids)
+        start = time.perf_counter()
+        ring = RingView(sorted_keys, dev_ids, layout=EYTZINGER_LAYOUT)
+        build = (time.perf_counter() - start) * 1e3
+        row = [timed(plain.hash_dev_many, keys, N_KEYS),
+               timed(ring.hash_dev_many, keys, N_KEYS),
+               timed(lambda p: placement.place_points(sorted_keys, dev_ids,
+                                                      p), points, N_POINTS),
+               timed(lambda p: placement.place_points(
+                   sorted_keys, dev_ids, p, ring.eytzinger), points,
+                   N_POINTS)]
+        print('%10d %10.1f' % (size, build) +
+              ''.join(' %11.0fns' % cost for cost in row))
+
+
+if __name__ == '__main__':
+    main()
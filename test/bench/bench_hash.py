@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+u"""哈希函数性能测试：各哈希函数在不同key长度下的耗时及分布.
+
+分布以2^10个分区中最多的分区相对平均值的比例衡量。
+
+用法：python -m test.bench.bench_hash
+"""
+from __future__ import print_function
+
+import time
+
+from hashring.common.utils import HASH_FUNCS, gen_key
+
+KEY_LENGTHS = [8, 32, 128, 512]
+N_KEYS = 100000
+PART_POWER = 10
+
+
+def make_keys(length):
+    return [('k%07x' % i).ljust(length, 'x') for i in range(N_KEYS)]
+
+
+def main():
+    names = sorted(HASH_FUNCS)
+    print('%8s %10s' % ('length', 'hex(us)') +
+          ''.join('%14s' % ('%s(us)' % name) for name in names) +
+          ''.join('%14s' % ('%s(max)' % name) for name in names))
+    for length in KEY_LENGTHS:
+        keys = make_keys(length)
+        start = time.perf_counter()
+        for key in keys:
+            gen_key(key)
+        hex_cost = (time.perf_counter() - start) / N_KEYS
+        costs, spreads = [], []
+        for name in names:
+            func = HASH_FUNCS[name]
+            start = time.perf_counter()
+            points = [func(key) for key in keys]
+            costs.append((time.perf_counter() - start) / N_KEYS)
+            counts = [0] * (1 << PART_POWER)
+            for point in points:
+                counts[point >> (64 - PART_POWER)] += 1
+            spreads.append(max(counts) * len(counts) / float(N_KEYS))
+        print('%8d %10.2f' % (length, hex_cost * 1e6) +
+              ''.join('%14.2f' % (cost * 1e6) for cost in costs) +
+              ''.join('%14.2f' % spread for spread in spreads))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+u"""HRW模式性能测试：与虚拟分区模式（RingManager的查找路径）对比.
+
+虚拟分区模式按weight为5000、part_num为100构建；HRW模式分别测试单个key
+查找、批量查找（有NumPy时向量化）和逐个打分。
+
+用法：python -m test.bench.bench_hrw
+"""
+from __future__ import print_function
+
+import time
+
+from hashring.app import hrw
+from hashring.app.hrw import HRWRing
+from hashring.app.lookup import RingView
+
+from test.helpers import make_ring
+
+DEVICES = [10, 100, 1000]
+PART_NUM = 100
+N_KEYS = 20000
+
+
+def build_point_ring(devices):
+    return RingView(*make_ring(range(devices), PART_NUM))
+
+
+def per_key(func, keys):
+    start = time.perf_counter()
+    func(keys)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def main():
+    keys = ['key_%s' % i for i in range(N_KEYS)]
+    print('%8s %12s %12s %12s %12s' % (
+        'devices', 'point(us)', 'hrw(us)', 'hrw_many(us)', 'hrw_py(us)'))
+    for devices in DEVICES:
+        point_ring = build_point_ring(devices)
+        weights = dict((dev_id, 5000) for dev_id in range(devices))
+        ring = HRWRing(weights)
+        np = hrw.np
+        hrw.np = None
+        try:
+            py_ring = HRWRing(weights)
+            # 逐个打分很慢，按设备数缩减采样数
+            py_keys = keys[:max(100, N_KEYS * 10 // devices)]
+            py_cost = per_key(py_ring.hash_dev_many, py_keys)
+        finally:
+            hrw.np = np
+        print('%8d %12.2f %12.2f %12.2f %12.2f' % (
+            devices, per_key(point_ring.hash_dev_many, keys),
+            per_key(lambda ks: [ring.hash_dev(k) for k in ks], keys),
+            per_key(ring.hash_dev_many, keys), py_cost))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+u"""跳跃一致性哈希模式性能测试：与虚拟分区模式对比查找耗时和负载均衡.
+
+均衡度为负载最大的设备相对平均负载的比例，1.00为完全均衡。
+
+用法：python -m test.bench.bench_jump
+"""
+from __future__ import print_function
+
+import time
+
+from hashring.app.jump import JumpRing
+from hashring.app.lookup import RingView
+
+from test.helpers import make_ring
+
+DEVICES = [10, 100, 1000]
+# 每个设备的虚拟分区数，即weight为5000时的part_num
+PART_NUM = 100
+N_KEYS = 200000
+
+
+def build_point_ring(devices):
+    return RingView(*make_ring(range(devices), PART_NUM))
+
+
+def measure(ring, keys, devices):
+    start = time.perf_counter()
+    result = ring.hash_dev_many(keys)
+    cost = (time.perf_counter() - start) / len(keys)
+    counts = [0] * devices
+    for dev_id in result:
+        counts[dev_id] += 1
+    return cost, max(counts) * devices / float(len(keys))
+
+
+def main():
+    keys = ['key_%s' % i for i in range(N_KEYS)]
+    print('%8s %12s %12s %12s %12s' % (
+        'devices', 'point(us)', 'jump(us)', 'point(max)', 'jump(max)'))
+    for devices in DEVICES:
+        point_cost, point_max = measure(build_point_ring(devices), keys,
+                                        devices)
+        jump_cost, jump_max = measure(
+            JumpRing.build(dict((i, 1) for i in range(devices))), keys,
+            devices)
+        print('%8d %12.2f %12.2f %12.2f %12.2f' % (
+            devices, point_cost * 1e6, jump_cost * 1e6, point_max, jump_max))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+u"""hash_dev查找性能测试：线性扫描 vs 二分查找.
+
+用法：python -m test.bench.bench_lookup
+"""
+from __future__ import print_function
+
+import time
+
+from hashring.app.lookup import find_index
+from hashring.common.utils import gen_key
+
+RING_SIZES = [100, 1000, 10000, 100000, 1000000]
+
+
+def linear_find(sorted_keys, key):
+    u"""原实现：线性扫描第一个不小于key的虚拟分区."""
+    for idx, node in enumerate(sorted_keys):
+        if key <= node:
+            return idx
+    return 0
+
+
+def build_ring(size):
+    return sorted(gen_key('device_%s_p%s' % (i % 100, i)) for i in range(size))
+
+
+def timeit(func, sorted_keys, keys):
+    start = time.perf_counter()
+    for key in keys:
+        func(sorted_keys, key)
+    return (time.perf_counter() - start) / len(keys)
+
+
+def main():
+    print('%10s %14s %14s %10s' % ('points', 'linear(us)', 'bisect(us)',
+                                   'speedup'))
+    for size in RING_SIZES:
+        sorted_keys = build_ring(size)
+        # 线性扫描在大环上很慢，按环大小缩减采样数
+        n_linear = max(10, 2000000 // size)
+        keys = [gen_key('key_%s' % i) for i in range(max(n_linear, 10000))]
+        linear = timeit(linear_find, sorted_keys, keys[:n_linear])
+        fast = timeit(find_index, sorted_keys, keys)
+        print('%10d %14.2f %14.2f %9.0fx' % (
+            size, linear * 1e6, fast * 1e6, linear / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+u"""Maglev模式性能测试：查找表构建耗时、查找耗时、均衡度及删除设备时的扰动.
+
+均衡度为槽位最多的设备相对平均值的比例；扰动为删除一台设备后，除该设备
+原有槽位外改变了设备的槽位比例。
+
+用法：python -m test.bench.bench_maglev
+"""
+from __future__ import print_function
+
+import time
+
+from hashring.app.maglev import TABLE_SIZE, MaglevRing
+
+DEVICES = [10, 100, 1000]
+N_KEYS = 100000
+
+
+def main():
+    keys = ['key_%s' % i for i in range(N_KEYS)]
+    print('%8s %10s %12s %12s %12s' % (
+        'devices', 'build(s)', 'lookup(us)', 'max', 'disrupt'))
+    for devices in DEVICES:
+        weights = dict((dev_id, 100) for dev_id in range(devices))
+        start = time.perf_counter()
+        ring = MaglevRing.build(weights, table_size=TABLE_SIZE)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        ring.hash_dev_many(keys)
+        lookup = (time.perf_counter() - start) / N_KEYS
+        counts = {}
+        for dev_id in ring.table:
+            counts[dev_id] = counts.get(dev_id, 0) + 1
+        del weights[0]
+        new = MaglevRing.build(weights, old=ring).table
+        changed = sum(1 for a, b in zip(ring.table, new) if a != b and a != 0)
+        print('%8d %10.3f %12.2f %12.2f %12.4f' % (
+            devices, build, lookup * 1e6,
+            max(counts.values()) * devices / float(TABLE_SIZE),
+            changed / float(TABLE_SIZE)))
+
+
+if __name__ == '__main__':
+    main()
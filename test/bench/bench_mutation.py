@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+u"""环变更性能测试：全量排序/逐个删除 vs 有序合并/单次过滤.
+
+用法：python -m test.bench.bench_mutation
+"""
+from __future__ import print_function
+
+import time
+from array import array
+
+from hashring.app.lookup import merge_points, remove_points
+from hashring.common.utils import gen_point
+
+from test.helpers import make_points
+
+RING_SIZES = [10000, 100000, 1000000]
+PART_NUM = 1000
+
+
+def old_add(sorted_keys, dev_ids, pairs):
+    u"""原实现：追加后对整个环重新排序."""
+    merged = sorted(list(zip(sorted_keys, dev_ids)) + pairs)
+    return (array('Q', [point for point, _ in merged]),
+            array('q', [dev_id for _, dev_id in merged]))
+
+
+def old_remove(sorted_keys, dev_ids, points):
+    u"""原实现：逐个list.remove."""
+    sorted_keys, dev_ids = list(sorted_keys), list(dev_ids)
+    for point in points:
+        idx = sorted_keys.index(point)
+        del sorted_keys[idx]
+        del dev_ids[idx]
+    return sorted_keys, dev_ids
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    print('%10s %12s %12s %12s %12s' % (
+        'points', 'old add(s)', 'add(s)', 'old rm(s)', 'rm(s)'))
+    pairs = [(gen_point('device_new_p%s' % i), -1) for i in range(PART_NUM)]
+    points = [point for point, _ in pairs]
+    for size in RING_SIZES:
+        sorted_keys, dev_ids = make_points(size, 100)
+        added = merge_points(sorted_keys, dev_ids, pairs)
+        print('%10d %12.3f %12.3f %12.3f %12.3f' % (
+            size,
+            timeit(old_add, sorted_keys, dev_ids, pairs),
+            timeit(merge_points, sorted_keys, dev_ids, pairs),
+            timeit(old_remove, added[0], added[1], points),
+            timeit(remove_points, added[0], added[1], points)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+u"""hash_dev查找性能测试：虚拟分区模式 vs 分区模式.
+
+虚拟分区数随设备总权重增长，分区模式的分区数固定为2^16。
+
+用法：python -m test.bench.bench_partition
+"""
+from __future__ import print_function
+
+import time
+
+from hashring.app.lookup import RingView
+from hashring.app.partition import PartitionRing
+
+from test.helpers import make_ring
+
+DEVICES = [10, 100, 1000, 10000]
+# 每个设备的虚拟分区数，即weight为5000时的part_num
+PART_NUM = 100
+N_KEYS = 100000
+
+
+def build_point_ring(devices):
+    return RingView(*make_ring(range(devices), PART_NUM))
+
+
+def timeit(ring, keys):
+    start = time.perf_counter()
+    ring.hash_dev_many(keys)
+    return (time.perf_counter() - start) / len(keys)
+
+
+def main():
+    keys = ['key_%s' % i for i in range(N_KEYS)]
+    print('%8s %10s %12s %12s %12s' % (
+        'devices', 'points', 'point(us)', 'part(us)', 'build(s)'))
+    for devices in DEVICES:
+        point_ring = build_point_ring(devices)
+        start = time.perf_counter()
+        part_ring = PartitionRing.build(
+            dict((dev_id, 1) for dev_id in range(devices)))
+        build = time.perf_counter() - start
+        print('%8d %10d %12.2f %12.2f %12.2f' % (
+            devices, len(point_ring), timeit(point_ring, keys) * 1e6,
+            timeit(part_ring, keys) * 1e6, build))
+
+
+if __name__ == '__main__':
+    main()
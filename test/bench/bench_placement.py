@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+u"""批量放置性能测试：逐个查找 vs 向量化放置（需要NumPy）.
+
+用法：python -m test.bench.bench_placement
+"""
+from __future__ import print_function
+
+import time
+from array import array
+
+from hashring.app import placement
+from hashring.app.lookup import iter_lookup
+
+RING_SIZE = 100000
+N_KEYS = [10000, 1000000, 10000000]
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def scalar(sorted_keys, dev_ids, points):
+    return list(iter_lookup(sorted_keys, dev_ids, points))
+
+
+def main():
+    if placement.np is None:
+        print('NumPy未安装，向量化放置不可用。')
+    ring = placement.hash_points(
+        'device_%s_p%s' % (i % 100, i) for i in range(RING_SIZE))
+    sorted_keys = array('Q', sorted(int(p) for p in ring))
+    dev_ids = array('q', [i % 100 for i in range(RING_SIZE)])
+    print('%10s %12s %12s %12s' % ('keys', 'hash(s)', 'scalar(s)',
+                                   'vector(s)'))
+    for n_keys in N_KEYS:
+        keys = ['key_%s' % i for i in range(n_keys)]
+        hash_time = timeit(placement.hash_points, keys)
+        points = placement.hash_points(keys)
+        print('%10d %12.3f %12.3f %12.3f' % (
+            n_keys, hash_time, timeit(scalar, sorted_keys, dev_ids, points),
+            timeit(placement.place_points, sorted_keys, dev_ids, points)))
+
+
+if __name__ == '__main__':
+    main()
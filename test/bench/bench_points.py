@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+u"""虚拟分区存储性能测试：十六进制字符串 vs 64位整数点.
+
+用法：python -m test.bench.bench_points
+"""
+from __future__ import print_function
+
+import sys
+import time
+from array import array
+
+from hashring.app.lookup import find_index
+from hashring.common.utils import gen_key, gen_point
+
+RING_SIZES = [10000, 100000, 1000000]
+N_KEYS = 100000
+
+
+def str_ring_size(data, sorted_keys):
+    u"""旧版{十六进制key: 设备id}字典及有序key列表占用的内存."""
+    return (sys.getsizeof(data) + sys.getsizeof(sorted_keys) +
+            sum(sys.getsizeof(key) for key in sorted_keys))
+
+
+def timeit(hash_func, sorted_keys, keys):
+    start = time.perf_counter()
+    for key in keys:
+        find_index(sorted_keys, hash_func(key))
+    return (time.perf_counter() - start) / len(keys)
+
+
+def main():
+    keys = ['key_%s' % i for i in range(N_KEYS)]
+    print('%10s %12s %12s %12s %12s' % (
+        'points', 'str(MB)', 'int(MB)', 'str(us)', 'int(us)'))
+    for size in RING_SIZES:
+        names = ['device_%s_p%s' % (i % 100, i) for i in range(size)]
+        data = dict((gen_key(name), i % 100) for i, name in enumerate(names))
+        str_keys = sorted(data)
+        points = array('Q', sorted(gen_point(name) for name in names))
+        dev_ids = array('q', [0] * size)
+        int_size = (sys.getsizeof(points) + sys.getsizeof(dev_ids))
+        print('%10d %12.1f %12.1f %12.2f %12.2f' % (
+            size, str_ring_size(data, str_keys) / 1e6, int_size / 1e6,
+            timeit(gen_key, str_keys, keys) * 1e6,
+            timeit(gen_point, points, keys) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+u"""前缀索引性能测试：不同环大小下查找耗时随前缀位数k的变化.
+
+k=0为不使用前缀索引的二分查找；另列出构建索引的耗时。
+
+用法：python -m test.bench.bench_prefix
+"""
+from __future__ import print_function
+
+import time
+
+from hashring.app.lookup import RingView, build_prefix_index
+from hashring.common.utils import gen_point
+
+from test.helpers import make_points
+
+RING_SIZES = [10000, 1000000, 4000000]
+PREFIX_BITS = [0, 8, 12, 16, 20]
+N_KEYS = 200000
+
+
+def build_ring(size):
+    return make_points(size, 100)
+
+
+def main():
+    points = [gen_point('key_%s' % i) for i in range(N_KEYS)]
+    print('%10s %4s %14s %14s %12s' % ('points', 'k', 'lookup(ns)',
+                                       'batch(ns)', 'build(ms)'))
+    for size in RING_SIZES:
+        sorted_keys, dev_ids = build_ring(size)
+        for bits in PREFIX_BITS:
+            start = time.perf_counter()
+            if bits:
+                build_prefix_index(sorted_keys, bits)
+            build = time.perf_counter() - start
+            ring = RingView(sorted_keys, dev_ids, prefix_bits=bits)
+            find = ring._find
+            start = time.perf_counter()
+            for point in points:
+                find(point)
+            single = (time.perf_counter() - start) / N_KEYS
+            # 批量查找跳过哈希，只比较定位的耗时
+            ring._hash = int
+            start = time.perf_counter()
+            for _ in ring.iter_hash_dev(points):
+                pass
+            batch = (time.perf_counter() - start) / N_KEYS
+            print('%10d %4d %14.0f %14.0f %12.1f' % (
+                size, bits, single * 1e9, batch * 1e9, build * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+u"""多副本查找性能测试：加盐重复哈希 vs get_nodes查表.
+
+用法：python -m test.bench.bench_replicas
+"""
+from __future__ import print_function
+
+import time
+
+from hashring.app.lookup import RingView
+
+from test.helpers import make_points
+
+RING_SIZE = 100000
+N_DEVICES = 100
+N_KEYS = 20000
+REPLICAS = [2, 3, 4, 5]
+
+
+def salted(ring, key, replicas):
+    u"""原做法：对加盐的key分别哈希查找，可能得到重复设备."""
+    return [ring.hash_dev('%s_%s' % (key, i)) for i in range(replicas)]
+
+
+def timeit(func, ring, keys, replicas):
+    start = time.perf_counter()
+    results = [func(ring, key, replicas) for key in keys]
+    elapsed = (time.perf_counter() - start) / len(keys)
+    duplicated = sum(len(set(nodes)) < replicas for nodes in results)
+    return elapsed, duplicated / float(len(keys))
+
+
+def main():
+    ring = RingView(*make_points(RING_SIZE, N_DEVICES),
+                    replicas=max(REPLICAS))
+    start = time.perf_counter()
+    ring.successors()
+    print('build successors table (%d points x %d): %.2fs' % (
+        RING_SIZE, max(REPLICAS), time.perf_counter() - start))
+    tiers = dict((dev_id, (dev_id % 3, dev_id % 9, dev_id % 27))
+                 for dev_id in range(N_DEVICES))
+    diverse = RingView(ring.sorted_keys, ring.dev_ids,
+                       replicas=max(REPLICAS), tiers=tiers)
+    start = time.perf_counter()
+    diverse.successors()
+    print('build failure-domain table (%d points x %d): %.2fs' % (
+        RING_SIZE, max(REPLICAS), time.perf_counter() - start))
+    keys = ['key_%s' % i for i in range(N_KEYS)]
+    print('%9s %12s %10s %12s %10s %12s' % (
+        'replicas', 'salted(us)', 'dup', 'table(us)', 'dup', 'tiers(us)'))
+    for replicas in REPLICAS:
+        salted_time, salted_dup = timeit(salted, ring, keys, replicas)
+        table_time, table_dup = timeit(RingView.get_nodes, ring, keys,
+                                       replicas)
+        tiers_time, _ = timeit(RingView.get_nodes, diverse, keys, replicas)
+        print('%9d %12.2f %9.2f%% %12.2f %9.2f%% %12.2f' % (
+            replicas, salted_time * 1e6, salted_dup * 100,
+            table_time * 1e6, table_dup * 100, tiers_time * 1e6))
+
+
+if __name__ == '__main__':
+    main()
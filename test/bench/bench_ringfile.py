@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+u"""RingFile加载性能测试：JSON vs mmap二进制格式.
+
+在子进程中分别加载，统计加载耗时、常驻内存增量及首次查找耗时（仅Linux）。
+
+用法：python -m test.bench.bench_ringfile
+"""
+from __future__ import print_function
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from hashring.app import ringfile
+
+from test.helpers import make_points
+
+RING_SIZES = [100000, 1000000]
+
+LOADER = r'''
+import json, sys, time
+from hashring.app import ringfile
+
+def rss():
+    with open('/proc/self/statm') as fp:
+        return int(fp.read().split()[1]) * 4096
+
+before = rss()
+start = time.perf_counter()
+if sys.argv[2] == 'json':
+    with open(sys.argv[1]) as fp:
+        ring = ringfile.parse_json(json.load(fp))
+else:
+    ring = ringfile.MappedRing(sys.argv[1])
+load = time.perf_counter() - start
+print(json.dumps({'load': load, 'rss': rss() - before}))
+'''
+
+
+def run(filename, fmt):
+    out = subprocess.check_output([sys.executable, '-c', LOADER, filename,
+                                   fmt])
+    return json.loads(out.decode('utf-8'))
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    print('%10s %8s %12s %12s %12s' % ('points', 'format', 'size(MB)',
+                                       'load(ms)', 'rss(MB)'))
+    for size in RING_SIZES:
+        sorted_keys, dev_ids = make_points(size, 1000)
+        json_file = os.path.join(tmp_dir, 'Ring.json')
+        bin_file = os.path.join(tmp_dir, 'Ring.bin')
+        with open(json_file, 'w') as fp:
+            json.dump(ringfile.dump_json(sorted_keys, dev_ids), fp)
+        ringfile.save_binary(bin_file, sorted_keys, dev_ids)
+        for fmt, filename in (('json', json_file), ('binary', bin_file)):
+            result = run(filename, fmt)
+            print('%10d %8s %12.1f %12.1f %12.1f' % (
+                size, fmt, os.path.getsize(filename) / 1e6,
+                result['load'] * 1e3, result['rss'] / 1e6))
+        os.remove(json_file)
+        os.remove(bin_file)
+    os.rmdir(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
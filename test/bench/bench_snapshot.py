@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+u"""多线程查找吞吐测试：读者无锁读取快照，写者不断发布新快照.
+
+写者的做法与RingManager一致：基于当前快照构建新数组，再一次引用替换发布。
+
+用法：python -m test.bench.bench_snapshot
+"""
+from __future__ import print_function
+
+import threading
+import time
+
+from hashring.app.lookup import RingView, merge_points, remove_points
+from hashring.common.utils import gen_point
+
+from test.helpers import make_points
+
+RING_SIZE = 100000
+THREADS = [1, 2, 4, 8, 16, 32]
+DURATION = 1.0
+
+
+class Holder(object):
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+
+def writer(holder, stop):
+    u"""循环增删一个设备，每次修改发布新快照."""
+    points = [gen_point('device_new_p%s' % i) for i in range(100)]
+    count = 0
+    while not stop.is_set():
+        snapshot = holder.snapshot
+        holder.snapshot = RingView(*merge_points(
+            snapshot.sorted_keys, snapshot.dev_ids,
+            [(point, -1) for point in points]))
+        snapshot = holder.snapshot
+        holder.snapshot = RingView(*remove_points(
+            snapshot.sorted_keys, snapshot.dev_ids, points))
+        count += 2
+    return count
+
+
+def reader(holder, stop, counts, idx):
+    keys = ['key_%s' % i for i in range(1000)]
+    count = 0
+    while not stop.is_set():
+        holder.snapshot.hash_dev_many(keys)
+        count += len(keys)
+    counts[idx] = count
+
+
+def run(holder, n_threads, with_writer):
+    stop = threading.Event()
+    counts = [0] * n_threads
+    threads = [threading.Thread(target=reader, args=(holder, stop, counts, i))
+               for i in range(n_threads)]
+    if with_writer:
+        threads.append(threading.Thread(target=writer, args=(holder, stop)))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    # 线程较多时主线程醒来后要等待GIL，以实际经过的时间计算
+    elapsed = time.perf_counter() - start
+    for thread in threads:
+        thread.join()
+    return sum(counts) / elapsed
+
+
+def main():
+    holder = Holder(RingView(*make_points(RING_SIZE, 100)))
+    print('%8s %16s %16s' % ('threads', 'read-only(k/s)', 'with writer(k/s)'))
+    for n_threads in THREADS:
+        print('%8d %16.1f %16.1f' % (
+            n_threads, run(holder, n_threads, False) / 1e3,
+            run(holder, n_threads, True) / 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+u"""单元测试和性能测试共用的ring构造函数."""
+from array import array
+
+from hashring.common.utils import gen_point
+
+
+def _arrays(pairs):
+    pairs = sorted(pairs)
+    return (array('Q', [point for point, _ in pairs]),
+            array('q', [dev_id for _, dev_id in pairs]))
+
+
+def make_ring(dev_ids, part_num=20):
+    u"""每个设备part_num个虚拟分区，返回有序的(sorted_keys, dev_ids)数组."""
+    return _arrays((gen_point('device_%s_p%s' % (dev_id, i)), dev_id)
+                   for dev_id in dev_ids for i in range(part_num))
+
+
+def make_points(size, devices):
+    u"""共size个虚拟分区，第i个属于设备i % devices，返回有序的
+    (sorted_keys, dev_ids)数组.
+    """
+    return _arrays((gen_point('device_%s_p%s' % (i % devices, i)),
+                    i % devices) for i in range(size))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from hashring.app.bounded import BoundedLoadRing, LoadCounter
+from hashring.app.lookup import RingView
+from hashring.app.ringbuilder import RingBuilder
+
+from test.helpers import make_ring
+
+
+class TestBoundedLoads(unittest.TestCase):
+    u"""有界负载测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ring = RingView(*make_ring(range(1, 5)))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_counter(self):
+        """负载计数器.
+
+        测试点：并发增减后计数正确，超过上限时不增加
+        """
+        counter = LoadCounter(stripes=4)
+
+        def worker():
+            for i in range(1000):
+                counter.try_acquire(i % 10)
+            for i in range(500):
+                counter.release(i % 10)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.total(), 4000)
+        self.assertEqual(counter.loads(), dict((i, 400) for i in range(10)))
+        self.assertFalse(counter.try_acquire(1, limit=400))
+        self.assertTrue(counter.try_acquire(1, limit=401))
+        self.assertRaises(ValueError, counter.release, 11)
+
+    def test_assign(self):
+        """分配key.
+
+        测试点：同一个热点key溢出到其他设备，负载不超过上限，
+        负载为空时与hash_dev一致
+        """
+        ring = BoundedLoadRing(self.ring, epsilon=0.25)
+        self.assertEqual(ring.assign('key_1'), self.ring.hash_dev('key_1'))
+        ring.release(self.ring.hash_dev('key_1'))
+        devices = [ring.assign('hot_key') for _ in range(400)]
+        self.assertEqual(devices[0], self.ring.hash_dev('hot_key'))
+        self.assertEqual(len(set(devices)), 4)
+        loads = ring.counter.loads()
+        self.assertLessEqual(max(loads.values()), 1.25 * 400 / 4 + 1)
+        for dev_id in devices:
+            ring.release(dev_id)
+        self.assertEqual(ring.counter.total(), 0)
+
+    def test_ring_builder(self):
+        """RingBuilder有界负载.
+
+        测试点：修改ring后使用新的快照
+        """
+        builder_file = os.path.join(self.tmp_dir, 'Builder.json')
+        ring_file = os.path.join(self.tmp_dir, 'Ring.json')
+        for filename in (builder_file, ring_file):
+            with open(filename, 'w') as fp:
+                fp.write('{}')
+        rb = RingBuilder(builder_file, ring_file)
+        rb.add_dev({'dev_id': 1, 'dev_name': 'device_1', 'dev_weight': 500})
+        ring = rb.bounded_loads(epsilon=0.5)
+        self.assertEqual(ring.assign('key'), 1)
+        rb.add_dev({'dev_id': 2, 'dev_name': 'device_2', 'dev_weight': 500})
+        self.assertEqual(set(ring.assign('key') for _ in range(10)), {1, 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
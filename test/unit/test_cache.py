@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from hashring.app.cache import LookupCache
+from hashring.app.ringbuilder import RingBuilder
+
+
+class TestLookupCache(unittest.TestCase):
+    u"""查找结果缓存测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_lru(self):
+        """LRU淘汰.
+
+        测试点：超过上限时淘汰最久未使用的条目，版本号变化后结果失效
+        """
+        cache = LookupCache(capacity=2)
+        cache.put('a', 0, 1)
+        cache.put('b', 0, 2)
+        self.assertEqual(cache.get('a', 0), 1)
+        cache.put('c', 0, 3)
+        self.assertIsNone(cache.get('b', 0))
+        self.assertEqual(cache.get('c', 0), 3)
+        self.assertIsNone(cache.get('a', 1))
+        self.assertEqual(cache.lookup('a', 1, lambda key: 4), 4)
+        self.assertEqual(cache.get('a', 1), 4)
+        self.assertEqual(cache.stats(), {'hits': 3, 'misses': 3,
+                                         'evictions': 1, 'size': 2,
+                                         'capacity': 2})
+
+    def test_ring_builder(self):
+        """RingBuilder查找缓存.
+
+        测试点：修改ring后缓存的结果失效，查找结果与不缓存时一致
+        """
+        builder_file = os.path.join(self.tmp_dir, 'Builder.json')
+        ring_file = os.path.join(self.tmp_dir, 'Ring.json')
+        for filename in (builder_file, ring_file):
+            with open(filename, 'w') as fp:
+                fp.write('{}')
+        rb = RingBuilder(builder_file, ring_file, cache_size=100)
+        rb.add_dev({'dev_id': 1, 'dev_name': 'device_1', 'dev_weight': 500})
+        keys = ['key_%s' % i for i in range(50)]
+        self.assertEqual([rb.hash_dev(key) for key in keys], [1] * 50)
+        self.assertEqual(rb.cache_stats()['misses'], 50)
+        rb.add_dev({'dev_id': 2, 'dev_name': 'device_2', 'dev_weight': 500})
+        result = [rb.hash_dev(key) for key in keys]
+        self.assertEqual(result, [rb.ring_manager.hash_dev(key)
+                                  for key in keys])
+        self.assertIn(2, result)
+        [rb.hash_dev(key) for key in keys]
+        stats = rb.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (50, 100))
+        self.assertIsNone(RingBuilder(builder_file, ring_file).cache_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
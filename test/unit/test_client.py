@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent import futures
+from unittest import mock
+
+from hashring.app import ringfile
+from hashring.app.client import AsyncLookupClient, LookupClient
+from hashring.app.daemon import LookupDaemon
+from hashring.app.lookup import RingView
+from hashring.common import exceptions as exc
+from hashring.common import protocol
+
+from test.helpers import make_ring
+
+
+class TestLookupClient(unittest.TestCase):
+    u"""查找服务客户端测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        ring_file = os.path.join(self.tmp_dir, 'Ring.bin')
+        self.socket_path = os.path.join(self.tmp_dir, 'ring.sock')
+        ringfile.save_binary(ring_file, *make_ring([1, 2, 3]))
+        self.keys = ['key_%s' % i for i in range(200)]
+        self.expected = RingView(*make_ring([1, 2, 3])).hash_dev_many(
+            self.keys)
+        # 查找服务在另一个线程的事件循环中运行
+        self.daemon = LookupDaemon(ring_file, self.socket_path,
+                                   use_inotify=False)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.daemon.start(),
+                                         self.loop).result()
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.daemon.stop(),
+                                         self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_threaded(self):
+        """多线程客户端.
+
+        测试点：并发的hash_dev结果正确且被合并为较少的请求，
+        关闭后不能再使用
+        """
+        results = {}
+        client = LookupClient(self.socket_path, pool_size=2, window=0.01)
+
+        def worker(offset):
+            for i in range(offset, len(self.keys), 8):
+                results[i] = client.hash_dev(self.keys[i])
+
+        threads = [threading.Thread(target=worker, args=(i,))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([results[i] for i in range(len(self.keys))],
+                         self.expected)
+        self.assertEqual(client.hash_dev_many(self.keys), self.expected)
+        stats = client.stats()
+        self.assertEqual(stats['keys'], 2 * len(self.keys))
+        self.assertLess(stats['requests'], len(self.keys))
+        future = client.hash_dev_async(self.keys[0])
+        client.close()
+        self.assertEqual(future.result(), self.expected[0])
+        self.assertRaises(ConnectionError, client.hash_dev, self.keys[0])
+        with LookupClient(os.path.join(self.tmp_dir, 'none.sock')) as client:
+            self.assertRaises(OSError, client.hash_dev, self.keys[0])
+
+    def test_invalid_key(self):
+        """无效的key.
+
+        测试点：过长或无法编码的key立即报错，混入批量请求时只影响所在的
+        一批，客户端仍可继续使用
+        """
+        long_key = 'k' * 70000
+        with LookupClient(self.socket_path) as client:
+            for key in (long_key, u'\ud800'):
+                self.assertRaises(exc.ErrorInvalidParam, client.hash_dev, key)
+                self.assertRaises(exc.ErrorInvalidParam,
+                                  client.hash_dev_many, ['a', key])
+            # 绕过检查直接放入队列，发送线程不应退出
+            future = futures.Future()
+            with client._cond:
+                client._queue.append((long_key, future))
+                client._cond.notify()
+            self.assertIsInstance(future.exception(5),
+                                  exc.ErrorInvalidParam)
+            self.assertEqual(client.hash_dev(self.keys[0]), self.expected[0])
+
+        async def run():
+            async with AsyncLookupClient(self.socket_path) as client:
+                with self.assertRaises(exc.ErrorInvalidParam):
+                    await client.hash_dev(long_key)
+                future = asyncio.get_running_loop().create_future()
+                client._queue.append((long_key, future))
+                client._flush()
+                with self.assertRaises(exc.ErrorInvalidParam):
+                    await future
+                return await client.hash_dev(self.keys[0])
+
+        self.assertEqual(asyncio.run(run()), self.expected[0])
+
+    def test_chunks(self):
+        """拆分批量请求.
+
+        测试点：超过MAX_KEYS的key拆分为多个请求，结果按输入顺序排列
+        """
+        async def run():
+            async with AsyncLookupClient(self.socket_path) as client:
+                return (await client.hash_dev_many(self.keys),
+                        await client.hash_dev_many([]))
+
+        with mock.patch.object(protocol, 'MAX_KEYS', 64):
+            with LookupClient(self.socket_path) as client:
+                self.assertEqual(client.hash_dev_many(self.keys),
+                                 self.expected)
+                self.assertEqual(client.hash_dev_many([]), [])
+                self.assertEqual(client.stats()['requests'], 6)
+            self.assertEqual(asyncio.run(run()), (self.expected, []))
+
+    def test_frame_size(self):
+        """按编码后的大小拆分.
+
+        测试点：批量请求和合并的调用都不超过MAX_FRAME，服务不断开连接
+        """
+        keys = ['x' * 300 + str(i) for i in range(40)]
+        expected = RingView(*make_ring([1, 2, 3])).hash_dev_many(keys)
+
+        async def run():
+            async with AsyncLookupClient(self.socket_path) as client:
+                return (await client.hash_dev_many(keys),
+                        await asyncio.gather(*[client.hash_dev(key)
+                                               for key in keys]))
+
+        with mock.patch.object(protocol, 'MAX_FRAME', 2048):
+            self.assertRaises(exc.ErrorInvalidParam,
+                              protocol.encode_hash_many, 1, keys)
+            chunks = protocol.split_keys(keys)
+            self.assertEqual(sum(chunks, []), keys)
+            self.assertGreater(len(chunks), 1)
+            with LookupClient(self.socket_path) as client:
+                self.assertEqual(client.hash_dev_many(keys), expected)
+                waiters = [client.hash_dev_async(key) for key in keys]
+                self.assertEqual([f.result(5) for f in waiters], expected)
+                self.assertEqual(client.stats()['errors'], 0)
+            self.assertEqual(asyncio.run(run()), (expected, expected))
+
+    def test_asyncio(self):
+        """asyncio客户端.
+
+        测试点：并发的hash_dev结果正确且被合并为一个请求
+        """
+        async def run():
+            async with AsyncLookupClient(self.socket_path,
+                                         window=0.01) as client:
+                result = await asyncio.gather(*[client.hash_dev(key)
+                                                for key in self.keys])
+                many = await client.hash_dev_many(self.keys)
+                stats = await client.stats()
+            return result, many, stats
+
+        result, many, stats = asyncio.run(run())
+        self.assertEqual(result, self.expected)
+        self.assertEqual(many, self.expected)
+        self.assertEqual(stats['requests'], 3)
+
+        async def concurrent():
+            async with AsyncLookupClient(self.socket_path,
+                                         pool_size=1) as client:
+                await asyncio.gather(*[client.hash_dev_many(self.keys)
+                                       for _ in range(5)])
+                return await client.stats()
+
+        connections = stats['connections']
+        stats = asyncio.run(concurrent())
+        self.assertEqual(stats['connections'], connections + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from hashring.app import ringfile
+from hashring.app.daemon import LookupDaemon
+from hashring.app.lookup import RingView
+from hashring.common import exceptions as exc
+from hashring.common import protocol
+
+from test.helpers import make_ring
+
+
+async def request(reader, writer, frame):
+    writer.write(frame)
+    size, status, req_id = protocol.parse_header(
+        await reader.readexactly(protocol.HEADER.size))
+    return status, req_id, await reader.readexactly(size)
+
+
+class TestLookupDaemon(unittest.TestCase):
+    u"""查找服务测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ring_file = os.path.join(self.tmp_dir, 'Ring.bin')
+        self.socket_path = os.path.join(self.tmp_dir, 'ring.sock')
+        self.keys = ['key_%s' % i for i in range(100)] + [u'键']
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_protocol(self):
+        """帧协议.
+
+        测试点：编码后可解析，没有设备时为None，不完整的帧体报错
+        """
+        frame = protocol.encode_hash_many(7, self.keys)
+        size, code, req_id = protocol.parse_header(
+            frame[:protocol.HEADER.size])
+        body = frame[protocol.HEADER.size:]
+        self.assertEqual((size, code, req_id),
+                         (len(body), protocol.OP_HASH_MANY, 7))
+        self.assertEqual(protocol.decode_keys(body), self.keys)
+        self.assertRaises(exc.ErrorProtocol, protocol.decode_keys, body[:-1])
+        keys = ['key'] * (protocol.MAX_KEYS + 1)
+        self.assertRaises(exc.ErrorInvalidParam, protocol.encode_hash_many,
+                          7, keys)
+        self.assertRaises(exc.ErrorProtocol, protocol.decode_keys,
+                          struct.pack('<I', protocol.MAX_KEYS + 1))
+        frame = protocol.encode_devs(7, [1, None, 3])
+        self.assertEqual(protocol.decode_devs(frame[protocol.HEADER.size:]),
+                         [1, None, 3])
+        frame = protocol.encode_dev(7, None)
+        self.assertIsNone(protocol.decode_dev(frame[protocol.HEADER.size:]))
+        self.assertRaises(exc.ErrorProtocol, protocol.parse_header,
+                          protocol.HEADER.pack(protocol.MAX_FRAME + 1, 1, 1))
+
+    def test_lookup(self):
+        """查找服务.
+
+        测试点：单个和批量查找与ring一致，错误的请求返回错误，
+        RingFile变化后使用新的ring
+        """
+        ringfile.save_binary(self.ring_file, *make_ring([1, 2, 3]))
+        expected = RingView(*make_ring([1, 2, 3])).hash_dev_many(self.keys)
+        daemon = LookupDaemon(self.ring_file, self.socket_path,
+                              use_inotify=False)
+
+        async def run():
+            await daemon.start()
+            reader, writer = await asyncio.open_unix_connection(
+                self.socket_path)
+            try:
+                status, req_id, body = await request(
+                    reader, writer, protocol.encode_hash(1, self.keys[0]))
+                self.assertEqual((status, req_id), (protocol.STATUS_OK, 1))
+                self.assertEqual(protocol.decode_dev(body), expected[0])
+                _, req_id, body = await request(
+                    reader, writer, protocol.encode_hash_many(2, self.keys))
+                self.assertEqual(req_id, 2)
+                self.assertEqual(protocol.decode_devs(body), expected)
+                status, _, _ = await request(
+                    reader, writer, protocol.HEADER.pack(0, 99, 3))
+                self.assertEqual(status, protocol.STATUS_ERROR)
+                # key数量超过上限的请求返回错误，连接仍可继续使用
+                body = struct.pack('<I', protocol.MAX_KEYS + 1)
+                status, req_id, _ = await request(
+                    reader, writer, protocol.HEADER.pack(
+                        len(body), protocol.OP_HASH_MANY, 6) + body)
+                self.assertEqual((status, req_id), (protocol.STATUS_ERROR, 6))
+
+                ringfile.save_binary(self.ring_file, *make_ring([4]))
+                self.assertTrue(daemon.ring.check())
+                _, _, body = await request(
+                    reader, writer, protocol.encode_hash_many(4, self.keys))
+                self.assertEqual(set(protocol.decode_devs(body)), {4})
+                _, _, body = await request(reader, writer,
+                                           protocol.encode_stats(5))
+                stats = protocol.decode_json(body)
+                self.assertEqual((stats['requests'], stats['errors'],
+                                  stats['reload_count']), (6, 2, 1))
+            finally:
+                writer.close()
+                await daemon.stop()
+
+        asyncio.run(run())
+        self.assertFalse(os.path.exists(self.socket_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
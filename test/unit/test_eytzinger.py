@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from hashring.app import eytzinger
+from hashring.app.lookup import EYTZINGER_LAYOUT, RingView, find_index
+from hashring.app.ringbuilder import RingManager
+from hashring.common import exceptions as exc
+from hashring.common.utils import gen_point
+
+
+class TestEytzinger(unittest.TestCase):
+    u"""Eytzinger布局测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_find_index(self):
+        """查找.
+
+        测试点：各种大小的环上结果与有序数组二分一致，包括命中节点和回绕
+        """
+        for size in (1, 2, 3, 7, 8, 100, 1023, 1024, 1025):
+            sorted_keys = array('Q', sorted(
+                gen_point('device_%s' % i) for i in range(size)))
+            layout, rank = eytzinger.build_layout(sorted_keys)
+            self.assertEqual(sorted(layout[1:]), list(sorted_keys))
+            points = [gen_point('key_%s' % i) for i in range(300)]
+            points += list(sorted_keys) + [0, 2 ** 64 - 1]
+            for point in points:
+                self.assertEqual(eytzinger.find_index(layout, rank, point),
+                                 find_index(sorted_keys, point))
+            if eytzinger.np is not None:
+                self.assertEqual(
+                    eytzinger.search_array(layout, rank, points).tolist(),
+                    [find_index(sorted_keys, point) for point in points])
+        layout, rank = eytzinger.build_layout(array('Q'))
+        self.assertEqual(eytzinger.find_index(layout, rank, 1), -1)
+
+    def test_pure_build(self):
+        """不使用NumPy构建.
+
+        测试点：与向量化构建的结果一致
+        """
+        if eytzinger.np is None:
+            self.skipTest('NumPy未安装')
+        sorted_keys = array('Q', sorted(gen_point('device_%s' % i)
+                                        for i in range(1000)))
+        expected = eytzinger.build_layout(sorted_keys)
+        np, eytzinger.np = eytzinger.np, None
+        try:
+            self.assertEqual(eytzinger.build_layout(sorted_keys), expected)
+        finally:
+            eytzinger.np = np
+
+    def test_ring_view(self):
+        """RingView和RingManager使用Eytzinger布局.
+
+        测试点：批量查找和放置的结果与有序布局一致，没有NumPy时不构建，
+        不能与前缀索引同时使用
+        """
+        filename = os.path.join(self.tmp_dir, 'Ring.json')
+        with open(filename, 'w') as fp:
+            fp.write('{}')
+        manager = RingManager(filename, layout=EYTZINGER_LAYOUT)
+        for dev_id in range(1, 6):
+            manager.add({'dev_id': dev_id, 'part_num': 30})
+        keys = ['key_%s' % i for i in range(500)]
+        plain = RingManager(filename)
+        self.assertEqual(manager.hash_dev_many(keys),
+                         plain.hash_dev_many(keys))
+        self.assertEqual([manager.get_nodes(key) for key in keys],
+                         [plain.get_nodes(key) for key in keys])
+        snapshot = manager.snapshot
+        if eytzinger.np is not None:
+            self.assertIsNotNone(snapshot.eytzinger)
+            self.assertEqual(manager.place_keys(keys).tolist(),
+                             plain.place_keys(keys).tolist())
+        np, eytzinger.np = eytzinger.np, None
+        try:
+            ring = RingView(snapshot.sorted_keys, snapshot.dev_ids,
+                            layout=EYTZINGER_LAYOUT)
+        finally:
+            eytzinger.np = np
+        self.assertIsNone(ring.eytzinger)
+        self.assertEqual(ring.hash_dev_many(keys), plain.hash_dev_many(keys))
+        self.assertRaises(exc.ErrorInvalidParam, RingView,
+                          snapshot.sorted_keys, snapshot.dev_ids,
+                          prefix_bits=8, layout=EYTZINGER_LAYOUT)
+        self.assertRaises(exc.ErrorInvalidParam, RingView,
+                          snapshot.sorted_keys, snapshot.dev_ids,
+                          layout='btree')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from hashring.app import hrw
+from hashring.app.hrw import HRWRing
+from hashring.app.ringbuilder import RingBuilder
+
+
+class TestHRWRing(unittest.TestCase):
+    u"""加权最高随机权重哈希模式测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.keys = ['key_%s' % i for i in range(4000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_weights(self):
+        """按权重分配.
+
+        测试点：负载与权重成比例，调整一个设备的权重只有与它相关的key移动
+        """
+        ring = HRWRing({1: 100, 2: 100, 3: 200})
+        old = ring.hash_dev_many(self.keys)
+        self.assertAlmostEqual(old.count(3) / float(len(old)), 0.5,
+                               delta=0.04)
+        new = HRWRing({1: 100, 2: 100, 3: 400}).hash_dev_many(self.keys)
+        self.assertTrue(all(a == b or b == 3 for a, b in zip(old, new)))
+        removed = HRWRing({1: 100, 3: 200}).hash_dev_many(self.keys)
+        self.assertTrue(all(a == b or a == 2 for a, b in zip(old, removed)))
+        self.assertIsNone(HRWRing({}).hash_dev('key'))
+
+    def test_vectorized(self):
+        """向量化打分.
+
+        测试点：与逐个打分的结果一致，get_nodes第一个与hash_dev一致
+        """
+        weights = dict((i, 100 * (i % 5 + 1)) for i in range(40))
+        ring = HRWRing(weights)
+        expected = ring.hash_dev_many(self.keys[:500])
+        self.assertEqual([ring.hash_dev(key) for key in self.keys[:500]],
+                         expected)
+        nodes = [ring.get_nodes(key, 3) for key in self.keys[:500]]
+        min_devices = hrw.VECTOR_MIN_DEVICES
+        np = hrw.np
+        try:
+            hrw.np = None
+            hrw.VECTOR_MIN_DEVICES = len(weights) + 1
+            ring = HRWRing(weights)
+            self.assertEqual(ring.hash_dev_many(self.keys[:500]), expected)
+            self.assertEqual([ring.get_nodes(key, 3)
+                              for key in self.keys[:500]], nodes)
+        finally:
+            hrw.np = np
+            hrw.VECTOR_MIN_DEVICES = min_devices
+        for dev_ids, dev_id in zip(nodes, expected):
+            self.assertEqual(dev_ids[0], dev_id)
+            self.assertEqual(len(set(dev_ids)), 3)
+
+    def test_ring_builder(self):
+        """RingBuilder HRW模式.
+
+        测试点：直接使用dev_weight，更新权重后保存到RingFile
+        """
+        builder_file = os.path.join(self.tmp_dir, 'Builder.json')
+        ring_file = os.path.join(self.tmp_dir, 'Ring.json')
+        for filename in (builder_file, ring_file):
+            with open(filename, 'w') as fp:
+                fp.write('{}')
+        rb = RingBuilder(builder_file, ring_file, mode='hrw')
+        with rb.batch():
+            for i in range(1, 4):
+                rb.add_dev({'dev_id': i, 'dev_name': 'device_%s' % i,
+                            'dev_weight': 100})
+        rb.update_dev(2, 300)
+        with open(ring_file) as fp:
+            data = json.load(fp)
+        self.assertEqual(data['mode'], 'hrw')
+        self.assertEqual(data['weights'], {'1': 100, '2': 300, '3': 100})
+        loaded = RingBuilder(builder_file, ring_file)
+        self.assertEqual(loaded.hash_dev_many(self.keys[:300]),
+                         HRWRing({1: 100, 2: 300, 3: 100}).hash_dev_many(
+                             self.keys[:300]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from hashring.app import ringfile
+from hashring.app.jump import JumpRing, assign_buckets, jump_hash
+from hashring.app.ringbuilder import RingBuilder
+from hashring.common import exceptions as exc
+from hashring.common.utils import gen_point
+
+
+class TestJumpRing(unittest.TestCase):
+    u"""跳跃一致性哈希模式测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.points = [gen_point('key_%s' % i) for i in range(3000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_jump_hash(self):
+        """跳跃算法.
+
+        测试点：增加一个桶时只有移到新桶的key改变，各桶负载均衡
+        """
+        self.assertEqual(jump_hash(self.points[0], 0), -1)
+        for buckets in (1, 7, 10):
+            old = [jump_hash(point, buckets) for point in self.points]
+            new = [jump_hash(point, buckets + 1) for point in self.points]
+            for a, b in zip(old, new):
+                self.assertTrue(a == b or b == buckets)
+        counts = [0] * 10
+        for point in self.points:
+            counts[jump_hash(point, 10)] += 1
+        self.assertLess(max(counts), 360)
+
+    def test_assign_buckets(self):
+        """构建桶表.
+
+        测试点：保持已有设备的桶号，删除的桶由新设备或末尾设备补上
+        """
+        self.assertEqual(assign_buckets([3, 1, 2]), [1, 2, 3])
+        self.assertEqual(assign_buckets([1, 2, 3, 4], [1, 2, 3]),
+                         [1, 2, 3, 4])
+        self.assertEqual(assign_buckets([1, 3, 4, 5], [1, 2, 3]),
+                         [1, 4, 3, 5])
+        self.assertEqual(assign_buckets([1, 2, 4], [1, 2, 3, 4]), [1, 2, 4])
+        self.assertEqual(assign_buckets([2, 3, 4], [1, 2, 3, 4]), [4, 2, 3])
+
+    def test_lookup(self):
+        """查找.
+
+        测试点：get_nodes第一个与hash_dev一致且设备不重复
+        """
+        ring = JumpRing.build({1: 10, 2: 10, 3: 10, 4: 10})
+        keys = ['key_%s' % i for i in range(300)]
+        result = ring.hash_dev_many(keys)
+        self.assertEqual(result, [ring.hash_dev(key) for key in keys])
+        for key, dev_id in zip(keys, result):
+            nodes = ring.get_nodes(key, 3)
+            self.assertEqual(nodes[0], dev_id)
+            self.assertEqual(len(set(nodes)), 3)
+        self.assertEqual(sorted(ring.get_nodes('key', 10)), [1, 2, 3, 4])
+        self.assertIsNone(JumpRing.build({}).hash_dev('key'))
+
+    def test_ring_builder(self):
+        """RingBuilder跳跃哈希模式.
+
+        测试点：在末尾增加设备时只有移到新设备的key改变，没有二进制格式
+        """
+        builder_file = os.path.join(self.tmp_dir, 'Builder.json')
+        ring_file = os.path.join(self.tmp_dir, 'Ring.json')
+        for filename in (builder_file, ring_file):
+            with open(filename, 'w') as fp:
+                fp.write('{}')
+        rb = RingBuilder(builder_file, ring_file, mode='jump')
+        with rb.batch():
+            for i in range(1, 5):
+                rb.add_dev({'dev_id': i, 'dev_name': 'device_%s' % i,
+                            'dev_weight': 100})
+        keys = ['key_%s' % i for i in range(1000)]
+        old = rb.hash_dev_many(keys)
+        rb.add_dev({'dev_id': 5, 'dev_name': 'device_5', 'dev_weight': 100})
+        new = rb.hash_dev_many(keys)
+        self.assertTrue(all(a == b or b == 5 for a, b in zip(old, new)))
+
+        loaded = ringfile.open_ring(ring_file)
+        self.assertEqual(loaded.buckets, (1, 2, 3, 4, 5))
+        self.assertEqual(loaded.hash_dev_many(keys), new)
+        self.assertRaises(exc.ErrorInvalidParam, ringfile.convert, ring_file,
+                          os.path.join(self.tmp_dir, 'Ring.bin'))
+
+
+if __name__ == '__main__':
+    unittest.main()
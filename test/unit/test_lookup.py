@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+from array import array
+
+from hashring.app.lookup import (RingView, build_prefix_index, find_index,
+                                 find_index_prefix, merge_points,
+                                 remove_points)
+from hashring.common import exceptions as exc
+from hashring.common.utils import gen_key, gen_point
+
+from test.helpers import make_points
+
+
+class TestLookup(unittest.TestCase):
+    u"""查找测试类."""
+
+    def setUp(self):
+        self.sorted_keys = sorted(gen_key('device_%s' % i) for i in range(50))
+
+    def test_find_index(self):
+        """二分查找.
+
+        测试点：结果与线性扫描一致
+        """
+        for i in range(500):
+            key = gen_key('key_%s' % i)
+            expected = 0
+            for idx, node in enumerate(self.sorted_keys):
+                if key <= node:
+                    expected = idx
+                    break
+            self.assertEqual(find_index(self.sorted_keys, key), expected)
+
+    def test_find_index_bound(self):
+        """边界情况.
+
+        测试点：命中节点、回绕到第一个节点、空环
+        """
+        for idx, node in enumerate(self.sorted_keys):
+            self.assertEqual(find_index(self.sorted_keys, node), idx)
+        self.assertEqual(find_index(self.sorted_keys, 'g'), 0)
+        self.assertEqual(find_index([], gen_key('key')), -1)
+
+    def test_prefix_index(self):
+        """前缀索引.
+
+        测试点：结果与二分查找一致，包括命中节点、回绕和稀疏的前缀
+        """
+        sorted_keys = array('Q', sorted(gen_point('device_%s' % i)
+                                        for i in range(300)))
+        points = [gen_point('key_%s' % i) for i in range(2000)]
+        points += list(sorted_keys) + [0, 2 ** 64 - 1]
+        for bits in (1, 4, 12):
+            index = build_prefix_index(sorted_keys, bits)
+            self.assertEqual(len(index), 2 ** bits + 1)
+            self.assertEqual(index[-1], len(sorted_keys))
+            for point in points:
+                self.assertEqual(
+                    find_index_prefix(sorted_keys, index, 64 - bits, point),
+                    find_index(sorted_keys, point))
+        dev_ids = array('q', range(300))
+        plain = RingView(sorted_keys, dev_ids)
+        ring = RingView(sorted_keys, dev_ids, prefix_bits=8)
+        keys = ['key_%s' % i for i in range(500)]
+        self.assertEqual(ring.hash_dev_many(keys), plain.hash_dev_many(keys))
+        self.assertEqual([ring.get_nodes(key) for key in keys],
+                         [plain.get_nodes(key) for key in keys])
+        self.assertIsNone(RingView(array('Q'), array('q'),
+                                   prefix_bits=8).hash_dev('key'))
+        self.assertRaises(exc.ErrorInvalidParam, RingView, sorted_keys,
+                          dev_ids, prefix_bits=64)
+
+    def test_merge_remove_points(self):
+        """有序增删虚拟分区.
+
+        测试点：结果与全量排序一致，删除不存在的分区抛KeyError
+        """
+        pairs = [(gen_point('p_%s' % i), i % 7) for i in range(1000)]
+        random.shuffle(pairs)
+        keys, devs = array('Q'), array('q')
+        for start in range(0, 1000, 250):
+            keys, devs = merge_points(keys, devs, pairs[start:start + 250])
+        expected = sorted(pairs)
+        self.assertEqual(list(zip(keys, devs)), expected)
+
+        removed = [point for point, _ in pairs[:300]]
+        keys, devs = remove_points(keys, devs, removed)
+        self.assertEqual(list(zip(keys, devs)), sorted(pairs[300:]))
+        self.assertRaises(KeyError, remove_points, keys, devs, removed[:1])
+
+    def test_get_nodes(self):
+        """多副本查找.
+
+        测试点：查表结果与逐个遍历一致，首个设备与hash_dev一致，
+        不同设备不足时返回全部设备
+        """
+        ring = RingView(*make_points(120, 6))
+        for i in range(300):
+            key = 'key_%s' % i
+            point = gen_point(key)
+            idx = find_index(ring.sorted_keys, point)
+            expected = []
+            for step in range(len(ring.dev_ids)):
+                dev_id = ring.dev_ids[(idx + step) % len(ring.dev_ids)]
+                if dev_id not in expected:
+                    expected.append(dev_id)
+            for replicas in range(1, 8):
+                nodes = ring.get_nodes(key, replicas)
+                self.assertEqual(nodes, expected[:replicas])
+            self.assertEqual(ring.get_nodes(key, 1), [ring.hash_dev(key)])
+
+        small = RingView(array('Q', [1, 2, 3]), array('q', [7, 8, 7]))
+        self.assertEqual(small.get_nodes('key', 3), small.get_nodes('key', 5))
+        self.assertEqual(sorted(small.get_nodes('key', 3)), [7, 8])
+        self.assertEqual(RingView(array('Q'), array('q')).get_nodes('key'),
+                         [])
+
+    def test_get_nodes_tiers(self):
+        """按故障域挑选副本.
+
+        测试点：副本优先分布在不同region/zone，首个设备与hash_dev一致
+        """
+        tiers = dict((dev_id, ('r%s' % (dev_id % 2), 'z%s' % (dev_id % 4),
+                               'h%s' % (dev_id % 8))) for dev_id in range(16))
+        ring = RingView(*make_points(320, 16), tiers=tiers)
+        for i in range(300):
+            key = 'key_%s' % i
+            nodes = ring.get_nodes(key, 3)
+            self.assertEqual(nodes[0], ring.hash_dev(key))
+            self.assertEqual(len(set(tiers[n][0] for n in nodes[:2])), 2)
+            self.assertEqual(len(set(tiers[n][:2] for n in nodes)), 3)
+            # 超出后继设备表宽度时逐个遍历挑选
+            nodes = ring.get_nodes(key, 8)
+            self.assertEqual(nodes[:3], ring.get_nodes(key, 3))
+            self.assertEqual(len(set(tiers[n] for n in nodes)), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
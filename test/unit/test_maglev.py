@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from hashring.app import ringfile
+from hashring.app.maglev import MaglevRing, is_prime
+from hashring.app.ringbuilder import RingBuilder
+from hashring.common import exceptions as exc
+
+
+class TestMaglevRing(unittest.TestCase):
+    u"""Maglev查找表模式测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_build(self):
+        """构建查找表.
+
+        测试点：表被填满，槽位数与权重成比例，删除设备时其余槽位大多不变
+        """
+        weights = dict((i, 100 * (i % 2 + 1)) for i in range(20))
+        ring = MaglevRing.build(weights, table_size=1009)
+        table = ring.table
+        self.assertEqual(len(table), 1009)
+        self.assertNotIn(-1, table)
+        for dev_id, weight in weights.items():
+            self.assertAlmostEqual(table.count(dev_id), 1009 * weight / 3000.,
+                                   delta=2)
+        del weights[7]
+        new = MaglevRing.build(weights, old=ring).table
+        self.assertEqual(len(new), 1009)
+        changed = sum(1 for a, b in zip(table, new) if a != b and a != 7)
+        self.assertLess(changed, table.count(7))
+        self.assertRaises(exc.ErrorInvalidParam, MaglevRing.build, weights,
+                          table_size=1000)
+        self.assertTrue(is_prime(65537))
+        self.assertIsNone(MaglevRing.build({}, table_size=7).hash_dev('k'))
+
+    def test_lookup(self):
+        """查找.
+
+        测试点：hash_dev与查找表一致，get_nodes返回不同设备
+        """
+        ring = MaglevRing.build({1: 100, 2: 100, 3: 100}, table_size=251)
+        keys = ['key_%s' % i for i in range(300)]
+        result = ring.hash_dev_many(keys)
+        self.assertEqual(result, [ring.hash_dev(key) for key in keys])
+        for key, dev_id in zip(keys, result):
+            nodes = ring.get_nodes(key, 3)
+            self.assertEqual(nodes[0], dev_id)
+            self.assertEqual(sorted(nodes), [1, 2, 3])
+
+    def test_ring_builder(self):
+        """RingBuilder Maglev模式.
+
+        测试点：查找表保存在RingFile中，加载后查找结果一致
+        """
+        builder_file = os.path.join(self.tmp_dir, 'Builder.json')
+        ring_file = os.path.join(self.tmp_dir, 'Ring.json')
+        for filename in (builder_file, ring_file):
+            with open(filename, 'w') as fp:
+                fp.write('{}')
+        rb = RingBuilder(builder_file, ring_file, mode='maglev',
+                         table_size=1009)
+        with rb.batch():
+            for i in range(1, 5):
+                rb.add_dev({'dev_id': i, 'dev_name': 'device_%s' % i,
+                            'dev_weight': 100 * i})
+        keys = ['key_%s' % i for i in range(300)]
+        loaded = ringfile.open_ring(ring_file)
+        self.assertIsInstance(loaded, MaglevRing)
+        self.assertEqual(len(loaded), 1009)
+        self.assertEqual(loaded.hash_dev_many(keys), rb.hash_dev_many(keys))
+
+
+if __name__ == '__main__':
+    unittest.main()
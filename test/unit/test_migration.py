@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from array import array
+from unittest import mock
+
+from hashring.app import migration
+from hashring.app import ringfile
+from hashring.app.lookup import RingView, find_index
+from hashring.app.partition import PartitionRing
+from hashring.app.ringbuilder import RingBuilder
+from hashring.cli import ringbuilder as cli
+
+
+def _owner(plan, point):
+    for src, dst, start, end in plan:
+        if start <= point < end:
+            return src, dst
+    return None
+
+
+class TestMigration(unittest.TestCase):
+    u"""迁移计划测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _ring(self, pairs):
+        pairs = sorted(pairs)
+        return RingView(array('Q', [p for p, _ in pairs]),
+                        array('q', [d for _, d in pairs]))
+
+    def test_diff_points(self):
+        """虚拟分区环的迁移计划.
+
+        测试点：与逐点查找的结果一致，包括回绕区间和边界点
+        """
+        rnd = random.Random(1)
+        size = migration.RING_SIZE
+        old = self._ring((rnd.randrange(size), rnd.randrange(4))
+                         for _ in range(200))
+        new = self._ring([(p, d) for p, d in zip(old.sorted_keys,
+                                                 old.dev_ids) if d != 3] +
+                         [(rnd.randrange(size), 4) for _ in range(50)])
+        plan = migration.diff_rings(old, new)
+        samples = [rnd.randrange(size) for _ in range(2000)]
+        samples += [0, size - 1] + [p + i for p in old.sorted_keys[:20]
+                                    for i in (0, 1)]
+        for point in samples:
+            old_dev = old.dev_ids[find_index(old.sorted_keys, point)]
+            new_dev = new.dev_ids[find_index(new.sorted_keys, point)]
+            moved = _owner(plan, point)
+            if old_dev == new_dev:
+                self.assertIsNone(moved)
+            else:
+                self.assertEqual(moved, (old_dev, new_dev))
+        self.assertEqual(migration.diff_rings(old, old), [])
+        empty = self._ring([])
+        self.assertEqual(migration.diff_rings(empty, old)[0][:3],
+                         (None, old.dev_ids[0], 0))
+
+    def test_diff_points_fallback(self):
+        """逐个归并与向量化结果一致.
+
+        测试点：包括首尾两个点上的分区
+        """
+        rnd = random.Random(2)
+        size = migration.RING_SIZE
+        pairs = [(rnd.randrange(size), rnd.randrange(5)) for _ in range(500)]
+        old = self._ring(pairs + [(0, 1), (size - 1, 2)])
+        new = self._ring(pairs[100:] + [(rnd.randrange(size), 7)
+                                        for _ in range(100)])
+        for a, b in ((old, new), (new, old)):
+            self.assertEqual(
+                migration.diff_points(a.sorted_keys, a.dev_ids,
+                                      b.sorted_keys, b.dev_ids),
+                migration.diff_owners(
+                    migration.point_owners(a.sorted_keys, a.dev_ids),
+                    migration.point_owners(b.sorted_keys, b.dev_ids)))
+
+    def test_diff_partitions(self):
+        """分区环的迁移计划.
+
+        测试点：只包含换了设备的分区，汇总比例正确
+        """
+        old = PartitionRing.build({1: 1, 2: 1}, part_power=6)
+        new = PartitionRing.build({1: 1, 2: 1, 3: 2}, old=old)
+        plan = migration.diff_rings(old, new)
+        self.assertTrue(all(dst == 3 for _, dst, _, _ in plan))
+        summary = migration.summarize(plan)
+        self.assertAlmostEqual(sum(summary.values()), 0.5)
+
+    def test_ring_builder(self):
+        """RingBuilder的迁移计划.
+
+        测试点：增加权重后只有区间迁移到该设备
+        """
+        builder_file = os.path.join(self.tmp_dir, 'Builder.json')
+        ring_file = os.path.join(self.tmp_dir, 'Ring.json')
+        for filename in (builder_file, ring_file):
+            with open(filename, 'w') as fp:
+                fp.write('{}')
+        rb = RingBuilder(builder_file, ring_file)
+        with rb.batch():
+            for i in range(1, 5):
+                rb.add_dev({'dev_id': i, 'dev_name': 'device_%s' % i,
+                            'dev_weight': 500})
+        self.assertEqual(set(dst for _, dst, _, _ in rb.migration_plan()),
+                         set(range(1, 5)))
+        rb.update_dev(2, 1000)
+        plan = rb.migration_plan()
+        self.assertTrue(plan)
+        self.assertTrue(all(dst == 2 and src != 2
+                            for src, dst, _, _ in plan))
+
+    def test_cli_diff(self):
+        """diff命令.
+
+        测试点：输出JSON，迁移比例与迁移计划一致，支持二进制格式
+        """
+        rnd = random.Random(3)
+        pairs = [(rnd.randrange(migration.RING_SIZE), rnd.randrange(3))
+                 for _ in range(300)]
+        old, new = self._ring(pairs), self._ring(pairs[50:])
+        old_file = os.path.join(self.tmp_dir, 'Old.bin')
+        new_file = os.path.join(self.tmp_dir, 'New.json')
+        ringfile.save_binary(old_file, old.sorted_keys, old.dev_ids)
+        with open(new_file, 'w') as fp:
+            json.dump(ringfile.dump_json(new.sorted_keys, new.dev_ids), fp)
+        output = io.StringIO()
+        with mock.patch.object(cli, 'sys_argv',
+                               ['ringbuilder', 'diff', old_file, new_file,
+                                'ranges']), \
+                mock.patch('sys.stdout', output):
+            cli.Commands.diff()
+        result = json.loads(output.getvalue())
+        plan = migration.diff_rings(old, new)
+        self.assertEqual(result['plan'], [list(move) for move in plan])
+        self.assertAlmostEqual(
+            result['moved'], sum(migration.summarize(plan).values()))
+        self.assertAlmostEqual(
+            sum(pair['fraction'] for pair in result['pairs']),
+            result['moved'])
+
+
+if __name__ == '__main__':
+    unittest.main()
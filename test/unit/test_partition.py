@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from hashring.app import ringfile
+from hashring.app.partition import PartitionRing, assign_parts
+from hashring.app.ringbuilder import RingBuilder
+from hashring.common import exceptions as exc
+
+
+class TestPartitionRing(unittest.TestCase):
+    u"""分区模式测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_assign_parts(self):
+        """分配分区.
+
+        测试点：按权重分配，新增设备时只移动分给新设备的分区
+        """
+        weights = {1: 1, 2: 1, 3: 2}
+        table = assign_parts(weights, 1024)
+        self.assertEqual([table.count(i) for i in (1, 2, 3)],
+                         [256, 256, 512])
+        weights[4] = 4
+        new_table = assign_parts(weights, 1024, table)
+        self.assertEqual(new_table.count(4), 512)
+        moved = [part for part in range(1024)
+                 if table[part] != new_table[part]]
+        self.assertEqual(len(moved), 512)
+        self.assertTrue(all(new_table[part] == 4 for part in moved))
+        self.assertEqual(assign_parts({}, 8).tolist(), [-1] * 8)
+
+    def test_lookup(self):
+        """查找.
+
+        测试点：hash_dev与分区表一致，get_nodes返回不同设备
+        """
+        ring = PartitionRing.build({1: 1, 2: 1, 3: 1}, part_power=8)
+        keys = ['key_%s' % i for i in range(300)]
+        result = ring.hash_dev_many(keys)
+        self.assertEqual(result, [ring.part2dev[ring.get_part(key)]
+                                  for key in keys])
+        for key, dev_id in zip(keys, result):
+            nodes = ring.get_nodes(key, 5)
+            self.assertEqual(nodes[0], dev_id)
+            self.assertEqual(sorted(nodes), [1, 2, 3])
+        self.assertIsNone(PartitionRing.build({}, part_power=4).hash_dev('k'))
+
+    def test_ringfile(self):
+        """读写RingFile.
+
+        测试点：JSON与二进制格式互转后查找结果一致
+        """
+        ring = PartitionRing.build({1: 1, 2: 3}, part_power=10)
+        json_file = os.path.join(self.tmp_dir, 'Ring.json')
+        bin_file = os.path.join(self.tmp_dir, 'Ring.bin')
+        with open(json_file, 'w') as fp:
+            json.dump(ringfile.dump_table(ring, {1: 1, 2: 3}), fp)
+        ringfile.convert(json_file, bin_file)
+        keys = ['key_%s' % i for i in range(300)]
+        expected = ring.hash_dev_many(keys)
+        with ringfile.open_ring(bin_file) as mapped:
+            self.assertIsInstance(mapped, ringfile.MappedPartitionRing)
+            self.assertEqual(mapped.part_power, 10)
+            self.assertEqual(mapped.hash_dev_many(keys), expected)
+        self.assertRaises(ValueError, ringfile.MappedRing, bin_file)
+        ringfile.convert(bin_file, json_file, binary=False)
+        loaded = ringfile.open_ring(json_file)
+        self.assertIsInstance(loaded, PartitionRing)
+        self.assertEqual(loaded.hash_dev_many(keys), expected)
+
+        with open(json_file) as fp:
+            data = json.load(fp)
+        data['part2dev'][0] = 3
+        self.assertRaises(exc.ErrorFileChecksum, ringfile.parse_table, data)
+
+    def test_ring_builder(self):
+        """RingBuilder分区模式.
+
+        测试点：RingFile记录模式，批量修改只重新构建一次，模式不一致时报错
+        """
+        builder_file = os.path.join(self.tmp_dir, 'Builder.json')
+        ring_file = os.path.join(self.tmp_dir, 'Ring.json')
+        for filename in (builder_file, ring_file):
+            with open(filename, 'w') as fp:
+                fp.write('{}')
+        rb = RingBuilder(builder_file, ring_file, mode='partition',
+                         part_power=8)
+        with rb.batch():
+            for i in range(1, 5):
+                rb.add_dev({'dev_id': i, 'dev_name': 'device_%s' % i,
+                            'dev_weight': 100})
+        table = rb.ring_manager.snapshot.part2dev
+        self.assertEqual([table.count(i) for i in range(1, 5)], [64] * 4)
+        rb.remove_dev(4)
+        new_table = rb.ring_manager.snapshot.part2dev
+        self.assertEqual(sum(1 for old, new in zip(table, new_table)
+                             if old != new), 64)
+
+        loaded = RingBuilder(builder_file, ring_file)
+        self.assertEqual(loaded.mode, 'partition')
+        self.assertEqual(loaded.ring_manager.snapshot.part2dev, new_table)
+        self.assertRaises(exc.ErrorInvalidParam, RingBuilder, builder_file,
+                          ring_file, mode='point')
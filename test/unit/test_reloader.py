@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from hashring.app import ringfile
+from hashring.app.reloader import ReloadingRing
+from hashring.common.utils import atomic_write
+
+from test.helpers import make_ring
+
+
+class TestReloadingRing(unittest.TestCase):
+    u"""RingFile热加载测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.keys = ['key_%s' % i for i in range(100)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _wait(self, ring, count, timeout=5.0):
+        deadline = time.time() + timeout
+        while ring.reload_count < count and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(ring.reload_count, count)
+
+    def test_check(self):
+        """检查并重新加载.
+
+        测试点：文件未变化时不加载，变化后切换，损坏时保留旧ring
+        """
+        filename = os.path.join(self.tmp_dir, 'Ring.bin')
+        ringfile.save_binary(filename, *make_ring([1, 2]))
+        ring = ReloadingRing(filename)
+        self.assertFalse(ring.check())
+        self.assertEqual(set(ring.hash_dev_many(self.keys)), {1, 2})
+
+        ringfile.save_binary(filename, *make_ring([3]))
+        self.assertTrue(ring.check())
+        self.assertEqual(set(ring.hash_dev_many(self.keys)), {3})
+        self.assertEqual(ring.stats()['reload_count'], 1)
+        self.assertIsNotNone(ring.last_reload_latency)
+
+        content = bytearray(ringfile.dump_binary(*make_ring([4])))
+        content[-1] ^= 0xff
+        atomic_write(filename, bytes(content))
+        self.assertFalse(ring.check())
+        self.assertEqual(ring.failed_count, 1)
+        self.assertEqual(ring.hash_dev(self.keys[0]), 3)
+
+    def test_background(self):
+        """后台线程重新加载.
+
+        测试点：轮询和inotify两种方式均能感知JSON文件的变化
+        """
+        filename = os.path.join(self.tmp_dir, 'Ring.json')
+        for use_inotify in (False, True):
+            ringfile.convert(self._save(make_ring([1])), filename,
+                             binary=False)
+            with ReloadingRing(filename, interval=0.02,
+                               use_inotify=use_inotify) as ring:
+                self.assertEqual(ring.hash_dev(self.keys[0]), 1)
+                time.sleep(0.05)
+                ringfile.convert(self._save(make_ring([2])), filename,
+                                 binary=False)
+                self._wait(ring, 1)
+                self.assertEqual(ring.hash_dev(self.keys[0]), 2)
+
+    def _save(self, ring):
+        filename = os.path.join(self.tmp_dir, 'Source.bin')
+        ringfile.save_binary(filename, *ring)
+        return filename
+
+
+if __name__ == '__main__':
+    unittest.main()
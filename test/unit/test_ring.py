@@ -1,9 +1,19 @@
 # -*- coding: utf-8 -*-
 import json
+import os
+import shutil
+import tempfile
+import threading
 import unittest
+from array import array
+from unittest import mock
 
-from hashring.app.ringbuilder import RingBuilder, Device
+from hashring.app import lookup
+from hashring.app import placement
+from hashring.app import ringbuilder
+from hashring.app.ringbuilder import RingBuilder, RingManager, Device
 from hashring.common import exceptions as exc
+from hashring.common.utils import gen_key, gen_point
 
 
 class TestRingBase(unittest.TestCase):
@@ -128,6 +138,319 @@ class TestRingData(unittest.TestCase):
         self.assertGreater(ring_builder.hash_dev('just for test'), 0)
 
 
+class TestRingManager(unittest.TestCase):
+    u"""RingManager测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ring_file = os.path.join(self.tmp_dir, 'Ring.json')
+        shutil.copy(os.path.join(os.path.dirname(__file__), '..', 'Ring.json'),
+                    self.ring_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_legacy(self):
+        """加载旧版RingFile.
+
+        测试点：十六进制key转换为有序整数点，查找结果与旧版一致
+        """
+        with open(self.ring_file) as fp:
+            legacy = json.load(fp)
+        ring_manager = RingManager(self.ring_file)
+        self.assertEqual(list(ring_manager._sorted_keys),
+                         sorted(int(key[:16], 16) for key in legacy))
+        nodes = sorted(legacy)
+        for i in range(200):
+            key = 'key_%s' % i
+            hex_key = gen_key(key)
+            node = next((n for n in nodes if hex_key <= n), nodes[0])
+            self.assertEqual(ring_manager.hash_dev(key), legacy[node])
+
+    def test_save_version(self):
+        """保存RingFile.
+
+        测试点：保存为版本2格式，重新加载后内容一致
+        """
+        ring_manager = RingManager(self.ring_file)
+        ring_manager.add({'dev_id': 9, 'part_num': 4})
+        with open(self.ring_file) as fp:
+            data = json.load(fp)
+        self.assertEqual(data['version'], 2)
+        reloaded = RingManager(self.ring_file)
+        self.assertEqual(reloaded._sorted_keys, ring_manager._sorted_keys)
+        self.assertEqual(reloaded._dev_ids, ring_manager._dev_ids)
+        reloaded.remove(9, 4)
+        self.assertNotIn(9, reloaded._dev_ids)
+        self.assertRaises(KeyError, reloaded.remove, 9, 4)
+
+    def test_hash_dev_many(self):
+        """批量hash设备接口.
+
+        测试点：结果与逐个调用hash_dev一致且保持输入顺序
+        """
+        ring_manager = RingManager(self.ring_file)
+        keys = ['key_%s' % i for i in range(300)]
+        expected = [ring_manager.hash_dev(key) for key in keys]
+        self.assertEqual(ring_manager.hash_dev_many(keys), expected)
+        self.assertEqual(list(ring_manager.iter_hash_dev(iter(keys))),
+                         expected)
+        self.assertEqual(ring_manager.hash_dev_many([]), [])
+
+    def test_place_keys(self):
+        """批量放置接口.
+
+        测试点：有无NumPy时结果均与hash_dev一致
+        """
+        ring_manager = RingManager(self.ring_file)
+        keys = ['key_%s' % i for i in range(300)]
+        expected = [ring_manager.hash_dev(key) for key in keys]
+
+        def check():
+            self.assertEqual(list(ring_manager.place_keys(keys)), expected)
+            points = placement.hash_points(keys)
+            self.assertEqual([int(p) for p in points],
+                             [gen_point(key) for key in keys])
+            self.assertEqual(list(ring_manager.place_points(points)),
+                             expected)
+
+        check()
+        with mock.patch.object(placement, 'np', None):
+            self.assertIsInstance(placement.hash_points(keys), array)
+            check()
+
+    def test_successors(self):
+        """后继设备表.
+
+        测试点：加载和修改时构建好，get_nodes不再构建
+        """
+        ring_manager = RingManager(self.ring_file)
+        for add in (False, True):
+            if add:
+                ring_manager.add({'dev_id': 9, 'part_num': 4})
+            with mock.patch.object(lookup, 'build_successors') as build:
+                nodes = ring_manager.get_nodes('key', 3)
+            build.assert_not_called()
+            self.assertEqual(nodes[0], ring_manager.hash_dev('key'))
+            self.assertEqual(len(set(nodes)), len(nodes))
+
+    def test_concurrent_hash_dev(self):
+        """多线程并发查找与修改.
+
+        测试点：修改过程中读者总能看到完整一致的快照
+        """
+        ring_manager = RingManager(self.ring_file)
+        keys = ['key_%s' % i for i in range(200)]
+        dev_ids = set(ring_manager._dev_ids) | set(range(1000, 1010))
+        errors = []
+        done = threading.Event()
+
+        def reader():
+            try:
+                while not done.is_set():
+                    snapshot = ring_manager.snapshot
+                    self.assertEqual(len(snapshot.sorted_keys),
+                                     len(snapshot.dev_ids))
+                    for dev_id in ring_manager.hash_dev_many(keys):
+                        self.assertIn(dev_id, dev_ids)
+            except Exception as e:
+                errors.append(e)
+
+        def writer():
+            try:
+                for dev_id in range(1000, 1010):
+                    ring_manager.add({'dev_id': dev_id, 'part_num': 20})
+                    ring_manager.update(dev_id, 20, 5)
+                    if dev_id % 2:
+                        ring_manager.remove(dev_id, 5)
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        writers = [threading.Thread(target=writer)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            sorted(set(dev_id for dev_id in ring_manager._dev_ids
+                       if dev_id >= 1000)),
+            list(range(1000, 1010, 2)))
+
+
+class TestRingBuilderBatch(unittest.TestCase):
+    u"""RingBuilder批量修改测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.builder_file = os.path.join(self.tmp_dir, 'Builder.json')
+        self.ring_file = os.path.join(self.tmp_dir, 'Ring.json')
+        for filename in (self.builder_file, self.ring_file):
+            with open(filename, 'w') as fp:
+                fp.write('{}')
+        self.ring_builder = RingBuilder(self.builder_file, self.ring_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _load(self, filename):
+        with open(filename) as fp:
+            return json.load(fp)
+
+    def test_batch_commit(self):
+        """批量提交.
+
+        测试点：退出前不写文件，退出后结果与逐个修改一致
+        """
+        with self.ring_builder.batch() as rb:
+            for i in range(1, 6):
+                rb.add_dev({'dev_id': i, 'dev_name': 'device_%s' % i,
+                            'dev_weight': 100 * i})
+            rb.update_dev(2, 600)
+            rb.remove_dev(3)
+            self.assertEqual(self._load(self.ring_file), {})
+            self.assertEqual(self._load(self.builder_file), {})
+        self.assertEqual(len(self._load(self.builder_file)), 4)
+
+        expected_file = os.path.join(self.tmp_dir, 'Expected.json')
+        with open(expected_file, 'w') as fp:
+            fp.write('{}')
+        expected = RingManager(expected_file)
+        for dev_id, weight in ((1, 100), (2, 600), (4, 400), (5, 500)):
+            expected.add({'dev_id': dev_id, 'part_num': int(weight * 0.02)})
+        self.assertEqual(self.ring_builder.ring_manager._sorted_keys,
+                         expected._sorted_keys)
+        self.assertEqual(self.ring_builder.ring_manager._dev_ids,
+                         expected._dev_ids)
+
+    def test_batch_rollback(self):
+        """批量回滚.
+
+        测试点：发生异常时撤销全部修改
+        """
+        self.ring_builder.add_dev({'dev_id': 1, 'dev_name': 'device_1',
+                                   'dev_weight': 200})
+        ring = self._load(self.ring_file)
+        sorted_keys = self.ring_builder.ring_manager._sorted_keys
+        with self.assertRaises(KeyError):
+            with self.ring_builder.batch() as rb:
+                rb.add_dev({'dev_id': 2, 'dev_name': 'device_2',
+                            'dev_weight': 200})
+                rb.update_dev(1, 400)
+                rb.ring_manager.remove(3, 4)
+        self.assertEqual(self._load(self.ring_file), ring)
+        self.assertEqual(self.ring_builder.ring_manager._sorted_keys,
+                         sorted_keys)
+        self.assertIsNone(self.ring_builder.builder_manager.get_by_id(2))
+        self.assertEqual(
+            self.ring_builder.builder_manager.get_by_id(1)['dev_weight'], 200)
+
+    def test_batch_save_failed(self):
+        """批量提交时保存失败.
+
+        测试点：任一文件保存失败时两个文件和内存中的ring都不变，
+        随后的修改正常保存
+        """
+        self.ring_builder.add_dev({'dev_id': 1, 'dev_name': 'device_1',
+                                   'dev_weight': 200})
+        builder = self._load(self.builder_file)
+        ring = self._load(self.ring_file)
+        sorted_keys = self.ring_builder.ring_manager._sorted_keys
+        for manager in (self.ring_builder.ring_manager,
+                        self.ring_builder.builder_manager):
+            with mock.patch.object(manager.data_manager, 'save',
+                                   side_effect=OSError):
+                with self.assertRaises(OSError):
+                    with self.ring_builder.batch() as rb:
+                        rb.add_dev({'dev_id': 2, 'dev_name': 'device_2',
+                                    'dev_weight': 200})
+            self.assertEqual(self._load(self.builder_file), builder)
+            self.assertEqual(self._load(self.ring_file), ring)
+            self.assertEqual(self.ring_builder.ring_manager._sorted_keys,
+                             sorted_keys)
+            self.assertIsNone(self.ring_builder.builder_manager.get_by_id(2))
+
+        self.ring_builder.add_dev({'dev_id': 2, 'dev_name': 'device_2',
+                                   'dev_weight': 200})
+        self.assertEqual(sorted(self._load(self.builder_file)), ['1', '2'])
+        self.assertEqual(set(self._load(self.ring_file)['dev_ids']), {1, 2})
+
+    def test_tiers(self):
+        """设备故障域.
+
+        测试点：故障域保存到RingFile，副本分布在不同region
+        """
+        for i in range(1, 7):
+            self.ring_builder.add_dev({
+                'dev_id': i, 'dev_name': 'device_%s' % i, 'dev_weight': 500,
+                'dev_region': 'r%s' % (i % 3), 'dev_zone': 'z%s' % i})
+        self.assertEqual(self._load(self.ring_file)['tiers']['4'],
+                         ['r1', 'z4', None])
+        ring_manager = RingManager(self.ring_file)
+        for i in range(100):
+            nodes = ring_manager.get_nodes('key_%s' % i, 3)
+            self.assertEqual(nodes, self.ring_builder.get_nodes(
+                'key_%s' % i, 3))
+            self.assertEqual(len(set(n % 3 for n in nodes)), 3)
+
+    def test_load_once(self):
+        """RingBuilder启动时每个文件只解析一次.
+
+        测试点：确定模式与构建管理器共用一次加载
+        """
+        self.ring_builder.add_dev({'dev_id': 1, 'dev_name': 'device_1',
+                                   'dev_weight': 500})
+        with mock.patch.object(ringbuilder.DataManager, 'load',
+                               wraps=ringbuilder.DataManager.load) as load:
+            rb = RingBuilder(self.builder_file, self.ring_file)
+        self.assertEqual(sorted(call[0][0] for call in load.call_args_list),
+                         sorted([self.builder_file, self.ring_file]))
+        self.assertEqual(rb.hash_dev('key'), 1)
+
+    def test_tiers_batch(self):
+        """批量添加带故障域的设备.
+
+        测试点：整个批量修改只发布一次快照，撤销时故障域一并撤销
+        """
+        with mock.patch('hashring.app.ringbuilder.RingView',
+                        wraps=ringbuilder.RingView) as ring_view:
+            with self.ring_builder.batch():
+                for i in range(1, 7):
+                    self.ring_builder.add_dev({
+                        'dev_id': i, 'dev_name': 'device_%s' % i,
+                        'dev_weight': 500, 'dev_region': 'r%s' % (i % 3)})
+            self.assertEqual(ring_view.call_count, 1)
+            self.ring_builder.remove_dev(6)
+            self.assertEqual(ring_view.call_count, 2)
+        snapshot = self.ring_builder.ring_manager.snapshot
+        self.assertEqual(sorted(snapshot.tiers), [1, 2, 3, 4, 5])
+        with self.assertRaises(KeyError):
+            with self.ring_builder.batch():
+                self.ring_builder.add_dev({
+                    'dev_id': 7, 'dev_name': 'device_7', 'dev_weight': 500,
+                    'dev_region': 'r7'})
+                raise KeyError(7)
+        self.assertNotIn(7, self.ring_builder.ring_manager.snapshot.tiers)
+        self.assertNotIn(7, self.ring_builder.ring_manager._tiers)
+
+        # 按故障域挑选副本的后继设备表随快照发布，查找时不再构建
+        ring_manager = self.ring_builder.ring_manager
+        for change in (False, True):
+            if change:
+                ring_manager.set_tiers(dict(
+                    (dev_id, ('r%s' % dev_id, None, None))
+                    for dev_id in range(1, 6)))
+            with mock.patch.object(lookup,
+                                   'build_diverse_successors') as build:
+                nodes = self.ring_builder.get_nodes('key', 3)
+            build.assert_not_called()
+            self.assertEqual(len(set(nodes)), 3)
+
+
 if __name__ == '__main__':
     suit = unittest.TestSuite
     suit.addTest(TestRingData("test_add_dev"))
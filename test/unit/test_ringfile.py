@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from array import array
+
+from hashring.app import ringfile
+from hashring.app.lookup import RingView
+from hashring.app.ringbuilder import RingManager
+from hashring.common import exceptions as exc
+from hashring.common.utils import HASH_FUNCS, atomic_write, gen_point
+
+RING_FILE = os.path.join(os.path.dirname(__file__), '..', 'Ring.json')
+
+
+class TestRingFile(unittest.TestCase):
+    u"""RingFile读写测试类."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        with open(RING_FILE) as fp:
+            self.sorted_keys, self.dev_ids = ringfile.parse_json(json.load(fp))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_convert(self):
+        """格式转换.
+
+        测试点：JSON与二进制格式互转后内容一致
+        """
+        bin_file = os.path.join(self.tmp_dir, 'Ring.bin')
+        json_file = os.path.join(self.tmp_dir, 'Ring.json')
+        ringfile.convert(RING_FILE, bin_file)
+        self.assertTrue(ringfile.is_binary(bin_file))
+        ringfile.convert(bin_file, json_file, binary=False)
+        self.assertFalse(ringfile.is_binary(json_file))
+        for filename in (bin_file, json_file):
+            self.assertEqual(ringfile.load(filename),
+                             (self.sorted_keys, self.dev_ids))
+
+    def test_mapped_ring(self):
+        """mmap查找.
+
+        测试点：结果与原环一致，空环返回None
+        """
+        bin_file = os.path.join(self.tmp_dir, 'Ring.bin')
+        ringfile.save_binary(bin_file, self.sorted_keys, self.dev_ids)
+        keys = ['key_%s' % i for i in range(300)]
+        with ringfile.MappedRing(bin_file) as ring:
+            self.assertEqual(len(ring), len(self.sorted_keys))
+            result = [ring.hash_dev(key) for key in keys]
+            self.assertEqual(ring.hash_dev_many(keys), result)
+        sorted_keys = list(self.sorted_keys)
+        for key, dev_id in zip(keys, result):
+            point = gen_point(key)
+            idx = next((i for i, p in enumerate(sorted_keys) if point <= p), 0)
+            self.assertEqual(self.dev_ids[idx], dev_id)
+
+        ringfile.save_binary(bin_file, array('Q'), array('q'))
+        with ringfile.MappedRing(bin_file) as ring:
+            self.assertIsNone(ring.hash_dev('key'))
+
+    def test_atomic_write(self):
+        """原子写文件.
+
+        测试点：覆盖原文件、保留权限、不残留临时文件
+        """
+        filename = os.path.join(self.tmp_dir, 'Ring.json')
+        atomic_write(filename, b'old')
+        os.chmod(filename, 0o640)
+        atomic_write(filename, b'new')
+        with open(filename, 'rb') as fp:
+            self.assertEqual(fp.read(), b'new')
+        self.assertEqual(os.stat(filename).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(self.tmp_dir), ['Ring.json'])
+
+    def test_checksum(self):
+        """校验和.
+
+        测试点：内容被篡改时两种格式均抛出ErrorFileChecksum
+        """
+        data = ringfile.dump_json(self.sorted_keys, self.dev_ids)
+        self.assertEqual(ringfile.parse_json(data),
+                         (self.sorted_keys, self.dev_ids))
+        data['dev_ids'][0] += 1
+        self.assertRaises(exc.ErrorFileChecksum, ringfile.parse_json, data)
+
+        # 校验和覆盖故障域和前缀索引位数
+        tiers = {self.dev_ids[0]: ('r1', 'z1', 'h1')}
+        data = ringfile.dump_json(self.sorted_keys, self.dev_ids, tiers=tiers,
+                                  prefix_bits=8)
+        ringfile.parse_json(data)
+        for key, value in (('tiers', {}), ('prefix_bits', 4)):
+            changed = dict(data)
+            changed[key] = value
+            self.assertRaises(exc.ErrorFileChecksum, ringfile.parse_json,
+                              changed)
+
+        bin_file = os.path.join(self.tmp_dir, 'Ring.bin')
+        content = bytearray(ringfile.dump_binary(self.sorted_keys,
+                                                 self.dev_ids))
+        content[-1] ^= 0xff
+        with open(bin_file, 'wb') as fp:
+            fp.write(content)
+        self.assertRaises(exc.ErrorFileChecksum, ringfile.MappedRing,
+                          bin_file)
+        with ringfile.MappedRing(bin_file, verify=False) as ring:
+            self.assertEqual(len(ring), len(self.sorted_keys))
+        # 没有校验和的版本1不再支持
+        content = bytearray(ringfile.dump_binary(self.sorted_keys,
+                                                 self.dev_ids))
+        struct.pack_into('<H', content, len(ringfile.MAGIC), 1)
+        with open(bin_file, 'wb') as fp:
+            fp.write(content)
+        self.assertRaises(ValueError, ringfile.MappedRing, bin_file)
+
+    def test_hash(self):
+        """哈希函数.
+
+        测试点：哈希函数记录在两种格式中，查找结果与内存中的环一致，
+        已有的环不能更换哈希函数
+        """
+        keys = ['key_%s' % i for i in range(300)]
+        for hash_name in sorted(HASH_FUNCS):
+            ring = RingView(self.sorted_keys, self.dev_ids,
+                            hash_name=hash_name)
+            expected = ring.hash_dev_many(keys)
+            json_file = os.path.join(self.tmp_dir, '%s.json' % hash_name)
+            bin_file = os.path.join(self.tmp_dir, '%s.bin' % hash_name)
+            with open(json_file, 'w') as fp:
+                json.dump(ringfile.dump_json(self.sorted_keys, self.dev_ids,
+                                             hash_name=hash_name), fp)
+            ringfile.convert(json_file, bin_file)
+            for filename in (json_file, bin_file):
+                loaded = ringfile.open_ring(filename)
+                self.assertEqual(loaded.hash_name, hash_name)
+                self.assertEqual(loaded.hash_dev_many(keys), expected)
+        self.assertNotEqual(
+            RingView(self.sorted_keys, self.dev_ids).hash_dev_many(keys),
+            RingView(self.sorted_keys, self.dev_ids,
+                     hash_name='crc32').hash_dev_many(keys))
+
+        data = ringfile.dump_json(self.sorted_keys, self.dev_ids,
+                                  hash_name='blake2b')
+        self.assertEqual(ringfile.select_hash(data), 'blake2b')
+        self.assertEqual(ringfile.select_hash({}, 'crc32'), 'crc32')
+        self.assertRaises(exc.ErrorInvalidParam, ringfile.select_hash,
+                          data, 'md5')
+        self.assertRaises(exc.ErrorInvalidParam, ringfile.select_hash,
+                          {}, 'sha1')
+        data['hash'] = 'md5'
+        self.assertRaises(exc.ErrorFileChecksum, ringfile.parse_json, data)
+
+    def test_prefix_bits(self):
+        """前缀索引位数.
+
+        测试点：位数保存在RingFile中，重新打开时沿用，可以更换
+        """
+        filename = os.path.join(self.tmp_dir, 'Ring.json')
+        with open(filename, 'w') as fp:
+            fp.write('{}')
+        manager = RingManager(filename, prefix_bits=10)
+        manager.add({'dev_id': 1, 'part_num': 20})
+        manager.add({'dev_id': 2, 'part_num': 20})
+        keys = ['key_%s' % i for i in range(300)]
+        expected = manager.hash_dev_many(keys)
+        self.assertEqual(RingManager(filename).prefix_bits, 10)
+        loaded = ringfile.open_ring(filename)
+        self.assertEqual(loaded.prefix_bits, 10)
+        self.assertEqual(loaded.hash_dev_many(keys), expected)
+        manager = RingManager(filename, prefix_bits=0)
+        self.assertEqual(manager.hash_dev_many(keys), expected)
+        manager.remove(2, 20)
+        self.assertEqual(ringfile.open_ring(filename).prefix_bits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()